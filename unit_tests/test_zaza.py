@@ -0,0 +1,155 @@
+# Copyright 2018 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import concurrent.futures
+import mock
+import threading
+
+import unit_tests.utils as ut_utils
+
+import zaza
+import zaza.model
+
+
+class TestZaza(ut_utils.BaseTestCase):
+
+    def test_run(self):
+        async def _step(value):
+            return value
+
+        self.assertIsNone(zaza.run())
+        self.assertEqual(zaza.run(_step(1), _step(2)), 2)
+
+    def test_run_uses_background_loop(self):
+        async def _thread():
+            return threading.current_thread()
+
+        self.assertIs(zaza.run(_thread()), zaza.RUN_LOOP_THREAD)
+        self.assertIsNot(zaza.RUN_LOOP_THREAD, threading.current_thread())
+
+    def test_run_raises(self):
+        async def _fail():
+            raise ValueError('boom')
+
+        with self.assertRaises(ValueError):
+            zaza.run(_fail())
+
+    def test_sync_wrapper(self):
+        async def _add(a, b=0):
+            return a + b
+
+        self.assertEqual(zaza.sync_wrapper(_add)(1, b=2), 3)
+
+    def test_sync_wrapper_from_running_loop(self):
+        async def _add(a, b=0):
+            return a + b
+
+        async def _caller():
+            return zaza.sync_wrapper(_add)(1, b=2)
+
+        loop = asyncio.new_event_loop()
+        try:
+            self.assertEqual(loop.run_until_complete(_caller()), 3)
+        finally:
+            loop.close()
+
+    def test_sync_wrapper_from_threads(self):
+        async def _square(x):
+            await asyncio.sleep(0.01)
+            return x * x
+
+        square = zaza.sync_wrapper(_square)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as pool:
+            self.assertEqual(
+                list(pool.map(square, range(8))),
+                [x * x for x in range(8)])
+
+    def test_run_from_loop_thread(self):
+        async def _noop():
+            return
+
+        async def _nested():
+            step = _noop()
+            try:
+                return zaza.run(step)
+            finally:
+                step.close()
+
+        with self.assertRaises(RuntimeError):
+            zaza.run(_nested())
+
+    def test_stop_run_loop(self):
+        async def _step():
+            return True
+
+        zaza.run(_step())
+        thread = zaza.RUN_LOOP_THREAD
+        zaza.model.MODEL_CONNECTION_LOCKS['modelname'] = mock.MagicMock()
+        zaza.stop_run_loop()
+        self.assertFalse(thread.is_alive())
+        self.assertIsNone(zaza.RUN_LOOP)
+        self.assertEqual(zaza.model.MODEL_CONNECTION_LOCKS, {})
+        # A new loop is started on demand
+        self.assertTrue(zaza.run(_step()))
+
+    def test_run_concurrently(self):
+        async def _step(value, delay):
+            await asyncio.sleep(delay)
+            return value
+
+        self.assertEqual(zaza.run_concurrently(), [])
+        self.assertEqual(
+            zaza.run_concurrently(_step(1, 0.03), _step(2, 0.01), _step(3, 0)),
+            [1, 2, 3])
+
+    def test_run_concurrently_limit(self):
+        running = []
+        peak = []
+
+        async def _step(value):
+            running.append(value)
+            peak.append(len(running))
+            await asyncio.sleep(0.01)
+            running.remove(value)
+            return value
+
+        self.assertEqual(
+            zaza.run_concurrently(*[_step(i) for i in range(6)], limit=2),
+            list(range(6)))
+        self.assertEqual(max(peak), 2)
+
+    def test_run_concurrently_failures(self):
+        async def _ok():
+            return True
+
+        async def _fail(msg):
+            raise ValueError(msg)
+
+        with self.assertRaises(zaza.StepsFailed) as context:
+            zaza.run_concurrently(_fail('one'), _ok(), _fail('two'))
+        self.assertEqual(sorted(context.exception.errors.keys()), [0, 2])
+        self.assertEqual(str(context.exception.errors[2]), 'two')
+
+    def test_async_gather_return_exceptions(self):
+        async def _ok():
+            return True
+
+        async def _fail():
+            raise ValueError('boom')
+
+        results = zaza.run(
+            zaza.async_gather(_ok(), _fail(), return_exceptions=True))
+        self.assertTrue(results[0])
+        self.assertIsInstance(results[1], ValueError)
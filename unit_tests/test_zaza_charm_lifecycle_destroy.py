@@ -20,7 +20,9 @@ class TestCharmLifecycleDestroy(ut_utils.BaseTestCase):
 
     def test_destroy(self):
         self.patch_object(lc_destroy.zaza.controller, 'destroy_model')
+        self.patch_object(lc_destroy.zaza.model, 'disconnect_model')
         lc_destroy.destroy('doomed')
+        self.disconnect_model.assert_called_once_with('doomed')
         self.destroy_model.assert_called_once_with('doomed')
 
     def test_parser(self):
@@ -169,7 +169,8 @@ class TestCharmLifecycleFuncTestRunner(ut_utils.BaseTestCase):
         self.patch_object(lc_func_test_runner, 'parse_args')
         self.patch_object(lc_func_test_runner, 'logging')
         self.patch_object(lc_func_test_runner, 'func_test_runner')
-        self.patch_object(lc_func_test_runner, 'asyncio')
+        self.patch_object(lc_func_test_runner.zaza, 'stop_run_loop')
+        self.patch_object(lc_func_test_runner.zaza.model, 'close_all_models')
         _args = mock.Mock()
         _args.loglevel = 'DeBuG'
         _args.dev = False
@@ -178,12 +179,14 @@ class TestCharmLifecycleFuncTestRunner(ut_utils.BaseTestCase):
         self.logging.DEBUG = 10
         lc_func_test_runner.main()
         self.logging.basicConfig.assert_called_with(level=10)
+        self.close_all_models.assert_called_once_with()
+        self.stop_run_loop.assert_called_once_with()
 
     def test_main_loglevel_invalid(self):
         self.patch_object(lc_func_test_runner, 'parse_args')
         self.patch_object(lc_func_test_runner, 'logging')
         self.patch_object(lc_func_test_runner, 'func_test_runner')
-        self.patch_object(lc_func_test_runner, 'asyncio')
+        self.patch_object(lc_func_test_runner.zaza, 'stop_run_loop')
         _args = mock.Mock()
         _args.loglevel = 'invalid'
         self.parse_args.return_value = _args
@@ -198,7 +201,7 @@ class TestCharmLifecycleFuncTestRunner(ut_utils.BaseTestCase):
         self.patch_object(lc_func_test_runner, 'parse_args')
         self.patch_object(lc_func_test_runner, 'logging')
         self.patch_object(lc_func_test_runner, 'func_test_runner')
-        self.patch_object(lc_func_test_runner, 'asyncio')
+        self.patch_object(lc_func_test_runner.zaza, 'stop_run_loop')
         _args = mock.Mock()
         _args.loglevel = 'DEBUG'
         _args.dev = True
@@ -215,7 +218,7 @@ class TestCharmLifecycleFuncTestRunner(ut_utils.BaseTestCase):
         self.patch_object(lc_func_test_runner, 'parse_args')
         self.patch_object(lc_func_test_runner, 'logging')
         self.patch_object(lc_func_test_runner, 'func_test_runner')
-        self.patch_object(lc_func_test_runner, 'asyncio')
+        self.patch_object(lc_func_test_runner.zaza, 'stop_run_loop')
         _args = mock.Mock()
         _args.loglevel = 'DEBUG'
         _args.dev = True
@@ -234,7 +237,7 @@ class TestCharmLifecycleFuncTestRunner(ut_utils.BaseTestCase):
         self.patch_object(lc_func_test_runner, 'parse_args')
         self.patch_object(lc_func_test_runner, 'logging')
         self.patch_object(lc_func_test_runner, 'func_test_runner')
-        self.patch_object(lc_func_test_runner, 'asyncio')
+        self.patch_object(lc_func_test_runner.zaza, 'stop_run_loop')
         _args = mock.Mock()
         _args.loglevel = 'DEBUG'
         _args.dev = False
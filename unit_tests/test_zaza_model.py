@@ -14,7 +14,14 @@
 
 import aiounittest
 import asyncio.futures
+import base64
+import io
 import mock
+import os
+import shutil
+import subprocess
+import tarfile
+import tempfile
 
 import unit_tests.utils as ut_utils
 from juju import loop
@@ -26,8 +33,13 @@ class TestModel(ut_utils.BaseTestCase):
 
     def tearDown(self):
         super(TestModel, self).tearDown()
-        # Clear cached model name
+        # Clear cached model name and pooled connections
         model.CURRENT_MODEL = None
+        model.MODEL_CONNECTIONS.clear()
+        model.MODEL_CONNECTION_LOCKS.clear()
+        model.MODEL_ERROR_UNITS.clear()
+        model.MODEL_LEADERS.clear()
+        model.OSLO_CONFIG_CACHE.clear()
 
     def setUp(self):
         super(TestModel, self).setUp()
@@ -49,11 +61,6 @@ class TestModel(ut_utils.BaseTestCase):
         async def _wait():
             return
 
-        def _is_leader(leader):
-            async def _inner_is_leader():
-                return leader
-            return _inner_is_leader
-
         self.run_action = mock.MagicMock()
         self.run_action.wait.side_effect = _wait
         self.action = mock.MagicMock()
@@ -89,8 +96,6 @@ class TestModel(ut_utils.BaseTestCase):
         self.unit2.scp_from.side_effect = _scp_from
         self.unit1.run_action.side_effect = _run_action
         self.unit2.run_action.side_effect = _run_action
-        self.unit1.is_leader_from_status.side_effect = _is_leader(False)
-        self.unit2.is_leader_from_status.side_effect = _is_leader(True)
         self.unit1.data = {'agent-status': {'current': 'idle'}}
         self.unit2.data = {'agent-status': {'current': 'idle'}}
         self.units = [self.unit1, self.unit2]
@@ -149,6 +154,18 @@ class TestModel(ut_utils.BaseTestCase):
         async def _ctrl_destroy_models(model_name):
             return
 
+        async def _get_leader_status():
+            return self.leader_status
+
+        self.leader_status = mock.MagicMock()
+        self.leader_status.applications = {
+            'app': {
+                'units': {
+                    'app/2': {'leader': False},
+                    'app/4': {
+                        'leader': True,
+                        'subordinates': {'sub/0': {'leader': True}}}}}}
+        self.Model_mock.get_status.side_effect = _get_leader_status
         self.Model_mock.connect.side_effect = _connect
         self.Model_mock.connect_model.side_effect = _connect_model
         self.Model_mock.disconnect.side_effect = _disconnect
@@ -211,7 +228,78 @@ class TestModel(ut_utils.BaseTestCase):
                 return mymodel
         self.assertEqual(loop.run(_wrapper()), self.Model_mock)
         self.Model_mock.connect_model.assert_called_once_with('modelname')
+        self.assertFalse(self.Model_mock.disconnect.called)
+
+    def test_run_in_model_pooled(self):
+        self.patch_object(model, 'Model')
+        self.Model.return_value = self.Model_mock
+
+        async def _wrapper():
+            async with model.run_in_model('modelname') as mymodel:
+                return mymodel
+        self.assertEqual(loop.run(_wrapper()), self.Model_mock)
+        self.assertEqual(loop.run(_wrapper()), self.Model_mock)
+        self.Model.assert_called_once_with()
+        self.Model_mock.connect_model.assert_called_once_with('modelname')
+
+    def test_run_in_model_reconnect(self):
+        self.patch_object(model, 'Model')
+        self.Model.return_value = self.Model_mock
+
+        async def _wrapper():
+            async with model.run_in_model('modelname') as mymodel:
+                return mymodel
+        loop.run(_wrapper())
+        self.Model_mock.is_connected.return_value = False
+        loop.run(_wrapper())
         self.Model_mock.disconnect.assert_called_once_with()
+        self.assertEqual(self.Model_mock.connect_model.call_count, 2)
+
+    def test_close_all_models(self):
+        self.patch_object(model, 'Model')
+        self.Model.return_value = self.Model_mock
+        loop.run(model.async_get_model('modelname'))
+        loop.run(model.async_get_model('othermodel'))
+        model.close_all_models()
+        self.assertEqual(self.Model_mock.disconnect.call_count, 2)
+        self.assertEqual(model.MODEL_CONNECTIONS, {})
+        self.assertEqual(model.MODEL_CONNECTION_LOCKS, {})
+
+    def test_disconnect_model_waits_for_connect(self):
+        self.patch_object(model, 'Model')
+        self.Model.return_value = self.Model_mock
+        events = []
+
+        async def _connect_model(model_name):
+            events.append('connect start')
+            await asyncio.sleep(0.01)
+            events.append('connect end')
+
+        async def _disconnect():
+            events.append('disconnect')
+
+        self.Model_mock.connect_model.side_effect = _connect_model
+        self.Model_mock.disconnect.side_effect = _disconnect
+
+        async def _race():
+            connect = asyncio.ensure_future(
+                model.async_get_model('modelname'))
+            # Let the connect start before disconnecting
+            await asyncio.sleep(0)
+            await model.async_disconnect_model('modelname')
+            await connect
+
+        loop.run(_race())
+        self.assertEqual(
+            events, ['connect start', 'connect end', 'disconnect'])
+        self.assertEqual(model.MODEL_CONNECTIONS, {})
+
+    def test_forget_model_connections(self):
+        model.MODEL_CONNECTIONS['modelname'] = self.Model_mock
+        model.get_model_connection_lock('modelname')
+        model.forget_model_connections()
+        self.assertEqual(model.MODEL_CONNECTIONS, {})
+        self.assertEqual(model.MODEL_CONNECTION_LOCKS, {})
 
     def test_scp_to_unit(self):
         self.patch_object(model, 'get_juju_model', return_value='mname')
@@ -233,6 +321,40 @@ class TestModel(ut_utils.BaseTestCase):
         self.unit2.scp_to.assert_called_once_with(
             '/tmp/src', '/tmp/dest', proxy=False, scp_opts='', user='ubuntu')
 
+    def test_scp_to_all_units_failures(self):
+        async def _scp_to_fail(source, destination, user=None, proxy=None,
+                               scp_opts=None):
+            raise ValueError('connection refused')
+
+        self.patch_object(model, 'get_juju_model', return_value='mname')
+        self.patch_object(model, 'Model')
+        self.Model.return_value = self.Model_mock
+        self.unit1.scp_to.side_effect = _scp_to_fail
+        with self.assertRaises(model.ScpFailed) as context:
+            model.scp_to_all_units('app', '/tmp/src', '/tmp/dest', limit=1)
+        self.assertEqual(list(context.exception.errors.keys()), ['app/2'])
+        # The failure does not stop the other transfers
+        self.unit2.scp_to.assert_called_once_with(
+            '/tmp/src', '/tmp/dest', proxy=False, scp_opts='', user='ubuntu')
+
+    def test_scp_from_all_units(self):
+        self.patch_object(model, 'get_juju_model', return_value='mname')
+        self.patch_object(model, 'Model')
+        self.patch_object(model.os, 'makedirs')
+        self.Model.return_value = self.Model_mock
+        self.assertEqual(
+            model.scp_from_all_units('app', '/tmp/src', '/tmp/dest'),
+            {'app/2': '/tmp/dest/app_2', 'app/4': '/tmp/dest/app_4'})
+        self.makedirs.assert_has_calls([
+            mock.call('/tmp/dest/app_2', exist_ok=True),
+            mock.call('/tmp/dest/app_4', exist_ok=True)])
+        self.unit1.scp_from.assert_called_once_with(
+            '/tmp/src', '/tmp/dest/app_2', proxy=False, scp_opts='',
+            user='ubuntu')
+        self.unit2.scp_from.assert_called_once_with(
+            '/tmp/src', '/tmp/dest/app_4', proxy=False, scp_opts='',
+            user='ubuntu')
+
     def test_scp_from_unit(self):
         self.patch_object(model, 'get_juju_model', return_value='mname')
         self.patch_object(model, 'Model')
@@ -277,6 +399,80 @@ class TestModel(ut_utils.BaseTestCase):
             model.get_lead_unit_name('app', 'model'),
             'app/4')
 
+    def test_leader_index(self):
+        self.Model_mock.units['sub/0'] = mock.MagicMock()
+        index = model.watch_leaders(self.Model_mock)
+        self.assertIs(model.watch_leaders(self.Model_mock), index)
+        self.Model_mock.add_observer.assert_called_once_with(
+            index, entity_type='unit')
+        self.assertEqual(
+            loop.run(index.get_leader(self.Model_mock, 'app')), 'app/4')
+        self.assertEqual(
+            loop.run(index.get_leader(self.Model_mock, 'sub')), 'sub/0')
+        self.assertEqual(
+            loop.run(index.get_leader(self.Model_mock, 'app')), 'app/4')
+        self.Model_mock.get_status.assert_called_once_with()
+
+    def test_leader_index_invalidate(self):
+        index = model.watch_leaders(self.Model_mock)
+        loop.run(index.get_leader(self.Model_mock, 'app'))
+
+        def _delta(unit_name, delta_type='change', message=''):
+            delta = mock.MagicMock()
+            delta.type = delta_type
+            delta.data = {'agent-status': {'message': message}}
+            delta.get_id.return_value = unit_name
+            return delta
+
+        unit = mock.MagicMock(dead=False)
+        loop.run(index(_delta('app/2', message='running install hook'),
+                       None, unit, self.Model_mock))
+        self.assertEqual(index.leaders['app'], 'app/4')
+        loop.run(index(_delta('app/2', message='running leader-elected hook'),
+                       None, unit, self.Model_mock))
+        self.assertNotIn('app', index.leaders)
+        self.assertEqual(index.leaders['sub'], 'sub/0')
+        loop.run(index.get_leader(self.Model_mock, 'app'))
+        loop.run(index(_delta('app/5', delta_type='add'),
+                       None, unit, self.Model_mock))
+        self.assertNotIn('app', index.leaders)
+        self.assertEqual(self.Model_mock.get_status.call_count, 2)
+        # A change to the leader field drops the entry
+        loop.run(index.get_leader(self.Model_mock, 'app'))
+        delta = _delta('app/2')
+        delta.data['leader'] = True
+        loop.run(index(delta, mock.MagicMock(safe_data={'leader': False}),
+                       unit, self.Model_mock))
+        self.assertNotIn('app', index.leaders)
+
+    def test_leader_index_confirm(self):
+        async def _run(command):
+            return mock.MagicMock(data={'results': {'Stdout': is_leader}})
+
+        self.unit2.run.side_effect = _run
+        index = model.watch_leaders(self.Model_mock)
+        loop.run(index.get_leader(self.Model_mock, 'app'))
+        # A recently confirmed leader is used as is
+        is_leader = 'False\n'
+        loop.run(index.get_leader(self.Model_mock, 'app'))
+        self.unit2.run.assert_not_called()
+        # An old entry is confirmed
+        is_leader = 'True\n'
+        index.confirmed['app'] -= model.LEADER_CONFIRM_PERIOD + 1
+        self.assertEqual(
+            loop.run(index.get_leader(self.Model_mock, 'app')), 'app/4')
+        self.unit2.run.assert_called_once_with('is-leader')
+        self.assertEqual(self.Model_mock.get_status.call_count, 1)
+        # and rebuilt if the unit is no longer the leader
+        is_leader = 'False\n'
+        index.confirmed['app'] -= model.LEADER_CONFIRM_PERIOD + 1
+        loop.run(index.get_leader(self.Model_mock, 'app'))
+        self.assertEqual(self.Model_mock.get_status.call_count, 2)
+        # A leader which has left the model is not used
+        del self.Model_mock.units['app/4']
+        loop.run(index.get_leader(self.Model_mock, 'app'))
+        self.assertEqual(self.Model_mock.get_status.call_count, 3)
+
     def test_get_unit_from_name(self):
         self.patch_object(model, 'get_juju_model', return_value='mname')
         self.patch_object(model, 'Model')
@@ -332,6 +528,145 @@ class TestModel(ut_utils.BaseTestCase):
                          expected)
         self.unit2.run.assert_called_once_with(cmd, timeout=None)
 
+    def _run_on_units_setup(self, errors=None):
+        errors = errors or {}
+        self.batches = []
+
+        async def _run(applications, commands, machines, timeout, units):
+            self.batches.append((commands, timeout, list(units)))
+            res = mock.MagicMock()
+            res.results = []
+            for unit in units:
+                result = mock.MagicMock()
+                result.action.tag = 'action-{}'.format(unit)
+                result.error = errors.get(unit)
+                res.results.append(result)
+            return res
+
+        async def _wait_for_action(tag):
+            unit = tag[len('action-'):]
+            action = mock.MagicMock()
+            action.data = {
+                'receiver': unit,
+                'results': {'Code': '0', 'Stderr': '', 'Stdout': unit}}
+            return action
+
+        self.patch_object(model, 'get_juju_model', return_value='mname')
+        self.patch_object(model, 'Model')
+        self.Model.return_value = self.Model_mock
+        self.action_facade = mock.MagicMock()
+        self.action_facade.Run.side_effect = _run
+        self.patch_object(model.client.ActionFacade, 'from_connection',
+                          return_value=self.action_facade)
+        self.Model_mock.wait_for_action.side_effect = _wait_for_action
+
+    def test_run_on_units(self):
+        self._run_on_units_setup()
+        self.assertEqual(
+            model.run_on_units(['app/2', 'app/4'], 'hostname', timeout=2),
+            {'app/2': {'Code': '0', 'Stderr': '', 'Stdout': 'app/2'},
+             'app/4': {'Code': '0', 'Stderr': '', 'Stdout': 'app/4'}})
+        self.assertEqual(
+            self.batches,
+            [('hostname', 2000000000, ['app/2', 'app/4'])])
+        self.assertFalse(self.unit1.run.called)
+
+    def test_run_on_units_limit(self):
+        self._run_on_units_setup()
+        results = model.run_on_units(['app/2', 'app/4'], 'hostname', limit=1)
+        self.assertEqual(sorted(results.keys()), ['app/2', 'app/4'])
+        self.assertEqual(
+            self.batches,
+            [('hostname', None, ['app/2']), ('hostname', None, ['app/4'])])
+
+    def test_run_on_units_error(self):
+        error = mock.MagicMock()
+        error.message = 'no such unit'
+        self._run_on_units_setup(errors={'app/4': error})
+        with self.assertRaises(model.JujuError):
+            model.run_on_units(['app/2', 'app/4'], 'hostname')
+
+    def test_run_on_units_missing_unit(self):
+        self._run_on_units_setup()
+        with self.assertRaises(model.UnitNotFound):
+            model.run_on_units(['app/2', 'app/9'], 'hostname')
+        self.assertEqual(self.batches, [])
+
+    def test_run_on_application(self):
+        self._run_on_units_setup()
+        self.assertEqual(
+            sorted(model.run_on_application('app', 'hostname').keys()),
+            ['app/2', 'app/4'])
+        self.assertEqual(
+            self.batches,
+            [('hostname', None, ['app/2', 'app/4'])])
+
+    def test_run_succeeded(self):
+        self.assertTrue(model.run_succeeded({'Code': '0', 'Stdout': 'out'}))
+        self.assertTrue(model.run_succeeded({'Stdout': 'out'}))
+        self.assertTrue(model.run_succeeded({}))
+        self.assertFalse(model.run_succeeded({'Code': '1', 'Stdout': ''}))
+
+    def _get_unit_files_setup(self, stdout, code='0'):
+        self.patch_object(model, 'async_run_on_units')
+
+        async def _run_on_units(unit_names, cmd, model_name=None,
+                                timeout=None):
+            return {unit_name: {'Code': code, 'Stderr': '', 'Stdout': stdout}
+                    for unit_name in unit_names}
+        self.async_run_on_units.side_effect = _run_on_units
+
+    def test_get_unit_files(self):
+        stream = io.BytesIO()
+        with tarfile.open(fileobj=stream, mode='w:gz') as tar:
+            for path, contents in [('/etc/keys/0', b'key0'),
+                                   ('/etc/keys/1', b'key1')]:
+                info = tarfile.TarInfo(path)
+                info.size = len(contents)
+                tar.addfile(info, io.BytesIO(contents))
+        self._get_unit_files_setup(
+            base64.b64encode(stream.getvalue()).decode())
+        self.assertEqual(
+            model.get_unit_files(['app/2', 'app/4'], ['/etc/keys/*']),
+            {'app/2': {'/etc/keys/0': b'key0', '/etc/keys/1': b'key1'},
+             'app/4': {'/etc/keys/0': b'key0', '/etc/keys/1': b'key1'}})
+        self.async_run_on_units.assert_called_once_with(
+            ['app/2', 'app/4'],
+            'tar --absolute-names --dereference -czf - /etc/keys/* '
+            '2>/dev/null | base64 -w 0',
+            model_name=None,
+            timeout=None)
+
+    def test_get_unit_files_none_found(self):
+        self._get_unit_files_setup('')
+        self.assertEqual(
+            model.get_unit_files(['app/2'], ['/etc/keys/*']),
+            {'app/2': {}})
+
+    def test_get_unit_files_digest(self):
+        self._get_unit_files_setup(
+            'aaaa  /etc/keys/0\nbbbb  /etc/keys/my key\n')
+        self.assertEqual(
+            model.get_unit_files(['app/2'], ['/etc/keys/*'], digest=True),
+            {'app/2': {'/etc/keys/0': 'aaaa', '/etc/keys/my key': 'bbbb'}})
+        self.async_run_on_units.assert_called_once_with(
+            ['app/2'],
+            'sha256sum /etc/keys/* 2>/dev/null || true',
+            model_name=None,
+            timeout=None)
+
+    def test_get_unit_files_failed(self):
+        self._get_unit_files_setup('', code='1')
+        with self.assertRaises(model.CommandRunFailed):
+            model.get_unit_files(['app/2'], ['/etc/keys/*'])
+
+    def test_get_unit_files_no_code(self):
+        # Juju leaves the Code out when the command exited with 0
+        self._get_unit_files_setup('aaaa  /etc/keys/0\n', code=None)
+        self.assertEqual(
+            model.get_unit_files(['app/2'], ['/etc/keys/*'], digest=True),
+            {'app/2': {'/etc/keys/0': 'aaaa'}})
+
     def test_get_relation_id(self):
         self.patch_object(model, 'get_juju_model', return_value='mname')
         self.patch_object(model, 'Model')
@@ -387,7 +722,7 @@ class TestModel(ut_utils.BaseTestCase):
     def _application_states_setup(self, setup, units_idle=True):
         self.system_ready = True
 
-        async def _block_until(f, timeout=None):
+        async def _block_until(model, f, timeout=None, **kwargs):
             result = f()
             if not result:
                 self.system_ready = False
@@ -395,7 +730,8 @@ class TestModel(ut_utils.BaseTestCase):
 
         async def _all_units_idle():
             return units_idle
-        self.Model_mock.block_until.side_effect = _block_until
+        self.patch_object(model, 'async_block_until_model_state')
+        self.async_block_until_model_state.side_effect = _block_until
         self.patch_object(model, 'Model')
         self.Model.return_value = self.Model_mock
         self.Model_mock.all_units_idle.return_value = _all_units_idle
@@ -430,6 +766,51 @@ class TestModel(ut_utils.BaseTestCase):
         # Test will fail if an Exception is raised
         model.check_model_for_hard_errors(self.Model_mock)
 
+    def test_unit_error_index(self):
+        type(self.unit1).workload_status = mock.PropertyMock(
+            return_value='error')
+        type(self.unit2).workload_status = mock.PropertyMock(
+            return_value='active')
+        index = model.watch_unit_errors(self.Model_mock)
+        self.assertIs(model.watch_unit_errors(self.Model_mock), index)
+        self.Model_mock.add_observer.assert_called_once_with(
+            index, entity_type='unit')
+        self.assertEqual(index.units, set(['app/2']))
+
+        def _delta(unit_name):
+            delta = mock.MagicMock()
+            delta.get_id.return_value = unit_name
+            return delta
+
+        errored = mock.MagicMock(dead=False, workload_status='error')
+        fixed = mock.MagicMock(dead=False, workload_status='active')
+        removed = mock.MagicMock(dead=True)
+        loop.run(index(_delta('app/4'), None, errored, self.Model_mock))
+        self.assertEqual(index.units, set(['app/2', 'app/4']))
+        loop.run(index(_delta('app/2'), None, fixed, self.Model_mock))
+        self.assertEqual(index.units, set(['app/4']))
+        loop.run(index(_delta('app/4'), None, removed, self.Model_mock))
+        self.assertEqual(index.units, set())
+
+    def test_check_model_for_hard_errors_indexed(self):
+        self.patch_object(model, 'units_with_wl_status_state')
+        self.units_with_wl_status_state.return_value = []
+        index = model.watch_unit_errors(self.Model_mock)
+        # Test will fail if an Exception is raised
+        model.check_model_for_hard_errors(self.Model_mock)
+        index.units.add('app/4')
+        with self.assertRaises(model.UnitError):
+            model.check_model_for_hard_errors(self.Model_mock)
+        # The model is only walked to seed the index
+        self.units_with_wl_status_state.assert_called_once_with(
+            self.Model_mock, 'error')
+
+    def test_get_model_watches_unit_errors(self):
+        self.patch_object(model, 'Model')
+        self.Model.return_value = self.Model_mock
+        loop.run(model.async_get_model('modelname'))
+        self.assertIn(self.Model_mock, model.MODEL_ERROR_UNITS)
+
     def test_check_model_for_hard_errors_found(self):
         self.patch_object(model, 'units_with_wl_status_state')
         self.units_with_wl_status_state.return_value = [self.unit1]
@@ -551,53 +932,262 @@ class TestModel(ut_utils.BaseTestCase):
             timeout=1)
         self.assertTrue(self.system_ready)
 
+    def test_get_application_states_report(self):
+        self._application_states_setup({
+            'workload-status': 'active',
+            'workload-status-message': 'Unit is ready'})
+        self.assertEqual(
+            model.get_application_states_report(self.Model_mock), {})
+        self.assertEqual(
+            model.get_application_states_report(
+                self.Model_mock,
+                states={'app': {'workload-status': 'blocked'}}),
+            {'app/2': 'workload status is "active", waiting for "blocked"',
+             'app/4': 'workload status is "active", waiting for "blocked"'})
+
+    def test_get_application_states_report_msg(self):
+        self._application_states_setup({
+            'workload-status': 'active',
+            'workload-status-message': 'Unit is not ready'})
+        report = model.get_application_states_report(self.Model_mock)
+        self.assertEqual(sorted(report.keys()), ['app/2', 'app/4'])
+        self.assertTrue(
+            report['app/2'].startswith(
+                'workload status message is "Unit is not ready"'))
+
+    def test_get_application_states_report_error(self):
+        self._application_states_setup({
+            'workload-status': 'error',
+            'workload-status-message': 'hook failed'})
+        with self.assertRaises(model.UnitError):
+            model.get_application_states_report(self.Model_mock)
+
+    def test_wait_for_application_states_logs_changes(self):
+        self._application_states_setup({
+            'workload-status': 'active',
+            'workload-status-message': 'Unit is ready'})
+        reports = [{'app/2': 'waiting'}, {'app/2': 'waiting'}, {}]
+
+        async def _block_until(model, f, timeout=None, **kwargs):
+            while not f():
+                pass
+        self.async_block_until_model_state.side_effect = _block_until
+        self.patch_object(model, 'get_application_states_report')
+        self.get_application_states_report.side_effect = reports
+        self.patch_object(model.logging, 'info')
+        model.wait_for_application_states('modelname', timeout=1)
+        self.assertEqual(self.get_application_states_report.call_count, 3)
+        self.info.assert_has_calls([
+            mock.call('Waiting for 1 unit(s) to reach desired state'),
+            mock.call('  app/2: waiting'),
+            mock.call('Waiting for 0 unit(s) to reach desired state')])
+        self.assertEqual(
+            len([c for c in self.info.call_args_list
+                 if c == mock.call('  app/2: waiting')]),
+            1)
+
     def test_get_current_model(self):
         self.patch_object(model, 'Model')
         self.Model.return_value = self.Model_mock
         self.assertEqual(model.get_current_model(), self.model_name)
 
-    def test_block_until_file_has_contents(self):
+    def _file_ready_setup(self, contents, code='0'):
         self.patch_object(model, 'Model')
         self.Model.return_value = self.Model_mock
         self.patch_object(model, 'get_juju_model', return_value='mname')
-        self.patch("builtins.open",
-                   new_callable=mock.mock_open(),
-                   name="_open")
-        _fileobj = mock.MagicMock()
-        _fileobj.__enter__().read.return_value = "somestring"
-        self._open.return_value = _fileobj
+        self.fingerprint = '10 1600000000\nabcd  /tmp/src/myfile.txt'
+
+        async def _run_on_units(unit_names, cmd, model_name=None,
+                                timeout=None):
+            return {unit_name: {'Code': code, 'Stdout': self.fingerprint}
+                    for unit_name in unit_names}
+
+        async def _get_unit_files(unit_names, paths, model_name=None):
+            return {unit_name: {'/tmp/src/myfile.txt': contents.encode()}
+                    for unit_name in unit_names}
+        self.patch_object(model, 'async_run_on_units')
+        self.async_run_on_units.side_effect = _run_on_units
+        self.patch_object(model, 'async_get_unit_files')
+        self.async_get_unit_files.side_effect = _get_unit_files
+
+    def test_block_until_file_has_contents(self):
+        self._file_ready_setup('somestring')
         model.block_until_file_has_contents(
             'app',
             '/tmp/src/myfile.txt',
             'somestring',
             timeout=0.1)
-        self.unit1.scp_from.assert_called_once_with(
-            '/tmp/src/myfile.txt', mock.ANY)
-        self.unit2.scp_from.assert_called_once_with(
-            '/tmp/src/myfile.txt', mock.ANY)
+        self.async_run_on_units.assert_called_once_with(
+            ['app/2', 'app/4'],
+            "stat -L -c '%s %Y' /tmp/src/myfile.txt && "
+            "sha256sum /tmp/src/myfile.txt",
+            model_name=None)
+        self.async_get_unit_files.assert_called_once_with(
+            ['app/2', 'app/4'],
+            ['/tmp/src/myfile.txt'],
+            model_name=None)
 
     def test_block_until_file_has_contents_missing(self):
-        self.patch_object(model, 'Model')
-        self.Model.return_value = self.Model_mock
-        self.patch_object(model, 'get_juju_model', return_value='mname')
-        self.patch("builtins.open",
-                   new_callable=mock.mock_open(),
-                   name="_open")
-        _fileobj = mock.MagicMock()
-        _fileobj.__enter__().read.return_value = "anything else"
-        self._open.return_value = _fileobj
+        self._file_ready_setup('anything else')
         with self.assertRaises(asyncio.futures.TimeoutError):
             model.block_until_file_has_contents(
                 'app',
                 '/tmp/src/myfile.txt',
                 'somestring',
                 timeout=0.1)
-        self.unit1.scp_from.assert_called_once_with(
-            '/tmp/src/myfile.txt', mock.ANY)
+        self.async_get_unit_files.assert_called_once_with(
+            ['app/2', 'app/4'],
+            ['/tmp/src/myfile.txt'],
+            model_name=None)
+
+    def test_block_until_file_has_contents_no_file(self):
+        self._file_ready_setup('somestring', code='1')
+        with self.assertRaises(asyncio.futures.TimeoutError):
+            model.block_until_file_has_contents(
+                'app',
+                '/tmp/src/myfile.txt',
+                'somestring',
+                timeout=0.1)
+        self.assertFalse(self.async_get_unit_files.called)
+
+    def test_block_until_file_has_contents_no_code(self):
+        # Juju leaves the Code out when the command exited with 0
+        self._file_ready_setup('somestring', code=None)
+        model.block_until_file_has_contents(
+            'app',
+            '/tmp/src/myfile.txt',
+            'somestring',
+            timeout=0.1)
+        self.async_get_unit_files.assert_called_once_with(
+            ['app/2', 'app/4'],
+            ['/tmp/src/myfile.txt'],
+            model_name=None)
+
+    def test_block_until_file_ready_unchanged(self):
+        self._file_ready_setup('anything else')
+
+        async def _block_until(f, timeout=None, **kwargs):
+            for i in range(3):
+                if await f():
+                    return
+                if i == 1:
+                    self.fingerprint = '14 1600000001\nef01  myfile.txt'
+            raise asyncio.futures.TimeoutError
+        self.patch_object(model, 'async_block_until')
+        self.async_block_until.side_effect = _block_until
+        with self.assertRaises(asyncio.futures.TimeoutError):
+            model.block_until_file_has_contents(
+                'app',
+                '/tmp/src/myfile.txt',
+                'somestring',
+                timeout=0.1)
+        self.assertEqual(self.async_run_on_units.call_count, 3)
+        # Contents are only fetched again once the fingerprint changes
+        self.assertEqual(self.async_get_unit_files.call_count, 2)
+
+    def _block_until_remote_setup(self, codes):
+        self.patch_object(model, 'get_juju_model', return_value='mname')
+
+        async def _run_on_units(unit_names, cmd, model_name=None,
+                                timeout=None):
+            if cmd.startswith('cat '):
+                return {unit_name: {'Code': '0',
+                                    'Stdout': codes.get(unit_name, '0')}
+                        for unit_name in unit_names}
+            return {unit_name: {'Code': '0'} for unit_name in unit_names}
+        self.patch_object(model, 'async_run_on_units')
+        self.async_run_on_units.side_effect = _run_on_units
+
+    def test_block_until_remote(self):
+        self._block_until_remote_setup({})
+        model.block_until_remote(
+            ['app/2', 'app/4'],
+            'test -f /tmp/x',
+            timeout=10,
+            watch_path='/tmp')
+        self.assertEqual(self.async_run_on_units.call_count, 2)
+        for call in self.async_run_on_units.call_args_list:
+            self.assertEqual(call[0][0], ['app/2', 'app/4'])
+            self.assertEqual(
+                call[1],
+                {'model_name': None,
+                 'timeout': model.REMOTE_WAIT_RUN_TIMEOUT})
+        cmd = self.async_run_on_units.call_args_list[0][0][1]
+        self.assertTrue(cmd.startswith('echo '))
+        self.assertIn('setsid nohup bash -c', cmd)
+        script = base64.b64decode(cmd.split()[1]).decode()
+        self.assertIn('if test -f /tmp/x; then', script)
+        self.assertIn('"/tmp"', script)
+        self.assertIn('$(( $(date +%s) + 10 ))', script)
+
+    def test_block_until_remote_detached(self):
+        self.patch_object(model, 'REMOTE_WAIT_INTERVAL', new=0.1)
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        ready_file = os.path.join(tmpdir, 'ready')
+        runs = []
+
+        async def _run_locally(unit_names, cmd, model_name=None,
+                               timeout=None):
+            # Runs like juju run does: the command must exit and close its
+            # output before the run, and so the hook lock, is released
+            result = subprocess.run(
+                ['bash', '-c', cmd],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                timeout=5)
+            runs.append(cmd)
+            if len(runs) == 2:
+                # The wait script keeps waiting after the first run exited
+                self.assertFalse(result.stdout)
+                open(ready_file, 'w').close()
+            return {'app/2': {'Code': str(result.returncode),
+                              'Stdout': result.stdout.decode()}}
+
+        self.patch_object(model, 'async_run_on_units')
+        self.async_run_on_units.side_effect = _run_locally
+        model.block_until_remote(
+            ['app/2'],
+            'test -f {}'.format(ready_file),
+            timeout=10)
+        self.assertGreater(len(runs), 2)
+
+    def test_block_until_remote_timeout(self):
+        self._block_until_remote_setup({'app/4': '124'})
+        with self.assertRaises(asyncio.futures.TimeoutError):
+            model.block_until_remote(['app/2', 'app/4'], 'false', timeout=1)
+
+    def test_block_until_remote_failed(self):
+        self._block_until_remote_setup({'app/4': '2'})
+        with self.assertRaises(model.CommandRunFailed):
+            model.block_until_remote(['app/2', 'app/4'], 'false', timeout=1)
+
+    def test_block_until_file_has_contents_remote(self):
+        self.patch_object(model, 'get_juju_model', return_value='mname')
+        self.patch_object(model, 'Model')
+        self.Model.return_value = self.Model_mock
+        self.patch_object(model, 'async_block_until_remote')
+
+        async def _block_until_remote(*args, **kwargs):
+            return
+        self.async_block_until_remote.side_effect = _block_until_remote
+        model.block_until_file_has_contents(
+            'app',
+            '/tmp/src/myfile.txt',
+            'somestring',
+            timeout=10,
+            remote=True)
+        self.async_block_until_remote.assert_called_once_with(
+            ['app/2', 'app/4'],
+            'contents=$(cat /tmp/src/myfile.txt 2>/dev/null) && '
+            '[[ "$contents" == *"$(echo c29tZXN0cmluZw== | base64 -d)"* ]]',
+            model_name=None,
+            timeout=10,
+            watch_path='/tmp/src')
 
     def test_async_block_until_all_units_idle(self):
 
-        async def _block_until(f, timeout=None):
+        async def _block_until(model, f, timeout=None, **kwargs):
             if not f():
                 raise asyncio.futures.TimeoutError
 
@@ -606,13 +1196,14 @@ class TestModel(ut_utils.BaseTestCase):
         self.patch_object(model, 'Model')
         self.Model.return_value = self.Model_mock
         self.Model_mock.all_units_idle.side_effect = _all_units_idle
-        self.Model_mock.block_until.side_effect = _block_until
+        self.patch_object(model, 'async_block_until_model_state')
+        self.async_block_until_model_state.side_effect = _block_until
         # Check exception is not raised:
         model.block_until_all_units_idle('modelname')
 
     def test_async_block_until_all_units_idle_false(self):
 
-        async def _block_until(f, timeout=None):
+        async def _block_until(model, f, timeout=None, **kwargs):
             if not f():
                 raise asyncio.futures.TimeoutError
 
@@ -621,22 +1212,24 @@ class TestModel(ut_utils.BaseTestCase):
         self.Model_mock.all_units_idle.side_effect = _all_units_idle
         self.patch_object(model, 'Model')
         self.Model.return_value = self.Model_mock
-        self.Model_mock.block_until.side_effect = _block_until
+        self.patch_object(model, 'async_block_until_model_state')
+        self.async_block_until_model_state.side_effect = _block_until
         # Confirm exception is raised:
         with self.assertRaises(asyncio.futures.TimeoutError):
             model.block_until_all_units_idle('modelname')
 
     def block_until_service_status_base(self, rou_return):
 
-        async def _block_until(f, timeout=None):
+        async def _block_until(f, timeout=None, **kwargs):
             rc = await f()
             if not rc:
                 raise asyncio.futures.TimeoutError
 
-        async def _run_on_unit(unit_name, cmd, model_name=None, timeout=None):
-            return rou_return
-        self.patch_object(model, 'async_run_on_unit')
-        self.async_run_on_unit.side_effect = _run_on_unit
+        async def _run_on_units(unit_names, cmd, model_name=None,
+                                timeout=None):
+            return {unit_name: rou_return for unit_name in unit_names}
+        self.patch_object(model, 'async_run_on_units')
+        self.async_run_on_units.side_effect = _run_on_units
         self.patch_object(model, 'Model')
         self.Model.return_value = self.Model_mock
         self.patch_object(model, 'async_block_until')
@@ -644,15 +1237,57 @@ class TestModel(ut_utils.BaseTestCase):
 
     def test_block_until_service_status_check_running(self):
         self.patch_object(model, 'get_juju_model', return_value='mname')
-        self.block_until_service_status_base({'Stdout': '152 409 54'})
+        self.block_until_service_status_base(
+            {'Stdout': 'test_svc 1524409654\n'})
         model.block_until_service_status(
             'app/2',
             ['test_svc'],
             'running')
 
+    def test_block_until_service_status_remote(self):
+        self.patch_object(model, 'get_juju_model', return_value='mname')
+        self.patch_object(model, 'async_block_until_remote')
+
+        async def _block_until_remote(*args, **kwargs):
+            return
+        self.async_block_until_remote.side_effect = _block_until_remote
+        model.block_until_service_status(
+            'app/2',
+            ['svc1', 'svc2'],
+            'stopped',
+            timeout=10,
+            remote=True)
+        self.async_block_until_remote.assert_called_once_with(
+            ['app/2'],
+            '! pidof -x svc1 > /dev/null && ! pidof -x svc2 > /dev/null',
+            model_name=None,
+            timeout=10)
+
+    def test_block_until_services_restarted_remote(self):
+        self.patch_object(model, 'get_juju_model', return_value='mname')
+        self.patch_object(model, 'Model')
+        self.Model.return_value = self.Model_mock
+        self.patch_object(model, 'async_block_until_remote')
+
+        async def _block_until_remote(*args, **kwargs):
+            return
+        self.async_block_until_remote.side_effect = _block_until_remote
+        model.block_until_services_restarted(
+            'app',
+            1528294585,
+            ['svc1'],
+            timeout=10,
+            remote=True)
+        self.async_block_until_remote.assert_called_once_with(
+            ['app/2', 'app/4'],
+            '[ "$(stat -c %Y /proc/$(pidof -x svc1 | cut -f1 -d \' \') '
+            '2>/dev/null)" -ge 1528294585 ] 2>/dev/null',
+            model_name=None,
+            timeout=10)
+
     def test_block_until_service_status_check_running_fail(self):
         self.patch_object(model, 'get_juju_model', return_value='mname')
-        self.block_until_service_status_base({'Stdout': ''})
+        self.block_until_service_status_base({'Stdout': 'test_svc\n'})
         with self.assertRaises(asyncio.futures.TimeoutError):
             model.block_until_service_status(
                 'app/2',
@@ -661,7 +1296,7 @@ class TestModel(ut_utils.BaseTestCase):
 
     def test_block_until_service_status_check_stopped(self):
         self.patch_object(model, 'get_juju_model', return_value='mname')
-        self.block_until_service_status_base({'Stdout': ''})
+        self.block_until_service_status_base({'Stdout': 'test_svc\n'})
         model.block_until_service_status(
             'app/2',
             ['test_svc'],
@@ -669,7 +1304,8 @@ class TestModel(ut_utils.BaseTestCase):
 
     def test_block_until_service_status_check_stopped_fail(self):
         self.patch_object(model, 'get_juju_model', return_value='mname')
-        self.block_until_service_status_base({'Stdout': '152 409 54'})
+        self.block_until_service_status_base(
+            {'Stdout': 'test_svc 1524409654\n'})
         with self.assertRaises(asyncio.futures.TimeoutError):
             model.block_until_service_status(
                 'app/2',
@@ -729,16 +1365,33 @@ class TestModel(ut_utils.BaseTestCase):
         with self.assertRaises(model.ServiceNotRunning):
             model.get_unit_service_start_time('app/2', 'mysvc1')
 
+    def test_get_unit_service_states(self):
+        async def _run_on_units(unit_names, command, model_name=None,
+                                timeout=None):
+            return {
+                'app/2': {'Stdout': 'svc1 1524409654\nsvc2\n'},
+                'app/4': {'Stdout': 'svc1 1524409655\nsvc2 1524409656\n'}}
+        self.patch_object(model, 'async_run_on_units')
+        self.async_run_on_units.side_effect = _run_on_units
+        self.assertEqual(
+            model.get_unit_service_states(
+                ['app/2', 'app/4', 'app/5'],
+                ['svc1', 'svc2']),
+            {'app/2': {'svc1': 1524409654, 'svc2': None},
+             'app/4': {'svc1': 1524409655, 'svc2': 1524409656},
+             'app/5': {'svc1': None, 'svc2': None}})
+        self.async_run_on_units.assert_called_once_with(
+            ['app/2', 'app/4', 'app/5'],
+            mock.ANY,
+            model_name=None,
+            timeout=None)
+        self.assertIn(
+            'for svc in svc1 svc2;',
+            self.async_run_on_units.call_args[0][1])
+
     def block_until_oslo_config_entries_match_base(self, file_contents,
                                                    expected_contents):
-        async def _scp_from(remote_file, tmpdir):
-            with open('{}/myfile.txt'.format(tmpdir), 'w') as f:
-                f.write(file_contents)
-        self.patch_object(model, 'Model')
-        self.patch_object(model, 'get_juju_model', return_value='mname')
-        self.Model.return_value = self.Model_mock
-        self.unit1.scp_from.side_effect = _scp_from
-        self.unit2.scp_from.side_effect = _scp_from
+        self._file_ready_setup(file_contents)
         model.block_until_oslo_config_entries_match(
             'app',
             '/tmp/src/myfile.txt',
@@ -771,10 +1424,10 @@ disk_formats = ami,ari,aki,vhd,vmdk,raw,qcow2,vdi,iso,root-tar
         self.block_until_oslo_config_entries_match_base(
             file_contents,
             expected_contents)
-        self.unit1.scp_from.assert_called_once_with(
-            '/tmp/src/myfile.txt', mock.ANY)
-        self.unit2.scp_from.assert_called_once_with(
-            '/tmp/src/myfile.txt', mock.ANY)
+        self.async_get_unit_files.assert_called_once_with(
+            ['app/2', 'app/4'],
+            ['/tmp/src/myfile.txt'],
+            model_name=None)
 
     def test_block_until_oslo_config_entries_match_fail(self):
         file_contents = """
@@ -803,8 +1456,10 @@ disk_formats = ami,ari,aki,vhd,vmdk,raw,qcow2,vdi,iso,root-tar
             self.block_until_oslo_config_entries_match_base(
                 file_contents,
                 expected_contents)
-        self.unit1.scp_from.assert_called_once_with(
-            '/tmp/src/myfile.txt', mock.ANY)
+        self.async_get_unit_files.assert_called_once_with(
+            ['app/2', 'app/4'],
+            ['/tmp/src/myfile.txt'],
+            model_name=None)
 
     def test_block_until_oslo_config_entries_match_missing_entry(self):
         file_contents = """
@@ -832,8 +1487,10 @@ disk_formats = ami,ari,aki,vhd,vmdk,raw,qcow2,vdi,iso,root-tar
             self.block_until_oslo_config_entries_match_base(
                 file_contents,
                 expected_contents)
-        self.unit1.scp_from.assert_called_once_with(
-            '/tmp/src/myfile.txt', mock.ANY)
+        self.async_get_unit_files.assert_called_once_with(
+            ['app/2', 'app/4'],
+            ['/tmp/src/myfile.txt'],
+            model_name=None)
 
     def test_block_until_oslo_config_entries_match_missing_section(self):
         file_contents = """
@@ -856,27 +1513,69 @@ disk_formats = ami,ari,aki,vhd,vmdk,raw,qcow2,vdi,iso,root-tar
             self.block_until_oslo_config_entries_match_base(
                 file_contents,
                 expected_contents)
-        self.unit1.scp_from.assert_called_once_with(
-            '/tmp/src/myfile.txt', mock.ANY)
+        self.async_get_unit_files.assert_called_once_with(
+            ['app/2', 'app/4'],
+            ['/tmp/src/myfile.txt'],
+            model_name=None)
+
+    def test_parse_oslo_config(self):
+        file_contents = """
+[DEFAULT]
+debug = False
+workers = 4
+
+[glance_store]
+stores = file
+stores = http
+"""
+        self.assertEqual(
+            model.parse_oslo_config(file_contents.encode()),
+            {'DEFAULT': {'debug': ['False'], 'workers': ['4']},
+             'glance_store': {'stores': ['file', 'http']}})
+
+    def test_parse_oslo_config_cached(self):
+        parses = []
+        parse = model.OsloConfigParser.parse
+
+        def _parse(parser):
+            parses.append(parser.contents)
+            return parse(parser)
+        self.patch_object(model.OsloConfigParser, 'parse', new=_parse)
+        first = model.parse_oslo_config('[DEFAULT]\ndebug = True\n')
+        second = model.parse_oslo_config(b'[DEFAULT]\ndebug = True\n')
+        self.assertIs(first, second)
+        self.assertEqual(first, {'DEFAULT': {'debug': ['True']}})
+        self.assertEqual(parses, ['[DEFAULT]\ndebug = True\n'])
+        model.parse_oslo_config('[DEFAULT]\ndebug = False\n')
+        self.assertEqual(len(parses), 2)
+
+    def test_parse_oslo_config_cache_size(self):
+        self.patch_object(model, 'OSLO_CONFIG_CACHE_SIZE', new=2)
+        for i in range(3):
+            model.parse_oslo_config('[DEFAULT]\nworkers = {}\n'.format(i))
+        self.assertEqual(len(model.OSLO_CONFIG_CACHE), 2)
 
     def block_until_services_restarted_base(self, gu_return=None,
                                             gu_raise_exception=False):
-        async def _block_until(f, timeout=None):
+        async def _block_until(f, timeout=None, **kwargs):
             rc = await f()
             if not rc:
                 raise asyncio.futures.TimeoutError
         self.patch_object(model, 'async_block_until')
         self.async_block_until.side_effect = _block_until
 
-        async def _async_get_unit_service_start_time(model_name, unit, svc):
+        async def _async_get_unit_service_states(unit_names, services,
+                                                 model_name=None):
             if gu_raise_exception:
-                raise model.ServiceNotRunning('sv1')
+                start_time = None
             else:
-                return gu_return
+                start_time = gu_return
+            return {unit_name: {svc: start_time for svc in services}
+                    for unit_name in unit_names}
         self.patch_object(model, 'get_juju_model', return_value='mname')
-        self.patch_object(model, 'async_get_unit_service_start_time')
-        self.async_get_unit_service_start_time.side_effect = \
-            _async_get_unit_service_start_time
+        self.patch_object(model, 'async_get_unit_service_states')
+        self.async_get_unit_service_states.side_effect = \
+            _async_get_unit_service_states
         self.patch_object(model, 'Model')
         self.Model.return_value = self.Model_mock
 
@@ -886,6 +1585,10 @@ disk_formats = ami,ari,aki,vhd,vmdk,raw,qcow2,vdi,iso,root-tar
             'app',
             8,
             ['svc1', 'svc2'])
+        self.async_get_unit_service_states.assert_called_once_with(
+            ['app/2', 'app/4'],
+            ['svc1', 'svc2'],
+            model_name=None)
 
     def test_block_until_services_restarted_fail(self):
         self.block_until_services_restarted_base(gu_return=10)
@@ -904,12 +1607,12 @@ disk_formats = ami,ari,aki,vhd,vmdk,raw,qcow2,vdi,iso,root-tar
                 ['svc1', 'svc2'])
 
     def test_block_until_unit_wl_status(self):
-        async def _block_until(f, timeout=None):
+        async def _block_until(model, f, timeout=None, **kwargs):
             rc = await f()
             if not rc:
                 raise asyncio.futures.TimeoutError
 
-        async def _get_status():
+        async def _get_status(model_name=None):
             return self.juju_status
 
         self.patch_object(model, 'Model')
@@ -918,20 +1621,26 @@ disk_formats = ami,ari,aki,vhd,vmdk,raw,qcow2,vdi,iso,root-tar
         self.patch_object(model, 'get_unit_from_name')
         self.patch_object(model, 'async_get_status')
         self.async_get_status.side_effect = _get_status
-        self.patch_object(model, 'async_block_until')
-        self.async_block_until.side_effect = _block_until
+        self.patch_object(model, 'async_block_until_model_state')
+        self.async_block_until_model_state.side_effect = _block_until
         model.block_until_unit_wl_status(
             'app/1',
             'active',
             timeout=0.1)
+        self.async_block_until_model_state.assert_called_once_with(
+            self.Model_mock,
+            mock.ANY,
+            entity_type='unit',
+            entity_id='app/1',
+            timeout=0.1)
 
     def test_block_until_unit_wl_status_fail(self):
-        async def _block_until(f, timeout=None):
+        async def _block_until(model, f, timeout=None, **kwargs):
             rc = await f()
             if not rc:
                 raise asyncio.futures.TimeoutError
 
-        async def _get_status():
+        async def _get_status(model_name=None):
             return self.juju_status
 
         (self.juju_status.applications[self.application]
@@ -943,8 +1652,8 @@ disk_formats = ami,ari,aki,vhd,vmdk,raw,qcow2,vdi,iso,root-tar
         self.patch_object(model, 'get_unit_from_name')
         self.patch_object(model, 'async_get_status')
         self.async_get_status.side_effect = _get_status
-        self.patch_object(model, 'async_block_until')
-        self.async_block_until.side_effect = _block_until
+        self.patch_object(model, 'async_block_until_model_state')
+        self.async_block_until_model_state.side_effect = _block_until
         with self.assertRaises(asyncio.futures.TimeoutError):
             model.block_until_unit_wl_status(
                 'app/1',
@@ -952,7 +1661,7 @@ disk_formats = ami,ari,aki,vhd,vmdk,raw,qcow2,vdi,iso,root-tar
                 timeout=0.1)
 
     def test_wait_for_agent_status(self):
-        async def _block_until(f, timeout=None):
+        async def _block_until(model, f, timeout=None, **kwargs):
             if not f():
                 raise asyncio.futures.TimeoutError
         self.patch_object(model, 'get_juju_model', return_value='mname')
@@ -960,17 +1669,19 @@ disk_formats = ami,ari,aki,vhd,vmdk,raw,qcow2,vdi,iso,root-tar
         self.unit1.data = {'agent-status': {'current': 'idle'}}
         self.unit2.data = {'agent-status': {'current': 'executing'}}
         self.Model.return_value = self.Model_mock
-        self.Model_mock.block_until.side_effect = _block_until
+        self.patch_object(model, 'async_block_until_model_state')
+        self.async_block_until_model_state.side_effect = _block_until
         model.wait_for_agent_status(timeout=0.1)
 
     def test_wait_for_agent_status_timeout(self):
-        async def _block_until(f, timeout=None):
+        async def _block_until(model, f, timeout=None, **kwargs):
             if not f():
                 raise asyncio.futures.TimeoutError
         self.patch_object(model, 'get_juju_model', return_value='mname')
         self.patch_object(model, 'Model')
         self.Model.return_value = self.Model_mock
-        self.Model_mock.block_until.side_effect = _block_until
+        self.patch_object(model, 'async_block_until_model_state')
+        self.async_block_until_model_state.side_effect = _block_until
         with self.assertRaises(asyncio.futures.TimeoutError):
             model.wait_for_agent_status(timeout=0.1)
 
@@ -1006,6 +1717,78 @@ disk_formats = ami,ari,aki,vhd,vmdk,raw,qcow2,vdi,iso,root-tar
             ["juju", "set-series", "-m", self.model_name,
              _application, _to_series])
 
+    def _block_until_model_state_setup(self):
+        self.observers = []
+
+        def _add_observer(callable_, entity_type=None, entity_id=None):
+            self.observers.append((callable_, entity_type, entity_id))
+        self.Model_mock.add_observer.side_effect = _add_observer
+
+    def test_block_until_model_state(self):
+        self._block_until_model_state_setup()
+        self.state = {'ready': False, 'checks': 0}
+
+        def _ready():
+            self.state['checks'] += 1
+            return self.state['ready']
+
+        async def _change():
+            await asyncio.sleep(0.01)
+            self.state['ready'] = True
+            callable_, entity_type, entity_id = self.observers[0]
+            await callable_(mock.MagicMock(), None, None, self.Model_mock)
+
+        async def _test():
+            await asyncio.gather(
+                model.async_block_until_model_state(
+                    self.Model_mock,
+                    _ready,
+                    entity_type='unit',
+                    entity_id='app/2',
+                    timeout=1),
+                _change())
+
+        loop.run(_test())
+        self.assertEqual(self.state['checks'], 2)
+        self.assertEqual(self.observers[0][1:], ('unit', 'app/2'))
+
+    def test_block_until_model_state_async_condition(self):
+        self._block_until_model_state_setup()
+
+        async def _ready():
+            return True
+
+        loop.run(model.async_block_until_model_state(
+            self.Model_mock,
+            _ready,
+            timeout=1))
+
+    def test_block_until_model_state_timeout(self):
+        self._block_until_model_state_setup()
+        self.checks = 0
+
+        def _ready():
+            self.checks += 1
+            return False
+
+        with self.assertRaises(asyncio.futures.TimeoutError):
+            loop.run(model.async_block_until_model_state(
+                self.Model_mock,
+                _ready,
+                timeout=0.1,
+                recheck_period=0.04))
+        # Re-checked by the periodic check only as no deltas arrived
+        self.assertGreater(self.checks, 1)
+
+    def test_block_until_model_state_disconnected(self):
+        self._block_until_model_state_setup()
+        self.Model_mock.is_connected.return_value = False
+        with self.assertRaises(model.websockets.ConnectionClosed):
+            loop.run(model.async_block_until_model_state(
+                self.Model_mock,
+                lambda: True,
+                timeout=1))
+
 
 class AsyncModelTests(aiounittest.AsyncTestCase):
 
@@ -1029,3 +1812,57 @@ class AsyncModelTests(aiounittest.AsyncTestCase):
             return True
 
         await model.async_block_until(_f, _g, timeout=0.1)
+
+    async def test_async_block_until_concurrent(self):
+        cancelled = []
+
+        async def _f():
+            return False
+
+        async def _slow():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+            return True
+
+        with self.assertRaises(asyncio.futures.TimeoutError):
+            await model.async_block_until(
+                _slow, _f, concurrent=True, wait_period=0.5, timeout=0.1)
+        await asyncio.sleep(0)
+        self.assertEqual(cancelled, [True])
+
+    async def test_async_block_until_concurrent_pass(self):
+        stats = {}
+
+        async def _f():
+            await asyncio.sleep(0.01)
+            return True
+
+        async def _g():
+            return True
+
+        await model.async_block_until(
+            _f, _g, concurrent=True, timeout=0.1, stats=stats)
+        self.assertEqual(stats[0]['name'], '_f')
+        self.assertEqual(stats[0]['calls'], 1)
+        self.assertGreater(stats[0]['total'], 0)
+        self.assertEqual(stats[1]['calls'], 1)
+
+    async def test_async_block_until_backoff(self):
+        fixed_stats = {}
+        backoff_stats = {}
+
+        async def _f():
+            return False
+
+        with self.assertRaises(asyncio.futures.TimeoutError):
+            await model.async_block_until(
+                _f, wait_period=0.01, timeout=0.2, stats=fixed_stats)
+        with self.assertRaises(asyncio.futures.TimeoutError):
+            await model.async_block_until(
+                _f, wait_period=0.01, backoff=4, max_wait_period=1,
+                jitter=0.1, timeout=0.2, stats=backoff_stats)
+        self.assertLessEqual(backoff_stats[0]['calls'], 4)
+        self.assertGreater(fixed_stats[0]['calls'], 8)
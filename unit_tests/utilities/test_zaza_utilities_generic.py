@@ -14,7 +14,9 @@
 
 import mock
 import unit_tests.utils as ut_utils
+import zaza.model
 from zaza.utilities import generic as generic_utils
+from zaza.utilities import openstack as openstack_utils
 
 FAKE_STATUS = {
     'can-upgrade-to': '',
@@ -91,31 +93,141 @@ class TestGenericUtils(ut_utils.BaseTestCase):
             _data[net_topology])
         self.get_undercloud_env_vars.assert_called_once_with()
 
+    def _package_inventory_setup(self):
+        generic_utils.PACKAGE_INVENTORIES.clear()
+        self.status = mock.MagicMock()
+        self.status.machines = {
+            '0': {'series': 'bionic'},
+            '1': {'series': 'bionic'}}
+        self.status.applications = {
+            'os-thingy': {
+                'charm': 'cs:os-thingy-7',
+                'units': {
+                    'os-thingy/7': {
+                        'machine': '0',
+                        'agent-status': {'since': '1'},
+                        'subordinates': {
+                            'sub/0': {'agent-status': {'since': '2'}}}},
+                    'os-thingy/12': {
+                        'machine': '1',
+                        'agent-status': {'since': '3'}}}}}
+        self.patch_object(generic_utils.juju_utils, 'get_status_snapshot')
+        self.get_status_snapshot.side_effect = (
+            lambda model_name=None: generic_utils.juju_utils.StatusSnapshot(
+                self.status))
+        self.model.get_juju_model.return_value = 'mname'
+        self.model.CommandRunFailed = zaza.model.CommandRunFailed
+        self.model.run_succeeded = zaza.model.run_succeeded
+        self.dpkg_output = {
+            'os-thingy/7': (
+                'os-thingy 2:27.0.0-0ubuntu1~cloud0 ii \n'
+                'old-thingy 1.0 rc \n'),
+            'os-thingy/12': 'os-thingy 2:27.0.0-0ubuntu1~cloud0 ii \n',
+            'sub/0': 'sub 1.0 ii \n'}
+
+        # Juju leaves the Code out when the command exited with 0
+        def _run_on_units(unit_names, command, model_name=None):
+            return {unit_name: {'Stdout': self.dpkg_output[unit_name]}
+                    for unit_name in unit_names}
+        self.model.run_on_units.side_effect = _run_on_units
+
+    def test_get_package_inventory(self):
+        self._package_inventory_setup()
+        self.assertEqual(
+            generic_utils.get_package_inventory(
+                ['os-thingy/7', 'sub/0', 'os-thingy/12']),
+            {'os-thingy/7': {'os-thingy': '2:27.0.0-0ubuntu1~cloud0'},
+             'sub/0': {'os-thingy': '2:27.0.0-0ubuntu1~cloud0'},
+             'os-thingy/12': {'os-thingy': '2:27.0.0-0ubuntu1~cloud0'}})
+        # One unit per machine is queried
+        self.model.run_on_units.assert_called_once_with(
+            ['os-thingy/7', 'os-thingy/12'],
+            generic_utils.PACKAGE_INVENTORY_CMD,
+            model_name='mname')
+
+    def test_get_package_inventory_signature(self):
+        self._package_inventory_setup()
+        signature = generic_utils.get_package_inventory_signature(
+            ['os-thingy/7', 'sub/0'])
+        self.assertEqual(
+            signature,
+            (('0', ('bionic', (
+                ('os-thingy/7', 'cs:os-thingy-7', '1'),
+                ('sub/0', None, '2')))),))
+        # A hook run on the machine changes the signature
+        self.status.applications['os-thingy']['units']['os-thingy/7'][
+            'agent-status']['since'] = '4'
+        self.assertNotEqual(
+            generic_utils.get_package_inventory_signature(['os-thingy/7']),
+            signature)
+
+    def test_get_package_inventory_cached(self):
+        self._package_inventory_setup()
+        generic_utils.get_package_inventory(['os-thingy/7', 'os-thingy/12'])
+        generic_utils.get_package_inventory(['os-thingy/7', 'os-thingy/12'])
+        self.assertEqual(self.model.run_on_units.call_count, 1)
+        # A hook run on machine 1 only invalidates machine 1
+        self.status.applications['os-thingy']['units']['os-thingy/12'][
+            'agent-status']['since'] = '4'
+        generic_utils.get_package_inventory(['os-thingy/7', 'os-thingy/12'])
+        self.model.run_on_units.assert_called_with(
+            ['os-thingy/12'],
+            generic_utils.PACKAGE_INVENTORY_CMD,
+            model_name='mname')
+        # A charm upgrade invalidates both machines
+        self.status.applications['os-thingy']['charm'] = 'cs:os-thingy-8'
+        generic_utils.get_package_inventory(['os-thingy/7', 'os-thingy/12'])
+        self.model.run_on_units.assert_called_with(
+            ['os-thingy/7', 'os-thingy/12'],
+            generic_utils.PACKAGE_INVENTORY_CMD,
+            model_name='mname')
+        # A series upgrade invalidates the upgraded machine
+        self.status.machines['0']['series'] = 'focal'
+        generic_utils.get_package_inventory(['os-thingy/7', 'os-thingy/12'])
+        self.model.run_on_units.assert_called_with(
+            ['os-thingy/7'],
+            generic_utils.PACKAGE_INVENTORY_CMD,
+            model_name='mname')
+        generic_utils.invalidate_package_inventory()
+        self.assertEqual(generic_utils.PACKAGE_INVENTORIES, {})
+
+    def test_get_package_inventory_failed(self):
+        self._package_inventory_setup()
+        self.model.run_on_units.side_effect = None
+        self.model.run_on_units.return_value = {
+            'os-thingy/7': {'Code': '1', 'Stdout': '', 'Stderr': ''}}
+        with self.assertRaises(zaza.model.CommandRunFailed):
+            generic_utils.get_package_inventory(['os-thingy/7'])
+        # A unit without results did not run the command
+        self.model.run_on_units.return_value = {}
+        with self.assertRaises(zaza.model.CommandRunFailed):
+            generic_utils.get_package_inventory(['os-thingy/7'])
+
     def test_get_pkg_version(self):
-        self.patch_object(generic_utils.model, "get_units")
-        self.patch_object(generic_utils.juju_utils, "remote_run")
-        _pkg = "os-thingy"
-        _version = "2:27.0.0-0ubuntu1~cloud0"
-        _dpkg_output = ("ii {} {} all OpenStack thingy\n"
-                        .format(_pkg, _version))
-        self.remote_run.return_value = _dpkg_output
-        _unit1 = mock.MagicMock()
-        _unit1.entity_id = "os-thingy/7"
-        _unit2 = mock.MagicMock()
-        _unit2.entity_id = "os-thingy/12"
-        _units = [_unit1, _unit2]
-        self.get_units.return_value = _units
+        self._package_inventory_setup()
+        units = []
+        for unit_name in ['os-thingy/7', 'os-thingy/12']:
+            unit = mock.MagicMock()
+            unit.entity_id = unit_name
+            units.append(unit)
+        self.model.get_units.return_value = units
 
         # Matching
-        self.assertEqual(generic_utils.get_pkg_version(_pkg, _pkg),
-                         _version)
+        self.assertEqual(
+            generic_utils.get_pkg_version('os-thingy', 'os-thingy'),
+            '2:27.0.0-0ubuntu1~cloud0')
+        self.model.get_units.assert_called_once_with(
+            'os-thingy', model_name=None)
+
+        # Not installed
+        with self.assertRaises(Exception):
+            generic_utils.get_pkg_version('os-thingy', 'old-thingy')
 
         # Mismatched
-        _different_dpkg_output = ("ii {} {} all OpenStack thingy\n"
-                                  .format(_pkg, "DIFFERENT"))
-        self.remote_run.side_effect = [_dpkg_output, _different_dpkg_output]
+        generic_utils.invalidate_package_inventory()
+        self.dpkg_output['os-thingy/12'] = 'os-thingy DIFFERENT ii \n'
         with self.assertRaises(Exception):
-            generic_utils.get_pkg_version(_pkg, _pkg)
+            generic_utils.get_pkg_version('os-thingy', 'os-thingy')
 
     def test_get_undercloud_env_vars(self):
         self.patch_object(generic_utils.os.environ, "get")
@@ -211,12 +323,23 @@ class TestGenericUtils(ut_utils.BaseTestCase):
     def test_set_origin(self):
         "application, origin='openstack-origin', pocket='distro'):"
         self.patch_object(generic_utils.model, "set_application_config")
+        self.patch_object(generic_utils, "invalidate_deployed_versions")
         _application = "application"
         _origin = "source"
         _pocket = "cloud:fake-cloud"
         generic_utils.set_origin(_application, origin=_origin, pocket=_pocket)
         self.set_application_config.assert_called_once_with(
             _application, {_origin: _pocket})
+        self.invalidate_deployed_versions.assert_called_once_with()
+
+    def test_invalidate_deployed_versions(self):
+        generic_utils.PACKAGE_INVENTORIES[('mname', '0')] = ((), {})
+        openstack_utils.OS_RELEASES['mname'] = {'keystone': 'queens'}
+        openstack_utils.OVERCLOUD_AUTH_CONTEXTS['mname'] = {}
+        generic_utils.invalidate_deployed_versions()
+        self.assertEqual(generic_utils.PACKAGE_INVENTORIES, {})
+        self.assertEqual(openstack_utils.OS_RELEASES, {})
+        self.assertEqual(openstack_utils.OVERCLOUD_AUTH_CONTEXTS, {})
 
     def test_series_upgrade(self):
         self.patch_object(generic_utils.model, "block_until_all_units_idle")
@@ -227,6 +350,8 @@ class TestGenericUtils(ut_utils.BaseTestCase):
         self.patch_object(generic_utils, "set_origin")
         self.patch_object(generic_utils, "wrap_do_release_upgrade")
         self.patch_object(generic_utils, "reboot")
+        self.patch_object(
+            generic_utils.juju_utils, "invalidate_status_snapshot")
         _unit = "app/2"
         _application = "app"
         _machine_num = "4"
@@ -249,6 +374,7 @@ class TestGenericUtils(ut_utils.BaseTestCase):
         self.set_series.assert_called_once_with(_application, _to_series)
         self.set_origin.assert_called_once_with(_application, _origin)
         self.reboot.assert_called_once_with(_unit)
+        self.invalidate_status_snapshot.assert_called_once_with()
 
     def test_series_upgrade_application_pause_peers_and_subordinates(self):
         self.patch_object(generic_utils.model, "run_action")
@@ -0,0 +1,188 @@
+# Copyright 2018 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import io
+import mock
+import os
+import shutil
+import tempfile
+import urllib.error
+
+import unit_tests.utils as ut_utils
+from zaza.utilities import exceptions
+from zaza.utilities import image_cache
+
+
+IMAGE = b'cirros image contents'
+IMAGE_URL = 'http://cirros/0.4.0/c.img'
+
+
+class FakeResponse(io.BytesIO):
+
+    def __init__(self, data, headers=None):
+        super(FakeResponse, self).__init__(data)
+        self.headers = headers or {}
+
+
+class FakeOpener(object):
+    """Serve IMAGE and the given checksum files, honouring Range."""
+
+    def __init__(self, checksum_files=None, ranges=True):
+        self.checksum_files = checksum_files or {}
+        self.ranges = ranges
+        self.requests = []
+
+    def open(self, request):
+        if isinstance(request, str):
+            name = request.rsplit('/', 1)[1]
+            if name not in self.checksum_files:
+                raise urllib.error.HTTPError(request, 404, '', {}, None)
+            return FakeResponse(self.checksum_files[name].encode())
+        self.requests.append(request)
+        data_range = request.get_header('Range')
+        if data_range and self.ranges:
+            offset = int(data_range[6:-1])
+            return FakeResponse(
+                IMAGE[offset:],
+                {'Content-Range': 'bytes {}-{}/{}'.format(
+                    offset, len(IMAGE) - 1, len(IMAGE))})
+        return FakeResponse(IMAGE, {'Content-Length': str(len(IMAGE))})
+
+
+class TestImageCache(ut_utils.BaseTestCase):
+
+    def setUp(self):
+        super(TestImageCache, self).setUp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        self.patch_object(image_cache, 'PUBLISHED_CHECKSUMS', new={})
+        self.sha256 = hashlib.sha256(IMAGE).hexdigest()
+        self.md5 = hashlib.md5(IMAGE).hexdigest()
+        self.target = os.path.join(self.cache_dir, 'c.img')
+
+    def _add_entries(self):
+        for name, mtime in (('old', 100), ('new', 200)):
+            os.makedirs(os.path.join(self.cache_dir, name))
+            with open(os.path.join(self.cache_dir, name, 'i.img'), 'wb') as f:
+                f.write(IMAGE)
+            os.utime(os.path.join(self.cache_dir, name), (mtime, mtime))
+
+    def test_get_published_checksum(self):
+        opener = FakeOpener({
+            'SHA256SUMS': '{} *other.img\n{} *c.img\n'.format(
+                'a' * 64, self.sha256),
+            'MD5SUMS': '{}  c.img\n'.format(self.md5)})
+        self.assertEqual(
+            image_cache.get_published_checksum(IMAGE_URL, opener=opener),
+            ('sha256', self.sha256))
+
+    def test_get_published_checksum_fallback(self):
+        opener = FakeOpener({'MD5SUMS': '{}  c.img\n'.format(self.md5)})
+        self.assertEqual(
+            image_cache.get_published_checksum(IMAGE_URL, opener=opener),
+            ('md5', self.md5))
+        self.assertEqual(
+            image_cache.get_published_checksum(
+                'http://cirros/0.3.5/c.img', opener=FakeOpener()),
+            (None, None))
+
+    def test_get_published_checksum_cached(self):
+        opener = FakeOpener({'MD5SUMS': '{}  c.img\n'.format(self.md5)})
+        image_cache.get_published_checksum(IMAGE_URL, opener=opener)
+        self.assertEqual(
+            image_cache.get_published_checksum(
+                IMAGE_URL, opener=FakeOpener()),
+            ('md5', self.md5))
+
+    def test_download(self):
+        image_cache.download(
+            IMAGE_URL,
+            self.target,
+            checksum=('sha256', self.sha256),
+            opener=FakeOpener())
+        with open(self.target, 'rb') as f:
+            self.assertEqual(f.read(), IMAGE)
+        self.assertFalse(os.path.exists(self.target + '.part'))
+
+    def test_download_checksum_mismatch(self):
+        with self.assertRaises(exceptions.ImageVerificationFailed):
+            image_cache.download(
+                IMAGE_URL,
+                self.target,
+                checksum=('sha256', 'a' * 64),
+                opener=FakeOpener())
+        self.assertFalse(os.path.exists(self.target))
+        self.assertFalse(os.path.exists(self.target + '.part'))
+
+    def test_download_resume(self):
+        with open(self.target + '.part', 'wb') as f:
+            f.write(IMAGE[:6])
+        opener = FakeOpener()
+        image_cache.download(
+            IMAGE_URL,
+            self.target,
+            checksum=('md5', self.md5),
+            opener=opener)
+        self.assertEqual(opener.requests[0].get_header('Range'), 'bytes=6-')
+        with open(self.target, 'rb') as f:
+            self.assertEqual(f.read(), IMAGE)
+
+    def test_download_resume_unsupported(self):
+        with open(self.target + '.part', 'wb') as f:
+            f.write(b'stale')
+        image_cache.download(
+            IMAGE_URL,
+            self.target,
+            checksum=('md5', self.md5),
+            opener=FakeOpener(ranges=False))
+        with open(self.target, 'rb') as f:
+            self.assertEqual(f.read(), IMAGE)
+
+    def test_cached_image(self):
+        opener = FakeOpener({'SHA256SUMS': '{} *c.img\n'.format(self.sha256)})
+        for _ in range(2):
+            with image_cache.cached_image(
+                    IMAGE_URL,
+                    cache_dir=self.cache_dir,
+                    opener=opener) as local_path:
+                with open(local_path, 'rb') as f:
+                    self.assertEqual(f.read(), IMAGE)
+        self.assertEqual(len(opener.requests), 1)
+        self.assertEqual(
+            os.path.dirname(local_path),
+            os.path.join(
+                self.cache_dir,
+                image_cache.get_cache_key(
+                    IMAGE_URL, ('sha256', self.sha256))))
+
+    def test_cached_image_evicts(self):
+        self._add_entries()
+        with image_cache.cached_image(
+                IMAGE_URL,
+                cache_dir=self.cache_dir,
+                max_size=2 * len(IMAGE),
+                opener=FakeOpener()) as local_path:
+            self.assertTrue(os.path.exists(local_path))
+        self.assertEqual(
+            sorted(image_cache.get_cache_size(self.cache_dir)),
+            sorted(['new', os.path.basename(os.path.dirname(local_path))]))
+
+    def test_evict_skips_locked(self):
+        self._add_entries()
+        with mock.patch.object(image_cache.fcntl, 'flock') as flock:
+            flock.side_effect = [OSError, None]
+            image_cache.evict(cache_dir=self.cache_dir, max_size=len(IMAGE))
+        self.assertEqual(
+            list(image_cache.get_cache_size(self.cache_dir)), ['old'])
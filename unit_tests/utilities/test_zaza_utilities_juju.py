@@ -26,7 +26,7 @@ class TestJujuUtils(ut_utils.BaseTestCase):
         self.key = "instance-id"
         self.key_data = "machine-uuid"
         self.machine = "1"
-        self.machine_data = {self.key: self.key_data}
+        self.machine_data = {self.key: self.key_data, "series": "bionic"}
         self.unit = "app/1"
         self.unit_data = {"machine": self.machine}
         self.application = "app"
@@ -36,8 +36,10 @@ class TestJujuUtils(ut_utils.BaseTestCase):
             "subordinate-to": [self.application]}
         self.juju_status = mock.MagicMock()
         self.juju_status.name = "juju_status_object"
-        self.juju_status.applications.get.return_value = self.application_data
-        self.juju_status.machines.get.return_value = self.machine_data
+        self.juju_status.applications = {
+            self.application: self.application_data}
+        self.juju_status.machines = {self.machine: self.machine_data}
+        juju_utils.STATUS_SNAPSHOTS.clear()
 
         # Model
         self.patch_object(juju_utils, "model")
@@ -67,7 +69,7 @@ class TestJujuUtils(ut_utils.BaseTestCase):
         # Full status juju object return
         self.assertEqual(
             juju_utils.get_application_status(), self.juju_status)
-        self.get_full_juju_status.assert_called_once()
+        self.get_full_juju_status.assert_called_once_with(max_age=None)
 
         # Application only dictionary return
         self.assertEqual(
@@ -93,41 +95,91 @@ class TestJujuUtils(ut_utils.BaseTestCase):
 
     def test_get_full_juju_status(self):
         self.assertEqual(juju_utils.get_full_juju_status(), self.juju_status)
-        self.model.get_status.assert_called_once_with()
+        self.assertEqual(juju_utils.get_full_juju_status(), self.juju_status)
+        self.model.get_status.assert_called_once_with(
+            model_name=self.model_name)
+        # A fresh status can be requested
+        self.assertEqual(
+            juju_utils.get_full_juju_status(max_age=0), self.juju_status)
+        self.assertEqual(self.model.get_status.call_count, 2)
+
+    def test_get_status_snapshot(self):
+        self.juju_status.applications = {
+            "app": {
+                "units": {
+                    "app/0": {
+                        "machine": "0",
+                        "leader": True,
+                        "subordinates": {
+                            "sub/1": {"leader": True}}},
+                    "app/1": {"machine": "0/lxd/2"}}},
+            "sub": {"subordinate-to": ["app"]}}
+        self.juju_status.machines = {
+            "0": {
+                "instance-id": "uuid0",
+                "series": "bionic",
+                "containers": {
+                    "0/lxd/2": {
+                        "instance-id": "uuid2",
+                        "series": "xenial"}}}}
+        snapshot = juju_utils.get_status_snapshot()
+        self.assertEqual(
+            snapshot.unit_machine,
+            {"app/0": "0", "sub/1": "0", "app/1": "0/lxd/2"})
+        self.assertEqual(
+            snapshot.machine_instance_id,
+            {"0": "uuid0", "0/lxd/2": "uuid2"})
+        self.assertEqual(
+            snapshot.machine_series,
+            {"0": "bionic", "0/lxd/2": "xenial"})
+        self.assertEqual(
+            snapshot.application_units,
+            {"app": ["app/0", "app/1"], "sub": []})
+        self.assertEqual(snapshot.subordinate_principals, {"sub": ["app"]})
+        self.assertEqual(
+            snapshot.unit_status["app/1"], {"machine": "0/lxd/2"})
+        self.assertEqual(
+            snapshot.application_charm, {"app": None, "sub": None})
+
+    def test_get_status_snapshot_cached(self):
+        snapshot = juju_utils.get_status_snapshot()
+        self.assertIs(juju_utils.get_status_snapshot(), snapshot)
+        self.model.get_status.assert_called_once_with(
+            model_name=self.model_name)
+        # Expired snapshot is replaced
+        snapshot.timestamp -= juju_utils.STATUS_SNAPSHOT_TTL + 1
+        self.assertIsNot(juju_utils.get_status_snapshot(), snapshot)
+        self.assertEqual(self.model.get_status.call_count, 2)
+
+    def test_invalidate_status_snapshot(self):
+        snapshot = juju_utils.get_status_snapshot()
+        juju_utils.invalidate_status_snapshot(self.model_name)
+        self.assertIsNot(juju_utils.get_status_snapshot(), snapshot)
+        juju_utils.invalidate_status_snapshot()
+        self.assertEqual(juju_utils.STATUS_SNAPSHOTS, {})
 
     def test_get_machines_for_application(self):
-        self.patch_object(juju_utils, "get_application_status")
-        self.get_application_status.return_value = self.application_data
-
         # Machine data
         self.assertEqual(
             juju_utils.get_machines_for_application(self.application),
             [self.machine])
-        self.get_application_status.assert_called_once()
 
         # Subordinate application has no units
-        def _get_application_status(application):
-            _apps = {
-                self.application: self.application_data,
-                self.subordinate_application:
-                    self.subordinate_application_data}
-            return _apps[application]
-        self.get_application_status.side_effect = _get_application_status
-
+        self.juju_status.applications[self.subordinate_application] = \
+            self.subordinate_application_data
+        juju_utils.invalidate_status_snapshot()
         self.assertEqual(
             juju_utils.get_machines_for_application(
                 self.subordinate_application),
             [self.machine])
+        self.model.get_status.assert_called_with(model_name=self.model_name)
+        self.assertEqual(self.model.get_status.call_count, 2)
 
     def test_get_machine_status(self):
-        self.patch_object(juju_utils, "get_full_juju_status")
-        self.get_full_juju_status.return_value = self.juju_status
-
         # All machine data
         self.assertEqual(
             juju_utils.get_machine_status(self.machine),
             self.machine_data)
-        self.get_full_juju_status.assert_called_once()
 
         # Request a specific key
         self.assertEqual(
@@ -143,6 +195,8 @@ class TestJujuUtils(ut_utils.BaseTestCase):
             [self.machine_data.get("instance-id")])
         self.get_machines_for_application.assert_called_once_with(
             self.application)
+        self.model.get_status.assert_called_once_with(
+            model_name=self.model_name)
 
     def test_get_provider_type(self):
         self.patch_object(juju_utils, "get_cloud_configs")
@@ -244,16 +298,5 @@ class TestJujuUtils(ut_utils.BaseTestCase):
         self.assertFalse(self.yaml.load.called)
 
     def test_get_machine_series(self):
-        self.patch(
-            'zaza.utilities.juju.get_machine_status',
-            new_callable=mock.MagicMock(),
-            name='_get_machine_status'
-        )
-        self._get_machine_status.return_value = 'xenial'
-        expected = 'xenial'
-        actual = juju_utils.get_machine_series('6')
-        self._get_machine_status.assert_called_with(
-            machine='6',
-            key='series'
-        )
-        self.assertEqual(expected, actual)
+        self.assertEqual(juju_utils.get_machine_series(self.machine), 'bionic')
+        self.assertIsNone(juju_utils.get_machine_series('6'))
@@ -13,9 +13,14 @@
 # limitations under the License.
 
 import copy
+import gc
+import hashlib
 import io
 import mock
+import os
+import tempfile
 import tenacity
+import weakref
 
 import unit_tests.utils as ut_utils
 from zaza.utilities import openstack as openstack_utils
@@ -26,6 +31,10 @@ class TestOpenStackUtils(ut_utils.BaseTestCase):
 
     def setUp(self):
         super(TestOpenStackUtils, self).setUp()
+        self.patch_object(openstack_utils, "KEYSTONE_SESSIONS", new={})
+        self.patch_object(openstack_utils, "SESSION_CLIENTS",
+                          new=weakref.WeakKeyDictionary())
+        self.patch_object(openstack_utils, "CIRROS_VERSIONS", new={})
         self.port_name = "port_name"
         self.net_uuid = "net_uuid"
         self.project_id = "project_uuid"
@@ -257,9 +266,13 @@ class TestOpenStackUtils(ut_utils.BaseTestCase):
         self._test_get_overcloud_auth(v2_api=True, ssl_cert=True)
 
     def test_get_overcloud_keystone_session(self):
-        self.patch_object(openstack_utils, "get_keystone_session")
+        self.patch_object(openstack_utils, "get_keystone_session",
+                          return_value=mock.MagicMock())
         self.patch_object(openstack_utils, "get_keystone_scope")
         self.patch_object(openstack_utils, "get_overcloud_auth")
+        self.patch_object(openstack_utils, "OVERCLOUD_AUTH_CONTEXTS", new={})
+        self.patch_object(openstack_utils.model, "get_juju_model",
+                          return_value="mname")
         _auth = "FAKE_AUTH"
         _scope = "PROJECT"
         self.get_keystone_scope.return_value = _scope
@@ -268,15 +281,102 @@ class TestOpenStackUtils(ut_utils.BaseTestCase):
         openstack_utils.get_overcloud_keystone_session()
         self.get_keystone_session.assert_called_once_with(_auth, scope=_scope,
                                                           verify=None)
+        # The auth context is only looked up once
+        openstack_utils.get_overcloud_keystone_session(verify=False)
+        self.get_keystone_session.assert_called_with(_auth, scope=_scope,
+                                                     verify=False)
+        self.get_overcloud_auth.assert_called_once_with()
+        self.get_keystone_scope.assert_called_once_with()
+        # Until it is invalidated
+        openstack_utils.invalidate_overcloud_auth_context("mname")
+        openstack_utils.get_overcloud_keystone_session()
+        self.assertEqual(self.get_overcloud_auth.call_count, 2)
+        openstack_utils.invalidate_overcloud_auth_context()
+        self.assertEqual(openstack_utils.OVERCLOUD_AUTH_CONTEXTS, {})
 
     def test_get_undercloud_keystone_session(self):
-        self.patch_object(openstack_utils, "get_keystone_session")
+        self.patch_object(openstack_utils, "get_keystone_session",
+                          return_value=mock.MagicMock())
         self.patch_object(openstack_utils, "get_undercloud_auth")
         _auth = "FAKE_AUTH"
         self.get_undercloud_auth.return_value = _auth
 
         openstack_utils.get_undercloud_keystone_session()
-        self.get_keystone_session.assert_called_once_with(_auth, verify=None)
+        self.get_keystone_session.assert_called_once_with(
+            _auth, scope='PROJECT', verify=None)
+        # The session is shared
+        self.assertIs(
+            openstack_utils.get_undercloud_keystone_session(),
+            self.get_keystone_session.return_value)
+        self.get_keystone_session.assert_called_once_with(
+            _auth, scope='PROJECT', verify=None)
+
+    def test_get_shared_keystone_session(self):
+        self.patch_object(openstack_utils, "get_keystone_session")
+        self.get_keystone_session.side_effect = (
+            lambda creds, scope=None, verify=None: mock.MagicMock())
+        self.patch_object(openstack_utils.novaclient_client, "Client")
+        self.Client.side_effect = lambda *args, **kwargs: mock.MagicMock()
+        cloud = ('overcloud', 'mname')
+        _session = openstack_utils.get_shared_keystone_session(cloud, {})
+        self.assertIs(
+            openstack_utils.get_shared_keystone_session(cloud, {}),
+            _session)
+        self.assertIsNot(
+            openstack_utils.get_shared_keystone_session(cloud, {},
+                                                        verify=False),
+            _session)
+        # Clients of shared sessions are shared too
+        nova_client = openstack_utils.get_nova_session_client(_session)
+        self.assertIs(
+            openstack_utils.get_nova_session_client(_session),
+            nova_client)
+        self.assertIsNot(
+            openstack_utils.get_nova_session_client(mock.MagicMock()),
+            nova_client)
+        # Invalidating the overcloud auth context drops its sessions
+        openstack_utils.get_shared_keystone_session(('undercloud',), {})
+        openstack_utils.invalidate_overcloud_auth_context('mname')
+        self.assertEqual(
+            list(openstack_utils.KEYSTONE_SESSIONS.keys()),
+            [(('undercloud',), 'PROJECT', None)])
+        self.assertEqual(len(openstack_utils.SESSION_CLIENTS), 1)
+        openstack_utils.invalidate_shared_keystone_sessions()
+        self.assertEqual(openstack_utils.KEYSTONE_SESSIONS, {})
+        self.assertEqual(len(openstack_utils.SESSION_CLIENTS), 0)
+
+    def test_session_clients_dropped_with_session(self):
+        self.patch_object(openstack_utils, "get_keystone_session")
+        self.get_keystone_session.side_effect = (
+            lambda *args, **kwargs: mock.MagicMock())
+        self.patch_object(openstack_utils, "novaclient_client")
+        _session = openstack_utils.get_shared_keystone_session(
+            ('undercloud',), {})
+        openstack_utils.get_nova_session_client(_session)
+        openstack_utils.KEYSTONE_SESSIONS.clear()
+        # Drop the references the mocks keep to the session
+        self.novaclient_client.reset_mock()
+        self.get_keystone_session.reset_mock()
+        del _session
+        gc.collect()
+        self.assertEqual(len(openstack_utils.SESSION_CLIENTS), 0)
+
+    def test_get_keystone_session(self):
+        self.patch_object(openstack_utils, "session")
+        self.patch_object(openstack_utils, "HTTP_SESSION", new=mock.sentinel)
+        self.patch_object(openstack_utils.v3, "Password")
+        openstack_utils.get_keystone_session({
+            'API_VERSION': 3,
+            'OS_USERNAME': 'admin',
+            'OS_PASSWORD': 'pass',
+            'OS_AUTH_URL': 'http://127.0.0.1:5000/v3',
+            'OS_USER_DOMAIN_NAME': 'admin_domain',
+            'OS_PROJECT_DOMAIN_NAME': 'admin_domain',
+            'OS_PROJECT_NAME': 'admin'})
+        self.session.Session.assert_called_once_with(
+            auth=self.Password.return_value,
+            verify=None,
+            session=mock.sentinel)
 
     def test_get_urllib_opener(self):
         self.patch_object(openstack_utils.urllib.request, "ProxyHandler")
@@ -312,6 +412,9 @@ class TestOpenStackUtils(ut_utils.BaseTestCase):
         self.assertEqual(
             openstack_utils.get_images_by_name(glance_client, 'bob'),
             [image_mock1])
+        glance_client.images.list.assert_called_once_with(
+            filters={'name': 'bob'},
+            page_size=openstack_utils.OPENSTACK_PAGE_SIZE)
         self.assertEqual(
             openstack_utils.get_images_by_name(glance_client, 'frank'),
             [])
@@ -324,6 +427,98 @@ class TestOpenStackUtils(ut_utils.BaseTestCase):
         self.assertEqual(
             openstack_utils.find_cirros_image('aarch64'),
             'http://download.cirros-cloud.net/12/cirros-12-aarch64-disk.img')
+        self.assertEqual(
+            openstack_utils.find_cirros_image('x86_64'),
+            'http://download.cirros-cloud.net/12/cirros-12-x86_64-disk.img')
+        self.get_urllib_opener.assert_called_once_with()
+
+    def test_get_image_source_properties(self):
+        self.assertEqual(
+            openstack_utils.get_image_source_properties(
+                'http://cirros/c.img', ('sha256', 'abc')),
+            {'zaza_source_url': 'http://cirros/c.img',
+             'zaza_source_checksum': 'sha256:abc'})
+        self.assertEqual(
+            openstack_utils.get_image_source_properties(
+                'http://cirros/c.img', (None, None)),
+            {'zaza_source_url': 'http://cirros/c.img'})
+
+    def test_find_images_by_source(self):
+        untagged = {'name': 'bob', 'status': 'active', 'checksum': 'abc'}
+        tagged = {
+            'name': 'bob',
+            'status': 'active',
+            'zaza_source_checksum': 'md5:abc',
+            'zaza_source_url': 'http://cirros/c.img'}
+        glance_client = mock.MagicMock()
+        glance_client.images.list.return_value = [untagged, tagged]
+        self.assertEqual(
+            openstack_utils.find_images_by_source(
+                glance_client, 'http://cirros/c.img', ('md5', 'abc'),
+                image_name='bob'),
+            [tagged])
+        glance_client.images.list.assert_called_once_with(
+            filters={'zaza_source_checksum': 'md5:abc',
+                     'status': 'active',
+                     'name': 'bob'},
+            page_size=openstack_utils.OPENSTACK_PAGE_SIZE)
+        self.assertEqual(
+            openstack_utils.find_images_by_source(
+                glance_client, 'http://cirros/c.img', ('md5', 'abc'),
+                image_name='bill'),
+            [])
+        self.assertEqual(
+            openstack_utils.find_images_by_source(
+                glance_client, 'http://cirros/c.img', (None, None)),
+            [tagged])
+        self.assertEqual(
+            openstack_utils.find_images_by_source(
+                glance_client, 'http://cirros/d.img', (None, None)),
+            [])
+
+    def _get_or_create_image_setup(self):
+        self.patch_object(openstack_utils, "get_urllib_opener")
+        self.patch_object(
+            openstack_utils.image_cache, "get_published_checksum",
+            return_value=('sha256', 'abc'))
+        self.patch_object(
+            openstack_utils, "find_images_by_source", return_value=[])
+        self.patch_object(
+            openstack_utils, "get_images_by_name", return_value=[])
+        self.patch_object(openstack_utils, "create_image")
+
+    def test_get_or_create_image_by_source(self):
+        self._get_or_create_image_setup()
+        image = mock.MagicMock(id='9d1125af')
+        self.find_images_by_source.return_value = [image]
+        self.assertEqual(
+            openstack_utils.get_or_create_image(
+                'glance', 'http://cirros/c.img', 'bob'),
+            image)
+        self.find_images_by_source.assert_called_once_with(
+            'glance', 'http://cirros/c.img', ('sha256', 'abc'),
+            image_name='bob')
+        self.create_image.assert_not_called()
+
+    def test_get_or_create_image_by_name(self):
+        self._get_or_create_image_setup()
+        image = mock.MagicMock(id='9d1125af')
+        self.get_images_by_name.return_value = [image]
+        self.assertEqual(
+            openstack_utils.get_or_create_image(
+                'glance', 'http://cirros/c.img', 'bob'),
+            image)
+        self.get_images_by_name.assert_called_once_with('glance', 'bob')
+        self.create_image.assert_not_called()
+
+    def test_get_or_create_image_create(self):
+        self._get_or_create_image_setup()
+        self.assertEqual(
+            openstack_utils.get_or_create_image(
+                'glance', 'http://cirros/c.img', 'bob', 'tests'),
+            self.create_image.return_value)
+        self.create_image.assert_called_once_with(
+            'glance', 'http://cirros/c.img', 'bob', 'tests')
 
     def test_find_ubuntu_image(self):
         self.assertEqual(
@@ -335,12 +530,18 @@ class TestOpenStackUtils(ut_utils.BaseTestCase):
         urllib_opener_mock = mock.MagicMock()
         self.patch_object(openstack_utils, "get_urllib_opener")
         self.get_urllib_opener.return_value = urllib_opener_mock
-        self.patch_object(openstack_utils.urllib.request, "install_opener")
-        self.patch_object(openstack_utils.urllib.request, "urlretrieve")
+        self.patch_object(
+            openstack_utils.image_cache, "get_published_checksum")
+        self.get_published_checksum.return_value = ('sha256', 'abc')
+        self.patch_object(openstack_utils.image_cache, "download")
         openstack_utils.download_image('http://cirros/c.img', '/tmp/c1.img')
-        self.install_opener.assert_called_once_with(urllib_opener_mock)
-        self.urlretrieve.assert_called_once_with(
-            'http://cirros/c.img', '/tmp/c1.img')
+        self.get_published_checksum.assert_called_once_with(
+            'http://cirros/c.img', opener=urllib_opener_mock)
+        self.download.assert_called_once_with(
+            'http://cirros/c.img',
+            '/tmp/c1.img',
+            checksum=('sha256', 'abc'),
+            opener=urllib_opener_mock)
 
     def test_resource_reaches_status(self):
         resource_mock = mock.MagicMock()
@@ -376,18 +577,121 @@ class TestOpenStackUtils(ut_utils.BaseTestCase):
                 'e01df65a',
                 'readyish')
 
+    def test_resources_reach_status(self):
+        self.patch_object(openstack_utils.time, 'sleep')
+        server_status = {
+            's1': 'BUILD', 's2': 'BUILD', 's3': 'ACTIVE', 's9': 'ACTIVE'}
+        servers = mock.MagicMock(
+            spec=openstack_utils.nova_servers.ServerManager)
+        # s3 has not changed recently so it is missing from the listing
+        servers.list.side_effect = lambda **kwargs: [
+            mock.MagicMock(id=server_id, status=server_status[server_id])
+            for server_id in ('s1', 's2', 's9')]
+        servers.get.side_effect = lambda server_id: mock.MagicMock(
+            id=server_id, status=server_status[server_id])
+        images = mock.MagicMock(spec=openstack_utils.glance_images.Controller)
+        images.list.return_value = iter([
+            mock.MagicMock(id='i1', status='active', stack_status=None),
+            mock.MagicMock(id='i2', status='active', stack_status=None)])
+        volumes = mock.MagicMock()
+        volumes.get.side_effect = lambda volume_id: mock.MagicMock(
+            id=volume_id, status='available')
+
+        def _sleep(interval):
+            server_status['s1'] = 'ACTIVE'
+            if interval > 1:
+                server_status['s2'] = 'ACTIVE'
+        self.sleep.side_effect = _sleep
+        openstack_utils.resources_reach_status([
+            (servers, 's1', 'ACTIVE'),
+            (servers, 's2', 'ACTIVE'),
+            (servers, 's3', 'ACTIVE'),
+            (images, 'i1', 'active'),
+            (images, 'i2', 'active'),
+            (volumes, 'v1', 'available'),
+            (volumes, 'v2', 'available')])
+        # One list call per poll while several servers are pending, then the
+        # last one is fetched by ID
+        self.assertEqual(servers.list.call_count, 2)
+        self.assertEqual(
+            list(servers.list.call_args[1]['search_opts']), ['changes-since'])
+        self.assertEqual(
+            [c[0][0] for c in servers.get.call_args_list], ['s3', 's2'])
+        images.list.assert_called_once_with(
+            filters={'id': 'in:i1,i2'},
+            page_size=openstack_utils.OPENSTACK_PAGE_SIZE)
+        images.get.assert_not_called()
+        # Resource types which cannot be filtered by ID fall back to get
+        self.assertEqual(
+            [c[0][0] for c in volumes.get.call_args_list], ['v1', 'v2'])
+        self.sleep.assert_has_calls([mock.call(1), mock.call(1.5)])
+
+    def test_resources_reach_status_not_found(self):
+        self.patch_object(openstack_utils.time, 'sleep')
+        not_found = Exception('Not Found')
+        not_found.http_status = 404
+        servers = mock.MagicMock()
+        servers.get.side_effect = not_found
+        with self.assertRaises(exceptions.ResourceNotFound):
+            openstack_utils.resources_reach_status(
+                [(servers, 's1', 'ACTIVE'), (servers, 's2', 'ACTIVE')])
+        self.sleep.assert_not_called()
+        # Other errors are passed on
+        servers.get.side_effect = Exception('Internal Server Error')
+        with self.assertRaises(Exception) as context:
+            openstack_utils.resources_reach_status(
+                [(servers, 's1', 'ACTIVE')])
+        self.assertNotIsInstance(
+            context.exception, exceptions.ResourceNotFound)
+
+    def test_resources_reach_status_error(self):
+        self.patch_object(openstack_utils.time, 'sleep')
+        servers = mock.MagicMock()
+        servers.get.return_value = mock.MagicMock(id='s1', status='ERROR')
+        with self.assertRaises(exceptions.ResourceErrorState):
+            openstack_utils.resources_reach_status([(servers, 's1', 'ACTIVE')])
+        self.sleep.assert_not_called()
+
+    def test_resources_reach_status_timeout(self):
+        servers = mock.MagicMock()
+        servers.get.return_value = mock.MagicMock(id='s1', status='BUILD')
+        with self.assertRaises(AssertionError):
+            openstack_utils.resources_reach_status(
+                [(servers, 's1', 'ACTIVE')],
+                timeout=0.1,
+                interval=0.02,
+                max_interval=0.03)
+        self.assertGreater(servers.get.call_count, 2)
+
     def test_resource_removed(self):
+        not_found = Exception('Not Found')
+        not_found.code = 404
         resource_mock = mock.MagicMock()
-        resource_mock.list.return_value = [mock.MagicMock(id='ba8204b0')]
+        resource_mock.get.side_effect = not_found
+        openstack_utils.resource_removed(resource_mock, 'e01df65a')
+        resource_mock.get.assert_called_once_with('e01df65a')
+        resource_mock.list.assert_not_called()
+
+    def test_resource_removed_deleted_status(self):
+        resource_mock = mock.MagicMock()
+        resource_mock.get.return_value = mock.MagicMock(
+            status=None,
+            stack_status='DELETE_COMPLETE')
         openstack_utils.resource_removed(resource_mock, 'e01df65a')
 
     def test_resource_removed_fail(self):
-        openstack_utils.resource_reaches_status.retry.wait = \
+        openstack_utils.resource_removed.retry.wait = \
             tenacity.wait_none()
         resource_mock = mock.MagicMock()
-        resource_mock.list.return_value = [mock.MagicMock(id='e01df65a')]
+        resource_mock.get.return_value = mock.MagicMock(
+            id='e01df65a',
+            status='ACTIVE')
         with self.assertRaises(AssertionError):
             openstack_utils.resource_removed(resource_mock, 'e01df65a')
+        # Other errors are not mistaken for the resource being removed
+        resource_mock.get.side_effect = Exception('Internal Server Error')
+        with self.assertRaises(Exception):
+            openstack_utils.resource_removed(resource_mock, 'e01df65a')
 
     def test_delete_resource(self):
         resource_mock = mock.MagicMock()
@@ -408,72 +712,127 @@ class TestOpenStackUtils(ut_utils.BaseTestCase):
             'b46c2d83',
             msg="glance image")
 
+    def _upload_image_setup(self, data=b'image data'):
+        self.patch_object(openstack_utils, "resources_reach_status")
+        fd, self.image_path = tempfile.mkstemp()
+        self.addCleanup(os.remove, self.image_path)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        self.glance_mock = mock.MagicMock()
+        self.glance_mock.images.create.return_value = mock.MagicMock(
+            id='9d1125af')
+        self.uploaded = []
+
+        def _upload(image_id, image_data, image_size):
+            # Read the way glanceclient does
+            for chunk in iter(lambda: image_data.read(4), b''):
+                self.uploaded.append(chunk)
+
+        self.glance_mock.images.upload.side_effect = _upload
+        self.glance_image = {
+            'checksum': hashlib.md5(data).hexdigest(),
+            'os_hash_algo': 'sha512',
+            'os_hash_value': hashlib.sha512(data).hexdigest()}
+        self.glance_mock.images.get.return_value = mock.MagicMock(
+            id='9d1125af',
+            get=self.glance_image.get,
+            __getitem__=lambda _, key: self.glance_image[key])
+
     def test_upload_image_to_glance(self):
-        self.patch_object(openstack_utils, "resource_reaches_status")
-        glance_mock = mock.MagicMock()
-        image_mock = mock.MagicMock(id='9d1125af')
-        glance_mock.images.create.return_value = image_mock
-        m = mock.mock_open()
-        with mock.patch('zaza.utilities.openstack.open', m, create=False) as f:
+        self._upload_image_setup()
+        image = openstack_utils.upload_image_to_glance(
+            self.glance_mock,
+            self.image_path,
+            'bob')
+        self.glance_mock.images.create.assert_called_once_with(
+            name='bob',
+            disk_format='qcow2',
+            visibility='public',
+            container_format='bare')
+        self.assertEqual(b''.join(self.uploaded), b'image data')
+        self.assertEqual(
+            self.glance_mock.images.upload.call_args[1], {'image_size': 10})
+        self.resources_reach_status.assert_called_once_with(
+            [(self.glance_mock.images, '9d1125af', 'active')],
+            msg='Image status wait')
+        self.glance_mock.images.get.assert_called_once_with('9d1125af')
+        self.assertEqual(image, self.glance_mock.images.get.return_value)
+
+    def test_upload_image_to_glance_mmap(self):
+        self._upload_image_setup()
+        openstack_utils.upload_image_to_glance(
+            self.glance_mock,
+            self.image_path,
+            'bob',
+            use_mmap=True)
+        self.assertEqual(b''.join(self.uploaded), b'image data')
+
+    def test_upload_image_to_glance_checksum_mismatch(self):
+        self._upload_image_setup()
+        self.glance_image['os_hash_value'] = 'a' * 128
+        with self.assertRaises(exceptions.ImageVerificationFailed):
             openstack_utils.upload_image_to_glance(
-                glance_mock,
-                '/tmp/im1.img',
+                self.glance_mock,
+                self.image_path,
                 'bob')
-            glance_mock.images.create.assert_called_once_with(
-                name='bob',
-                disk_format='qcow2',
-                visibility='public',
-                container_format='bare')
-            glance_mock.images.upload.assert_called_once_with(
-                '9d1125af',
-                f(),
-            )
-            self.resource_reaches_status.assert_called_once_with(
-                glance_mock.images,
-                '9d1125af',
-                expected_status='active',
-                msg='Image status wait')
-
-    def test_create_image_use_tempdir(self):
-        glance_mock = mock.MagicMock()
-        self.patch_object(openstack_utils.os.path, "exists")
-        self.patch_object(openstack_utils, "download_image")
+
+    def test_image_upload_reader(self):
+        self.patch_object(openstack_utils, "IMAGE_UPLOAD_PROGRESS_INTERVAL",
+                          new=0)
+        self.patch_object(openstack_utils.logging, "info")
+        reader = openstack_utils.ImageUploadReader(
+            io.BytesIO(b'image data'), 10, name='bob')
+        self.assertEqual(reader.read(6), b'image ')
+        self.assertEqual(reader.read(6), b'data')
+        self.assertEqual(reader.read(6), b'')
+        self.assertEqual(reader.bytes_read, 10)
+        self.assertEqual(
+            reader.hexdigest('md5'), hashlib.md5(b'image data').hexdigest())
+        self.assertEqual(self.info.call_count, 3)
+
+    def _cached_image_setup(self):
+        self.patch_object(openstack_utils, "get_urllib_opener")
+        self.get_urllib_opener.return_value = 'opener'
+        self.patch_object(openstack_utils.image_cache, "cached_image")
+        self.cached_image.return_value = mock.MagicMock()
+        self.cached_image.return_value.__enter__.return_value = 'cache/c.img'
         self.patch_object(openstack_utils, "upload_image_to_glance")
-        self.patch_object(openstack_utils.tempfile, "gettempdir")
-        self.gettempdir.return_value = "wibbly"
-        openstack_utils.create_image(
+        self.patch_object(
+            openstack_utils.image_cache, "get_published_checksum",
+            return_value=('sha256', 'abc'))
+
+    def test_create_image_use_cache(self):
+        self._cached_image_setup()
+        glance_mock = mock.MagicMock()
+        image = openstack_utils.create_image(
             glance_mock,
             'http://cirros/c.img',
             'bob')
-        self.exists.return_value = False
-        self.download_image.assert_called_once_with(
+        self.cached_image.assert_called_once_with(
             'http://cirros/c.img',
-            'wibbly/c.img')
+            cache_dir=None,
+            opener='opener')
         self.upload_image_to_glance.assert_called_once_with(
             glance_mock,
-            'wibbly/c.img',
-            'bob')
+            'cache/c.img',
+            'bob',
+            properties={
+                'zaza_source_url': 'http://cirros/c.img',
+                'zaza_source_checksum': 'sha256:abc'})
+        self.assertEqual(image, self.upload_image_to_glance.return_value)
 
     def test_create_image_pass_directory(self):
+        self._cached_image_setup()
         glance_mock = mock.MagicMock()
-        self.patch_object(openstack_utils.os.path, "exists")
-        self.patch_object(openstack_utils, "download_image")
-        self.patch_object(openstack_utils, "upload_image_to_glance")
-        self.patch_object(openstack_utils.tempfile, "gettempdir")
         openstack_utils.create_image(
             glance_mock,
             'http://cirros/c.img',
             'bob',
             'tests')
-        self.exists.return_value = False
-        self.download_image.assert_called_once_with(
+        self.cached_image.assert_called_once_with(
             'http://cirros/c.img',
-            'tests/c.img')
-        self.upload_image_to_glance.assert_called_once_with(
-            glance_mock,
-            'tests/c.img',
-            'bob')
-        self.gettempdir.assert_not_called()
+            cache_dir='tests',
+            opener='opener')
 
     def test_create_ssh_key(self):
         nova_mock = mock.MagicMock()
@@ -564,27 +923,61 @@ class TestOpenStackUtils(ut_utils.BaseTestCase):
         self.get_private_key.assert_called_once_with('mykeys')
 
     def test_get_ports_from_device_id(self):
-        port_mock = {'device_id': 'dev1'}
+        port_mock1 = {'device_id': 'dev1', 'id': 'port1'}
+        port_mock2 = {'device_id': 'dev1', 'id': 'port2'}
         neutron_mock = mock.MagicMock()
-        neutron_mock.list_ports.return_value = {
-            'ports': [port_mock]}
+        neutron_mock.list_ports.return_value = iter([
+            {'ports': [port_mock1]},
+            {'ports': [port_mock2]}])
         self.assertEqual(
             openstack_utils.get_ports_from_device_id(
                 neutron_mock,
                 'dev1'),
-            [port_mock])
+            [port_mock1, port_mock2])
+        neutron_mock.list_ports.assert_called_once_with(
+            retrieve_all=False,
+            limit=openstack_utils.OPENSTACK_PAGE_SIZE,
+            device_id='dev1')
 
     def test_get_ports_from_device_id_no_match(self):
-        port_mock = {'device_id': 'dev2'}
         neutron_mock = mock.MagicMock()
-        neutron_mock.list_ports.return_value = {
-            'ports': [port_mock]}
+        neutron_mock.list_ports.return_value = iter([{'ports': []}])
         self.assertEqual(
             openstack_utils.get_ports_from_device_id(
                 neutron_mock,
                 'dev1'),
             [])
 
+    def test_add_neutron_secgroup_rules(self):
+        secgroup = {
+            'id': 'sg1',
+            'name': 'default',
+            'project_id': 'project1',
+            'security_group_rules': [
+                {'port_range_min': 22, 'protocol': 'tcp'}]}
+        neutron_mock = mock.MagicMock()
+        neutron_mock.list_security_groups.return_value = iter([
+            {'security_groups': [secgroup]}])
+        openstack_utils.add_neutron_secgroup_rules(neutron_mock, 'project1')
+        neutron_mock.list_security_groups.assert_called_once_with(
+            retrieve_all=False,
+            limit=openstack_utils.OPENSTACK_PAGE_SIZE,
+            name='default',
+            tenant_id='project1')
+        neutron_mock.create_security_group_rule.assert_called_once_with(
+            {'security_group_rule': {
+                'security_group_id': 'sg1',
+                'protocol': 'icmp',
+                'direction': 'ingress'}})
+
+    def test_add_neutron_secgroup_rules_missing(self):
+        neutron_mock = mock.MagicMock()
+        neutron_mock.list_security_groups.return_value = iter([
+            {'security_groups': []}])
+        with self.assertRaises(Exception):
+            openstack_utils.add_neutron_secgroup_rules(
+                neutron_mock, 'project1')
+
     def test_ping_response(self):
         self.patch_object(openstack_utils.subprocess, 'check_call')
         openstack_utils.ping_response('10.0.0.10')
@@ -768,6 +1161,56 @@ class TestOpenStackUtils(ut_utils.BaseTestCase):
         release_comp = xenial_queens > xenial_mitaka
         self.assertTrue(release_comp)
 
+    def test_get_os_release_ordinal(self):
+        self.assertLess(
+            openstack_utils.get_os_release_ordinal('pike'),
+            openstack_utils.get_os_release_ordinal('queens'))
+        self.assertLess(
+            openstack_utils.get_os_release_ordinal('queens'),
+            openstack_utils.get_os_release_ordinal('rocky'))
+        with self.assertRaises(exceptions.OSVersionNotFound):
+            openstack_utils.get_os_release_ordinal('bad')
+
+    def test_get_current_os_versions(self):
+        self.patch_object(openstack_utils, 'OS_RELEASES', new={'other': {}})
+        self.patch_object(openstack_utils.model, 'get_juju_model',
+                          return_value='mname')
+        self.patch_object(openstack_utils.model, 'get_units',
+                          return_value=[mock.MagicMock(entity_id='k/0')])
+        self.patch_object(openstack_utils.generic_utils,
+                          'get_package_inventory_signature',
+                          return_value=('0', 'hook ran at 1'))
+        self.patch_object(openstack_utils.generic_utils, 'get_pkg_version',
+                          return_value='2:13.0.0-0ubuntu1')
+        expected = {'keystone': 'queens', 'openstack-dashboard': 'queens'}
+        applications = ['keystone', 'openstack-dashboard']
+        self.assertEqual(
+            openstack_utils.get_current_os_versions(applications),
+            expected)
+        self.assertEqual(
+            openstack_utils.get_current_os_versions(applications),
+            expected)
+        self.assertEqual(self.get_pkg_version.call_count, 2)
+        self.get_pkg_version.assert_any_call(
+            'keystone', 'keystone', model_name='mname')
+        self.get_package_inventory_signature.assert_any_call(
+            ['k/0'], model_name='mname')
+        # Codenames are detected again once the units change
+        self.get_package_inventory_signature.return_value = (
+            '0', 'hook ran at 2')
+        self.get_pkg_version.return_value = '2:14.0.0-0ubuntu1'
+        self.assertEqual(
+            openstack_utils.get_current_os_versions(['keystone']),
+            {'keystone': 'rocky'})
+        self.assertEqual(self.get_pkg_version.call_count, 3)
+        # Codenames are detected again once invalidated
+        openstack_utils.invalidate_os_versions('mname')
+        self.assertEqual(openstack_utils.OS_RELEASES, {'other': {}})
+        openstack_utils.get_current_os_versions('keystone')
+        self.assertEqual(self.get_pkg_version.call_count, 4)
+        openstack_utils.invalidate_os_versions()
+        self.assertEqual(openstack_utils.OS_RELEASES, {})
+
     def test_get_keystone_api_version(self):
         self.patch_object(openstack_utils, "get_current_os_versions")
         self.patch_object(openstack_utils, "get_application_config_option")
@@ -796,7 +1239,8 @@ class TestOpenStackUtils(ut_utils.BaseTestCase):
         self.assertEqual(
             openstack_utils.get_project_id(ksclient, project_name),
             project_id)
-        ksclient.projects.list.assert_called_once_with(domain=None)
+        ksclient.projects.list.assert_called_once_with(
+            domain=None, name=project_name)
         ksclient.domains.list.assert_not_called()
 
         # With domain
@@ -810,4 +1254,5 @@ class TestOpenStackUtils(ut_utils.BaseTestCase):
             openstack_utils.get_project_id(
                 ksclient, project_name, domain_name=domain_name), project_id)
         ksclient.domains.list.assert_called_once_with(name=domain_name)
-        ksclient.projects.list.assert_called_once_with(domain=domain_id)
+        ksclient.projects.list.assert_called_once_with(
+            domain=domain_id, name=project_name)
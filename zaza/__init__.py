@@ -14,22 +14,165 @@
 
 """Functions to support converting async function to a sync equivalent."""
 import asyncio
+import threading
+
+# Event loop, and the daemon thread running it, which sync wrappers submit
+# coroutines to. Async resources such as pooled model connections live on
+# this loop and so survive between sync calls.
+RUN_LOOP = None
+RUN_LOOP_THREAD = None
+RUN_LOOP_LOCK = threading.Lock()
+
+
+def _run_loop_forever(loop):
+    """Run the given loop until it is stopped.
+
+    :param loop: Event loop to run
+    :type loop: asyncio.AbstractEventLoop
+    """
+    asyncio.set_event_loop(loop)
+    loop.run_forever()
+
+
+def get_run_loop():
+    """Return the background event loop, starting it if necessary.
+
+    :returns: Event loop running in a daemon thread
+    :rtype: asyncio.AbstractEventLoop
+    """
+    global RUN_LOOP, RUN_LOOP_THREAD
+    with RUN_LOOP_LOCK:
+        if RUN_LOOP_THREAD is None or not RUN_LOOP_THREAD.is_alive():
+            RUN_LOOP = asyncio.new_event_loop()
+            RUN_LOOP_THREAD = threading.Thread(
+                target=_run_loop_forever,
+                args=(RUN_LOOP,),
+                name='zaza-run-loop',
+                daemon=True)
+            RUN_LOOP_THREAD.start()
+        return RUN_LOOP
+
+
+def stop_run_loop():
+    """Stop the background event loop and wait for its thread to exit.
+
+    Pooled model connections, and the locks guarding them, belong to the
+    stopped loop and are forgotten.
+    """
+    global RUN_LOOP, RUN_LOOP_THREAD
+    # Imported here as zaza.model imports this module
+    import zaza.model
+    with RUN_LOOP_LOCK:
+        if RUN_LOOP_THREAD is not None and RUN_LOOP_THREAD.is_alive():
+            RUN_LOOP.call_soon_threadsafe(RUN_LOOP.stop)
+            RUN_LOOP_THREAD.join()
+            RUN_LOOP.close()
+        RUN_LOOP = None
+        RUN_LOOP_THREAD = None
+        zaza.model.forget_model_connections()
 
 
 def run(*steps):
-    """Run the given steps in an asyncio loop.
+    """Run the given steps in the background asyncio loop.
+
+    The steps are submitted to the loop one after another and the calling
+    thread blocks until each has completed. This is safe to call from any
+    thread, including one that is itself running an event loop, other than
+    the background loop thread.
 
-    :returns: The result of the asyncio.Task
+    :returns: The result of the last step
     :rtype: Any
+    :raises: RuntimeError
     """
     if not steps:
         return
-    loop = asyncio.get_event_loop()
-
+    loop = get_run_loop()
+    if threading.current_thread() is RUN_LOOP_THREAD:
+        raise RuntimeError(
+            "Sync call made from the zaza event loop thread, await the "
+            "async version instead")
     for step in steps:
-        task = loop.create_task(step)
-        loop.run_until_complete(asyncio.wait([task], loop=loop))
-    return task.result()
+        future = asyncio.run_coroutine_threadsafe(step, loop)
+        try:
+            result = future.result()
+        except BaseException:
+            future.cancel()
+            raise
+    return result
+
+
+class StepsFailed(Exception):
+    """Exception raised when one or more concurrently run steps failed."""
+
+    def __init__(self, errors):
+        """Create a StepsFailed exception.
+
+        :param errors: Exceptions raised by the failed steps keyed by the
+                       position of the step in the input
+        :type errors: {int: Exception}
+        """
+        self.errors = errors
+        message = "{} step(s) failed: {}".format(
+            len(errors),
+            '; '.join(['{}: {!r}'.format(i, e)
+                       for i, e in sorted(errors.items())]))
+        super(StepsFailed, self).__init__(message)
+
+
+async def async_gather(*steps, limit=None, return_exceptions=False):
+    """Await the given steps concurrently.
+
+    At most `limit` steps run at any one time, all steps are run if limit is
+    None. Every step is run to completion even if some of them fail.
+
+    :param steps: Coroutines to await
+    :type steps: coroutine
+    :param limit: Maximum number of steps to run at the same time
+    :type limit: Optional[int]
+    :param return_exceptions: Return exceptions in place of the results of
+                              failed steps rather than raising StepsFailed
+    :type return_exceptions: bool
+    :returns: The results of the steps in the order the steps were given
+    :rtype: list
+    :raises: StepsFailed
+    """
+    semaphore = asyncio.Semaphore(limit) if limit else None
+
+    async def _run_step(step):
+        if semaphore is None:
+            return await step
+        async with semaphore:
+            return await step
+
+    results = await asyncio.gather(
+        *[_run_step(step) for step in steps],
+        return_exceptions=True)
+    if return_exceptions:
+        return results
+    errors = {i: result for i, result in enumerate(results)
+              if isinstance(result, BaseException)}
+    if errors:
+        raise StepsFailed(errors)
+    return results
+
+
+def run_concurrently(*steps, limit=None):
+    """Run the given steps concurrently in the background asyncio loop.
+
+    Unlike run, which runs each step after the previous one has finished, the
+    steps are gathered and run at the same time, at most `limit` at once.
+
+    :param steps: Coroutines to run
+    :type steps: coroutine
+    :param limit: Maximum number of steps to run at the same time
+    :type limit: Optional[int]
+    :returns: The results of the steps in the order the steps were given
+    :rtype: list
+    :raises: StepsFailed
+    """
+    if not steps:
+        return []
+    return run(async_gather(*steps, limit=limit))
 
 
 def sync_wrapper(f):
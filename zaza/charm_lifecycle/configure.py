@@ -13,11 +13,11 @@
 # limitations under the License.
 
 """Run configuration phase."""
-import asyncio
 import argparse
 import logging
 import sys
 
+import zaza
 import zaza.model
 import zaza.charm_lifecycle.utils as utils
 
@@ -79,4 +79,5 @@ def main():
     logging.basicConfig(level=level)
     funcs = args.configfuncs or utils.get_charm_config()['configure']
     configure(args.model_name, funcs)
-    asyncio.get_event_loop().close()
+    zaza.model.close_all_models()
+    zaza.stop_run_loop()
@@ -18,6 +18,7 @@ import logging
 import sys
 
 import zaza.controller
+import zaza.model
 
 
 def destroy(model_name):
@@ -26,6 +27,7 @@ def destroy(model_name):
     :param model: Name of model to remove
     :type bundle: str
     """
+    zaza.model.disconnect_model(model_name)
     zaza.controller.destroy_model(model_name)
 
 
@@ -14,17 +14,18 @@
 
 """Run full test lifecycle."""
 import argparse
-import asyncio
 import logging
 import os
 import sys
 
+import zaza
 import zaza.charm_lifecycle.configure as configure
 import zaza.charm_lifecycle.destroy as destroy
 import zaza.charm_lifecycle.utils as utils
 import zaza.charm_lifecycle.prepare as prepare
 import zaza.charm_lifecycle.deploy as deploy
 import zaza.charm_lifecycle.test as test
+import zaza.model
 
 
 def func_test_runner(keep_model=False, smoke=False, dev=False, bundle=None):
@@ -127,4 +128,5 @@ def main():
         smoke=args.smoke,
         dev=args.dev,
         bundle=args.bundle)
-    asyncio.get_event_loop().close()
+    zaza.model.close_all_models()
+    zaza.stop_run_loop()
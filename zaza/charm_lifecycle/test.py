@@ -13,12 +13,12 @@
 # limitations under the License.
 
 """Run test phase."""
-import asyncio
 import argparse
 import logging
 import unittest
 import sys
 
+import zaza
 import zaza.model
 import zaza.charm_lifecycle.utils as utils
 
@@ -76,4 +76,5 @@ def main():
     logging.basicConfig(level=level)
     tests = args.tests or utils.get_charm_config()['tests']
     test(args.model_name, tests)
-    asyncio.get_event_loop().close()
+    zaza.model.close_all_models()
+    zaza.stop_run_loop()
@@ -14,7 +14,6 @@
 
 """Code for configuring glance."""
 
-import logging
 import zaza.utilities.openstack as openstack_utils
 
 CIRROS_IMAGE_NAME = "cirros"
@@ -43,14 +42,10 @@ def add_cirros_image(glance_client=None, image_name=None):
         keystone_session = openstack_utils.get_overcloud_keystone_session()
         glance_client = openstack_utils.get_glance_session_client(
             keystone_session)
-    if openstack_utils.get_images_by_name(glance_client, image_name):
-        logging.warning('Using existing glance image')
-    else:
-        image_url = openstack_utils.find_cirros_image(arch='x86_64')
-        openstack_utils.create_image(
-            glance_client,
-            image_url,
-            image_name)
+    openstack_utils.get_or_create_image(
+        glance_client,
+        openstack_utils.find_cirros_image(arch='x86_64'),
+        image_name)
 
 
 def add_lts_image(glance_client=None, image_name=None, release=None):
@@ -69,13 +64,7 @@ def add_lts_image(glance_client=None, image_name=None, release=None):
         keystone_session = openstack_utils.get_overcloud_keystone_session()
         glance_client = openstack_utils.get_glance_session_client(
             keystone_session)
-    if openstack_utils.get_images_by_name(glance_client, image_name):
-        logging.warning('Using existing glance image')
-    else:
-        image_url = openstack_utils.find_ubuntu_image(
-            release=release,
-            arch='amd64')
-        openstack_utils.create_image(
-            glance_client,
-            image_url,
-            image_name)
+    openstack_utils.get_or_create_image(
+        glance_client,
+        openstack_utils.find_ubuntu_image(release=release, arch='amd64'),
+        image_name)
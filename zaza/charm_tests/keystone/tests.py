@@ -16,6 +16,7 @@
 import collections
 import json
 import logging
+import os
 import pprint
 
 import keystoneauth1
@@ -104,18 +105,18 @@ class CharmOperationTest(BaseKeystoneTest):
             # get on-disk key repository from all units
             on_disk = {}
             units = zaza.model.get_units(self.application_name)
+            unit_files = zaza.model.get_unit_files(
+                [unit.entity_id for unit in units],
+                ['{}*'.format(repo) for repo in [CREDENTIAL_KEY_REPOSITORY,
+                                                 FERNET_KEY_REPOSITORY]])
             for unit in units:
                 on_disk[unit.entity_id] = {}
                 for repo in [CREDENTIAL_KEY_REPOSITORY, FERNET_KEY_REPOSITORY]:
-                    on_disk[unit.entity_id][repo] = {}
-                    result = zaza.model.run_on_unit(
-                        unit.entity_id, 'sudo ls -1 {}'.format(repo))
-                    for key_name in result.get('Stdout').split():
-                        result = zaza.model.run_on_unit(
-                            unit.entity_id,
-                            'sudo cat {}/{}'.format(repo, key_name))
-                        on_disk[unit.entity_id][repo][key_name] = result.get(
-                            'Stdout')
+                    on_disk[unit.entity_id][repo] = {
+                        os.path.basename(path): contents.decode()
+                        for path, contents in unit_files[
+                            unit.entity_id].items()
+                        if path.startswith(repo)}
             # sort keys so we can compare it to leader storage repositories
             on_disk = json.loads(
                 json.dumps(on_disk, sort_keys=True),
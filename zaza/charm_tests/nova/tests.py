@@ -78,10 +78,8 @@ class BaseGuestCreateTest(unittest.TestCase):
 
         # Test Instance is ready.
         logging.info('Checking instance is active')
-        openstack_utils.resource_reaches_status(
-            self.nova_client.servers,
-            instance.id,
-            expected_status='ACTIVE')
+        openstack_utils.resources_reach_status(
+            [(self.nova_client.servers, instance.id, 'ACTIVE')])
 
         logging.info('Checking cloud init is complete')
         openstack_utils.cloud_init_complete(
@@ -100,6 +100,9 @@ class OpenStackBaseTest(unittest.TestCase):
                 self.application_name,
                 alternate_config,
                 model_name=self.model_name)
+            # Charm settings may change how the overcloud is accessed
+            openstack_utils.invalidate_overcloud_auth_context(
+                model_name=self.model_name)
 
             logging.debug(
                 'Waiting for units to execute config-changed hook')
@@ -118,6 +121,8 @@ class OpenStackBaseTest(unittest.TestCase):
             self.application_name,
             default_config,
             model_name=self.model_name)
+        openstack_utils.invalidate_overcloud_auth_context(
+            model_name=self.model_name)
 
         logging.debug(
             'Waiting for units to reach target states')
@@ -21,19 +21,89 @@ mostly via libjuju. Async function also provice a non-async alternative via
 
 import asyncio
 from async_generator import async_generator, yield_, asynccontextmanager
+import base64
+import collections
+import hashlib
+import inspect
+import io
 import logging
 import os
+import random
+import shlex
 import subprocess
-import tempfile
+import tarfile
+import time
+import uuid
+import websockets
+import weakref
 import yaml
 from oslo_config import cfg
+from oslo_config import iniparser
 
+from juju.client import client
 from juju.errors import JujuError
 from juju.model import Model
 
-from zaza import sync_wrapper
+from zaza import async_gather, sync_wrapper
 
 CURRENT_MODEL = None
+# Connected libjuju Model objects keyed by model name
+MODEL_CONNECTIONS = {}
+# Locks serialising connects and disconnects, keyed by model name, see
+# get_model_connection_lock
+MODEL_CONNECTION_LOCKS = {}
+# Longest time to go without re-checking a condition in
+# async_block_until_model_state. Conditions are re-checked as soon as a
+# relevant delta arrives, the periodic check only picks up lost connections.
+MODEL_STATE_RECHECK_PERIOD = 30
+# async_block_until settings for waits which poll units with remote commands
+REMOTE_POLL_SETTINGS = {
+    'backoff': 1.5,
+    'max_wait_period': 15,
+    'jitter': 0.1}
+# Seconds between checks of async_block_until_remote on the unit when there
+# is no file to watch with inotify, and the longest wait for a file event
+REMOTE_WAIT_INTERVAL = 2
+REMOTE_WAIT_WATCH_TIMEOUT = 60
+# Timeout of the short juju runs which start and poll the wait script
+REMOTE_WAIT_RUN_TIMEOUT = 60
+# Commands starting the wait script outside of the juju run, so the run does
+# not hold the hook lock while waiting, and collecting its exit code
+REMOTE_WAIT_START_CMD = (
+    "echo {script} | base64 -d > {result}.sh && {{ "
+    "setsid nohup bash -c "
+    "'bash {result}.sh; echo $? > {result}.part; mv {result}.part {result}' "
+    "< /dev/null > /dev/null 2>&1 & }}")
+REMOTE_WAIT_POLL_CMD = "cat {result} && rm -f {result} {result}.sh"
+# Script which loops on a unit until a check passes or the timeout is reached
+REMOTE_WAIT_SCRIPT = """
+end=$(( $(date +%s) + {timeout} ))
+while true; do
+    if {check}; then
+        exit 0
+    fi
+    now=$(date +%s)
+    if [ "$now" -ge "$end" ]; then
+        exit 124
+    fi
+    if [ -n "{watch_path}" ] && command -v inotifywait > /dev/null; then
+        inotifywait -qq -t {watch_timeout} \\
+            -e modify -e create -e moved_to -e attrib "{watch_path}" || \\
+            sleep {interval}
+    else
+        sleep {interval}
+    fi
+done
+"""
+# Parsed oslo.config files keyed by the sha256 digest of their contents
+OSLO_CONFIG_CACHE = collections.OrderedDict()
+OSLO_CONFIG_CACHE_SIZE = 128
+# UnitErrorIndex objects keyed by the libjuju Model object they watch
+MODEL_ERROR_UNITS = weakref.WeakKeyDictionary()
+# LeaderIndex objects keyed by the libjuju Model object they watch
+MODEL_LEADERS = weakref.WeakKeyDictionary()
+# Seconds a cached lead unit is trusted before it is confirmed with is-leader
+LEADER_CONFIRM_PERIOD = 60
 
 
 def set_juju_model(model_name):
@@ -124,6 +194,97 @@ def get_unit_from_name(unit_name, model=None, model_name=None):
     return unit
 
 
+def is_model_disconnected(model):
+    """Return whether the connection to the given model has gone away.
+
+    :param model: Model object to check
+    :type model: juju.Model
+    :returns: Whether the model needs to be reconnected
+    :rtype: bool
+    """
+    return not (model.is_connected() and model.connection().is_open)
+
+
+def get_model_connection_lock(model_name):
+    """Return the lock guarding the pooled connection to the given model.
+
+    :param model_name: Name of model
+    :type model_name: str
+    :returns: Lock to hold while connecting to or disconnecting from the model
+    :rtype: asyncio.Lock
+    """
+    if model_name not in MODEL_CONNECTION_LOCKS:
+        MODEL_CONNECTION_LOCKS[model_name] = asyncio.Lock()
+    return MODEL_CONNECTION_LOCKS[model_name]
+
+
+def forget_model_connections():
+    """Drop the pooled connections and their locks without disconnecting.
+
+    Used once the event loop they belong to has been stopped, when they can
+    no longer be used or disconnected.
+    """
+    MODEL_CONNECTIONS.clear()
+    MODEL_CONNECTION_LOCKS.clear()
+
+
+async def async_get_model(model_name=None):
+    """Return a connected libjuju model from the connection pool.
+
+    The first request for a model connects to it, which includes the initial
+    sync of the model state from the AllWatcher. Later requests are handed the
+    same, already synced, Model object. If the connection has gone stale it is
+    dropped and a new one is made.
+
+    :param model_name: Name of model to return
+    :type model_name: str
+    :returns: Connected model
+    :rtype: juju.Model
+    """
+    if not model_name:
+        model_name = get_juju_model()
+    async with get_model_connection_lock(model_name):
+        model = MODEL_CONNECTIONS.get(model_name)
+        if model is not None and is_model_disconnected(model):
+            logging.debug("Connection to model {} is stale, reconnecting"
+                          .format(model_name))
+            del MODEL_CONNECTIONS[model_name]
+            await model.disconnect()
+            model = None
+        if model is None:
+            model = Model()
+            await model.connect_model(model_name)
+            watch_unit_errors(model)
+            MODEL_CONNECTIONS[model_name] = model
+    return model
+
+
+async def async_disconnect_model(model_name=None):
+    """Disconnect the pooled connection to the given model, if any.
+
+    :param model_name: Name of model to disconnect from
+    :type model_name: str
+    """
+    if not model_name:
+        model_name = get_juju_model()
+    async with get_model_connection_lock(model_name):
+        model = MODEL_CONNECTIONS.pop(model_name, None)
+        if model is not None:
+            await model.disconnect()
+
+disconnect_model = sync_wrapper(async_disconnect_model)
+
+
+async def async_close_all_models():
+    """Disconnect all pooled model connections."""
+    for model_name in list(MODEL_CONNECTIONS.keys()):
+        await async_disconnect_model(model_name)
+    # The locks are bound to the loop they were first used on
+    MODEL_CONNECTION_LOCKS.clear()
+
+close_all_models = sync_wrapper(async_close_all_models)
+
+
 @asynccontextmanager
 @async_generator
 async def run_in_model(model_name):
@@ -133,17 +294,16 @@ async def run_in_model(model_name):
            async with run_in_model(model_name) as model:
                model.do_something()
 
+    The model is taken from the connection pool and stays connected when the
+    context exits, use close_all_models to disconnect.
+
     :param model_name: Name of model to run function in
     :type model_name: str
     :returns: The juju Model object correcsponding to model_name
     :rtype: Iterator[:class:'juju.Model()']
     """
-    model = Model()
-    if not model_name:
-        model_name = get_juju_model()
-    await model.connect_model(model_name)
+    model = await async_get_model(model_name)
     await yield_(model)
-    await model.disconnect()
 
 
 async def async_scp_to_unit(unit_name, source, destination, model_name=None,
@@ -175,9 +335,13 @@ scp_to_unit = sync_wrapper(async_scp_to_unit)
 
 async def async_scp_to_all_units(application_name, source, destination,
                                  model_name=None, user='ubuntu', proxy=False,
-                                 scp_opts=''):
+                                 scp_opts='', limit=None):
     """Transfer files from to all units of an application.
 
+    The transfers run concurrently, at most limit at a time. A failed
+    transfer does not stop the transfers to the other units, the failures
+    are raised together once all transfers have finished.
+
     :param model_name: Name of model unit is in
     :type model_name: str
     :param application_name: Name of application to scp file to
@@ -192,12 +356,23 @@ async def async_scp_to_all_units(application_name, source, destination,
     :type proxy: bool
     :param scp_opts: Additional options to the scp command
     :type scp_opts: str
+    :param limit: Maximum number of concurrent transfers
+    :type limit: int
+    :raises: ScpFailed
     """
     async with run_in_model(model_name) as model:
-        for unit in model.applications[application_name].units:
-            # FIXME: Should scp in parallel
-            await unit.scp_to(source, destination, user=user, proxy=proxy,
-                              scp_opts=scp_opts)
+        units = model.applications[application_name].units
+        results = await async_gather(
+            *[unit.scp_to(source, destination, user=user, proxy=proxy,
+                          scp_opts=scp_opts)
+              for unit in units],
+            limit=limit,
+            return_exceptions=True)
+    errors = {unit.entity_id: result
+              for unit, result in zip(units, results)
+              if isinstance(result, Exception)}
+    if errors:
+        raise ScpFailed(errors)
 
 scp_to_all_units = sync_wrapper(async_scp_to_all_units)
 
@@ -230,6 +405,62 @@ async def async_scp_from_unit(unit_name, source, destination, model_name=None,
 scp_from_unit = sync_wrapper(async_scp_from_unit)
 
 
+async def async_scp_from_all_units(application_name, source, destination,
+                                   model_name=None, user='ubuntu',
+                                   proxy=False, scp_opts='', limit=None):
+    """Transfer files from all units of an application.
+
+    The files from each unit are put in a subdirectory of destination named
+    after the unit, e.g. destination/app_0 for unit app/0. The transfers
+    run concurrently, at most limit at a time, and the failures are raised
+    together once all transfers have finished.
+
+    :param model_name: Name of model unit is in
+    :type model_name: str
+    :param application_name: Name of application to scp files from
+    :type application_name: str
+    :param source: Remote path of file(s) to transfer
+    :type source: str
+    :param destination: Local directory to create the unit subdirectories in
+    :type source: str
+    :param user: Remote username
+    :type source: str
+    :param proxy: Proxy through the Juju API server
+    :type proxy: bool
+    :param scp_opts: Additional options to the scp command
+    :type scp_opts: str
+    :param limit: Maximum number of concurrent transfers
+    :type limit: int
+    :returns: Local directory holding the files of each unit keyed by unit
+              name
+    :rtype: {str: str}
+    :raises: ScpFailed
+    """
+    async with run_in_model(model_name) as model:
+        units = model.applications[application_name].units
+        unit_dirs = {}
+        for unit in units:
+            unit_dir = os.path.join(
+                destination,
+                unit.entity_id.replace('/', '_'))
+            os.makedirs(unit_dir, exist_ok=True)
+            unit_dirs[unit.entity_id] = unit_dir
+        results = await async_gather(
+            *[unit.scp_from(source, unit_dirs[unit.entity_id], user=user,
+                            proxy=proxy, scp_opts=scp_opts)
+              for unit in units],
+            limit=limit,
+            return_exceptions=True)
+    errors = {unit.entity_id: result
+              for unit, result in zip(units, results)
+              if isinstance(result, Exception)}
+    if errors:
+        raise ScpFailed(errors)
+    return unit_dirs
+
+scp_from_all_units = sync_wrapper(async_scp_from_all_units)
+
+
 async def async_run_on_unit(unit_name, command, model_name=None, timeout=None):
     """Juju run on unit.
 
@@ -255,6 +486,292 @@ async def async_run_on_unit(unit_name, command, model_name=None, timeout=None):
 run_on_unit = sync_wrapper(async_run_on_unit)
 
 
+async def async_run_on_units(unit_names, command, model_name=None,
+                             timeout=None, limit=None):
+    """Juju run on many units concurrently.
+
+    The units are sent to the controller in a single juju run, or in batches
+    of at most limit units if limit is set::
+
+        results = run_on_units(['glance/0', 'glance/1'], 'uptime')
+        results['glance/1']['Stdout']
+
+    :param unit_names: Names of units to run command on
+    :type unit_names: [str, ...]
+    :param command: Command to execute
+    :type command: str
+    :param model_name: Name of model units are in
+    :type model_name: str
+    :param timeout: How long in seconds to wait for command to complete on
+                    each unit
+    :type timeout: int
+    :param limit: Maximum number of units to run the command on at once
+    :type limit: int
+    :returns: action.data['results'] of each unit keyed by unit name
+    :rtype: {str: {'Code': '', 'Stderr': '', 'Stdout': ''}}
+    :raises: UnitNotFound, JujuError
+    """
+    unit_names = list(unit_names)
+    if not unit_names:
+        return {}
+    if timeout:
+        # Convert seconds to nanoseconds
+        timeout = int(timeout * 1000000000)
+    if not limit:
+        limit = len(unit_names)
+    results = {}
+    async with run_in_model(model_name) as model:
+        for unit_name in unit_names:
+            get_unit_from_name(unit_name, model)
+        action_facade = client.ActionFacade.from_connection(
+            model.connection())
+        for i in range(0, len(unit_names), limit):
+            batch = unit_names[i:i + limit]
+            logging.debug("Running `{}` on {}".format(
+                command, ', '.join(batch)))
+            res = await action_facade.Run([], command, [], timeout, batch)
+            for result in res.results:
+                if result.error:
+                    raise JujuError(result.error.message)
+            actions = await asyncio.gather(*[
+                model.wait_for_action(result.action.tag)
+                for result in res.results])
+            for action in actions:
+                results[action.data['receiver']] = (
+                    action.data.get('results') or {})
+    return results
+
+run_on_units = sync_wrapper(async_run_on_units)
+
+
+def run_succeeded(result):
+    """Return whether a command run with juju run exited successfully.
+
+    Juju leaves the Code out of the results of commands which exited with 0,
+    so a missing Code is a success.
+
+    :param result: Results of the command on a unit, see run_on_units
+    :type result: {str: str}
+    :returns: Whether the command exited with 0
+    :rtype: bool
+    """
+    return int(result.get('Code') or 0) == 0
+
+
+async def async_run_on_application(application_name, command,
+                                   model_name=None, timeout=None,
+                                   limit=None):
+    """Juju run on all units of an application concurrently.
+
+    :param application_name: Application to run command on
+    :type application_name: str
+    :param command: Command to execute
+    :type command: str
+    :param model_name: Name of model application is in
+    :type model_name: str
+    :param timeout: How long in seconds to wait for command to complete on
+                    each unit
+    :type timeout: int
+    :param limit: Maximum number of units to run the command on at once
+    :type limit: int
+    :returns: action.data['results'] of each unit keyed by unit name
+    :rtype: {str: {'Code': '', 'Stderr': '', 'Stdout': ''}}
+    :raises: UnitNotFound, JujuError
+    """
+    units = await async_get_units(application_name, model_name=model_name)
+    return await async_run_on_units(
+        [unit.entity_id for unit in units],
+        command,
+        model_name=model_name,
+        timeout=timeout,
+        limit=limit)
+
+run_on_application = sync_wrapper(async_run_on_application)
+
+
+async def async_get_unit_files(unit_names, paths, model_name=None,
+                               digest=False, timeout=None):
+    """Read files from many units with a single juju run.
+
+    The paths are expanded by the shell on the units so they may be globs.
+    Each unit sends the matching files back as one compressed, base64
+    encoded tar stream::
+
+        files = get_unit_files(
+            ['keystone/0', 'keystone/1'],
+            ['/etc/keystone/fernet-keys/*'])
+        files['keystone/1']['/etc/keystone/fernet-keys/0']
+
+    With digest set only the sha256 digest of each file is sent back, which
+    is enough to compare files between units. Paths which do not exist are
+    left out of the results.
+
+    :param unit_names: Names of units to read files from
+    :type unit_names: [str, ...]
+    :param paths: Absolute paths or globs of files to read
+    :type paths: [str, ...]
+    :param model_name: Name of model units are in
+    :type model_name: str
+    :param digest: Return sha256 hex digests instead of file contents
+    :type digest: bool
+    :param timeout: How long in seconds to wait for command to complete on
+                    each unit
+    :type timeout: int
+    :returns: Contents (or digest) of each file keyed by path, keyed by unit
+              name
+    :rtype: {str: {str: bytes}} or {str: {str: str}}
+    :raises: CommandRunFailed
+    """
+    if digest:
+        cmd = 'sha256sum {} 2>/dev/null || true'.format(' '.join(paths))
+    else:
+        cmd = ('tar --absolute-names --dereference -czf - {} 2>/dev/null | '
+               'base64 -w 0'.format(' '.join(paths)))
+    results = await async_run_on_units(
+        unit_names,
+        cmd,
+        model_name=model_name,
+        timeout=timeout)
+    unit_files = {}
+    for unit_name, result in results.items():
+        if not run_succeeded(result):
+            raise CommandRunFailed(cmd, result)
+        files = {}
+        output = result.get('Stdout') or ''
+        if digest:
+            for line in output.splitlines():
+                file_digest, path = line.split(None, 1)
+                files[path] = file_digest
+        elif output.strip():
+            stream = io.BytesIO(base64.b64decode(output.strip()))
+            with tarfile.open(fileobj=stream, mode='r:gz') as tar:
+                for member in tar.getmembers():
+                    if member.isfile():
+                        files[member.name] = tar.extractfile(member).read()
+        unit_files[unit_name] = files
+    return unit_files
+
+get_unit_files = sync_wrapper(async_get_unit_files)
+
+
+class LeaderIndex(object):
+    """Lead unit of each application in a model.
+
+    The index is built from a single full status call. The entry for an
+    application is dropped when one of its units is added or removed, runs
+    the leader-elected hook or reports a change to its leader field, and is
+    rebuilt on the next lookup. As the watcher may merge deltas, an entry
+    older than LEADER_CONFIRM_PERIOD is confirmed with is-leader before it
+    is used.
+    """
+
+    def __init__(self):
+        """Create an empty index."""
+        self.leaders = {}
+        # application -> time the leader was last confirmed
+        self.confirmed = {}
+
+    async def get_leader(self, model, application_name):
+        """Return the name of the lead unit of the given application.
+
+        :param model: Model object the index belongs to
+        :type model: juju.Model
+        :param application_name: Name of application
+        :type application_name: str
+        :returns: Name of the lead unit or None if there is no leader
+        :rtype: Optional[str]
+        """
+        leader = self.leaders.get(application_name)
+        if leader is None or leader not in model.units:
+            await self.refresh(model)
+        elif (time.time() - self.confirmed.get(application_name, 0) >
+                LEADER_CONFIRM_PERIOD):
+            if await self.is_leader(model, leader):
+                self.confirmed[application_name] = time.time()
+            else:
+                logging.debug('{} is no longer the leader'.format(leader))
+                await self.refresh(model)
+        return self.leaders.get(application_name)
+
+    async def is_leader(self, model, unit_name):
+        """Ask a unit whether it is the leader of its application.
+
+        :param model: Model object the index belongs to
+        :type model: juju.Model
+        :param unit_name: Name of unit
+        :type unit_name: str
+        :returns: Whether the unit is the leader
+        :rtype: bool
+        """
+        action = await model.units[unit_name].run('is-leader')
+        results = action.data.get('results') or {}
+        return results.get('Stdout', '').strip() == 'True'
+
+    async def refresh(self, model):
+        """Rebuild the index from the full status of the model.
+
+        :param model: Model object the index belongs to
+        :type model: juju.Model
+        """
+        status = await model.get_status()
+        leaders = {}
+        for application, app_status in status.applications.items():
+            leaders.setdefault(application, None)
+            for unit_name, unit_status in (
+                    app_status.get('units') or {}).items():
+                if unit_status.get('leader'):
+                    leaders[application] = unit_name
+                for sub_name, sub_status in (
+                        unit_status.get('subordinates') or {}).items():
+                    if sub_status.get('leader'):
+                        leaders[sub_name.split('/')[0]] = sub_name
+        self.leaders = leaders
+        now = time.time()
+        self.confirmed = {application: now for application in leaders}
+
+    async def __call__(self, delta, old, new, model):
+        """Drop the entry of an application whose leadership may change."""
+        agent_status = delta.data.get('agent-status') or {}
+        old_leader = old.safe_data.get('leader') if old is not None else None
+        if (delta.type in ('add', 'remove') or
+                new is None or new.dead or
+                ('leader' in delta.data and
+                 delta.data['leader'] != old_leader) or
+                'leader-elected' in (agent_status.get('message') or '')):
+            self.leaders.pop(delta.get_id().split('/')[0], None)
+
+
+def watch_leaders(model):
+    """Maintain an index of the lead units of the given model.
+
+    :param model: Model object to watch
+    :type model: juju.Model
+    :returns: Index of lead units
+    :rtype: LeaderIndex
+    """
+    if model not in MODEL_LEADERS:
+        index = LeaderIndex()
+        model.add_observer(index, entity_type='unit')
+        MODEL_LEADERS[model] = index
+    return MODEL_LEADERS[model]
+
+
+async def async_get_lead_unit(model, application_name):
+    """Return the lead unit of the given application.
+
+    :param model: Model object to query
+    :type model: juju.Model
+    :param application_name: Name of application
+    :type application_name: str
+    :returns: Lead unit or None if there is no leader
+    :rtype: Optional[juju.unit.Unit]
+    """
+    leader = await watch_leaders(model).get_leader(model, application_name)
+    for unit in model.applications[application_name].units:
+        if unit.entity_id == leader:
+            return unit
+
+
 async def async_run_on_leader(application_name, command, model_name=None,
                               timeout=None):
     """Juju run on leader unit.
@@ -271,14 +788,13 @@ async def async_run_on_leader(application_name, command, model_name=None,
     :rtype: dict
     """
     async with run_in_model(model_name) as model:
-        for unit in model.applications[application_name].units:
-            is_leader = await unit.is_leader_from_status()
-            if is_leader:
-                action = await unit.run(command, timeout=timeout)
-                if action.data.get('results'):
-                    return action.data.get('results')
-                else:
-                    return {}
+        unit = await async_get_lead_unit(model, application_name)
+        if unit:
+            action = await unit.run(command, timeout=timeout)
+            if action.data.get('results'):
+                return action.data.get('results')
+            else:
+                return {}
 
 run_on_leader = sync_wrapper(async_run_on_leader)
 
@@ -338,6 +854,53 @@ async def async_get_unit_service_start_time(unit_name, service,
 get_unit_service_start_time = sync_wrapper(async_get_unit_service_start_time)
 
 
+async def async_get_unit_service_states(unit_names, services,
+                                        model_name=None, timeout=None):
+    """Return the start time of each of the services on each of the units.
+
+    All the services are probed with a single command per unit and the
+    command is run on all the units at once::
+
+        get_unit_service_states(
+            ['glance/0', 'glance/1'],
+            ['glance-api', 'apache2'])
+        {'glance/0': {'glance-api': 1528294585, 'apache2': None}, ...}
+
+    :param unit_names: Names of units to probe
+    :type unit_names: [str, ...]
+    :param services: Names of services to probe
+    :type services: [str, ...]
+    :param model_name: Name of model to query.
+    :type model_name: str
+    :param timeout: How long in seconds to wait for the probe to complete
+    :type timeout: int
+    :returns: Time in seconds since Epoch that each service was started, or
+              None if the service is not running, keyed by unit name
+    :rtype: {str: {str: Optional[int]}}
+    """
+    cmd = (
+        "for svc in {}; do "
+        "pid=$(pidof -x $svc | cut -f1 -d ' '); "
+        "echo $svc $([ -n \"$pid\" ] && stat -c %Y /proc/$pid 2>/dev/null); "
+        "done").format(' '.join([shlex.quote(svc) for svc in services]))
+    results = await async_run_on_units(
+        unit_names,
+        cmd,
+        model_name=model_name,
+        timeout=timeout)
+    states = {}
+    for unit_name in unit_names:
+        states[unit_name] = {service: None for service in services}
+        stdout = results.get(unit_name, {}).get('Stdout', '')
+        for line in stdout.splitlines():
+            fields = line.split()
+            if len(fields) == 2 and fields[1].isdigit():
+                states[unit_name][fields[0]] = int(fields[1])
+    return states
+
+get_unit_service_states = sync_wrapper(async_get_unit_service_states)
+
+
 async def async_get_application(application_name, model_name=None):
     """Return an application object.
 
@@ -403,20 +966,17 @@ def get_first_unit_name(application_name, model_name=None):
 
 
 async def async_get_lead_unit_name(application_name, model_name=None):
-    """Return name of lowest numbered unit of given application.
+    """Return name of the lead unit of given application.
 
     :param model_name: Name of model to query.
     :type model_name: str
     :param application_name: Name of application
     :type application_name: str
-    :returns: Name of lowest numbered unit
+    :returns: Name of the lead unit
     :rtype: str
     """
     async with run_in_model(model_name) as model:
-        for unit in model.applications[application_name].units:
-            is_leader = await unit.is_leader_from_status()
-            if is_leader:
-                return unit.entity_id
+        return await watch_leaders(model).get_leader(model, application_name)
 
 get_lead_unit_name = sync_wrapper(async_get_lead_unit_name)
 
@@ -523,13 +1083,12 @@ async def async_run_action_on_leader(application_name, action_name,
     :rtype: juju.action.Action
     """
     async with run_in_model(model_name) as model:
-        for unit in model.applications[application_name].units:
-            is_leader = await unit.is_leader_from_status()
-            if is_leader:
-                action_obj = await unit.run_action(action_name,
-                                                   **action_params)
-                await action_obj.wait()
-                return action_obj
+        unit = await async_get_lead_unit(model, application_name)
+        if unit:
+            action_obj = await unit.run_action(action_name,
+                                               **action_params)
+            await action_obj.wait()
+            return action_obj
 
 run_action_on_leader = sync_wrapper(async_run_action_on_leader)
 
@@ -544,6 +1103,22 @@ class UnitError(Exception):
         super(UnitError, self).__init__(message)
 
 
+class ScpFailed(Exception):
+    """Exception raised when transferring files to or from units failed."""
+
+    def __init__(self, errors):
+        """Set the units the transfer failed for in message and raise.
+
+        :param errors: Exceptions raised by the transfers keyed by unit name
+        :type errors: {str: Exception}
+        """
+        self.errors = errors
+        message = "scp failed for units {}".format(
+            ', '.join(['{} ({})'.format(unit_name, error)
+                       for unit_name, error in sorted(errors.items())]))
+        super(ScpFailed, self).__init__(message)
+
+
 class ServiceNotRunning(Exception):
     """Exception raised when service not running."""
 
@@ -572,6 +1147,45 @@ class CommandRunFailed(Exception):
         super(CommandRunFailed, self).__init__(msg)
 
 
+class UnitErrorIndex(object):
+    """Names of the units of a model which are in error state.
+
+    The index is kept up to date from the unit deltas of the model, so
+    checking the model for units in error does not need to walk every unit.
+    """
+
+    def __init__(self, model):
+        """Seed the index from the current state of the model.
+
+        :param model: Model object to index
+        :type model: juju.Model
+        """
+        self.units = set(
+            [u.entity_id for u in units_with_wl_status_state(model, 'error')])
+
+    async def __call__(self, delta, old, new, model):
+        """Update the index from a unit delta."""
+        if new is None or new.dead or new.workload_status != 'error':
+            self.units.discard(delta.get_id())
+        else:
+            self.units.add(delta.get_id())
+
+
+def watch_unit_errors(model):
+    """Maintain an index of the units in error state for the given model.
+
+    :param model: Model object to watch
+    :type model: juju.Model
+    :returns: Index of units in error state
+    :rtype: UnitErrorIndex
+    """
+    if model not in MODEL_ERROR_UNITS:
+        index = UnitErrorIndex(model)
+        model.add_observer(index, entity_type='unit')
+        MODEL_ERROR_UNITS[model] = index
+    return MODEL_ERROR_UNITS[model]
+
+
 def units_with_wl_status_state(model, state):
     """Return a list of unit which have a matching workload status.
 
@@ -590,11 +1204,17 @@ def check_model_for_hard_errors(model):
     """Check model for any hard errors that should halt a deployment.
 
        The only check currently implemented is checking for units in an
-       error state
+       error state. Models from the connection pool are checked against their
+       UnitErrorIndex rather than by walking every unit.
 
     :raises: UnitError
     """
-    errored_units = units_with_wl_status_state(model, 'error')
+    index = MODEL_ERROR_UNITS.get(model)
+    if index is None:
+        errored_units = units_with_wl_status_state(model, 'error')
+    else:
+        errored_units = [model.units[name] for name in index.units
+                         if name in model.units]
     if errored_units:
         raise UnitError(errored_units)
 
@@ -650,6 +1270,73 @@ def check_unit_workload_status_message(model, unit, message=None,
         raise ValueError("Must be called with message or prefixes")
 
 
+async def async_block_until_model_state(
+        model, *conditions, timeout=None, entity_type=None, entity_id=None,
+        recheck_period=MODEL_STATE_RECHECK_PERIOD):
+    """Return only after all conditions are true.
+
+    Unlike juju.Model.block_until, which re-evaluates the conditions on a
+    fixed timer, the conditions are re-evaluated only when the AllWatcher
+    delivers a delta for an entity matching entity_type and entity_id::
+
+        await async_block_until_model_state(
+            model,
+            lambda: model.units['app/0'].workload_status == 'active',
+            entity_type='unit',
+            entity_id='app/0',
+            timeout=600)
+
+    :param model: Model to watch
+    :type model: juju.Model
+    :param conditions: Functions or coroutine functions to evaluate.
+    :type conditions: functions
+    :param timeout: Timeout in seconds
+    :type timeout: float
+    :param entity_type: Only re-evaluate on deltas for this type of entity,
+                        e.g. 'unit' or 'application'
+    :type entity_type: str
+    :param entity_id: Only re-evaluate on deltas for this entity, e.g. 'app/0'
+    :type entity_id: str
+    :param recheck_period: Longest time to wait for a delta before checking
+                           the connection and re-evaluating anyway
+    :type recheck_period: float
+    :raises: asyncio.TimeoutError, websockets.ConnectionClosed
+    """
+    changed = asyncio.Event()
+
+    async def _on_change(delta, old, new, model):
+        changed.set()
+
+    # libjuju only keeps a weak reference to the observer so it is dropped
+    # along with _on_change when this function returns.
+    model.add_observer(
+        _on_change,
+        entity_type=entity_type,
+        entity_id=entity_id)
+
+    async def _check():
+        for condition in conditions:
+            result = condition()
+            if inspect.isawaitable(result):
+                result = await result
+            if not result:
+                return False
+        return True
+
+    async def _block():
+        while True:
+            changed.clear()
+            if is_model_disconnected(model):
+                raise websockets.ConnectionClosed(1006, 'no reason')
+            if await _check():
+                return
+            try:
+                await asyncio.wait_for(changed.wait(), recheck_period)
+            except asyncio.TimeoutError:
+                pass
+    await asyncio.wait_for(_block(), timeout)
+
+
 async def async_wait_for_agent_status(model_name=None, status='executing',
                                       timeout=60):
     """Wait for at least one unit to enter a specific agent status.
@@ -680,12 +1367,63 @@ async def async_wait_for_agent_status(model_name=None, status='executing',
     async with run_in_model(model_name) as model:
         logging.info('Waiting for at least one unit with agent status "{}"'
                      .format(status))
-        await model.block_until(
-            lambda: one_agent_status(model, status), timeout=timeout)
+        await async_block_until_model_state(
+            model,
+            lambda: one_agent_status(model, status),
+            entity_type='unit',
+            timeout=timeout)
 
 wait_for_agent_status = sync_wrapper(async_wait_for_agent_status)
 
 
+def get_application_states_report(model, states=None):
+    """Return the units which have not reached their desired state.
+
+    Check the workload status and workload status message of every unit in a
+    single pass. See async_wait_for_application_states for the defaults and
+    the form of states.
+
+    :param model: Model object to check in
+    :type model: juju.Model
+    :param states: States to look for
+    :type states: dict
+    :returns: Why each unit is pending keyed by unit name, empty if all units
+              have reached their desired state
+    :rtype: {str: str}
+    :raises: UnitError
+    """
+    approved_message_prefixes = ('ready', 'Ready', 'Unit is ready')
+
+    if not states:
+        states = {}
+    errored_units = []
+    report = {}
+    for application in model.applications:
+        check_info = states.get(application, {})
+        check_status = check_info.get('workload-status', 'active')
+        check_msg = check_info.get('workload-status-message')
+        if check_msg is not None:
+            prefixes = (check_msg)
+        else:
+            prefixes = approved_message_prefixes
+        for unit in model.applications[application].units:
+            wl_status = unit.workload_status
+            wl_message = unit.workload_status_message or ''
+            if wl_status == 'error':
+                errored_units.append(unit)
+            elif wl_status != check_status:
+                report[unit.entity_id] = (
+                    'workload status is "{}", waiting for "{}"'
+                    .format(wl_status, check_status))
+            elif not wl_message.startswith(prefixes):
+                report[unit.entity_id] = (
+                    'workload status message is "{}", waiting for {}'
+                    .format(wl_message, prefixes))
+    if errored_units:
+        raise UnitError(errored_units)
+    return report
+
+
 async def async_wait_for_application_states(model_name=None, states=None,
                                             timeout=2700):
     """Wait for model to achieve the desired state.
@@ -705,6 +1443,9 @@ async def async_wait_for_application_states(model_name=None, states=None,
                 'workload-status-message': 'Unit is super ready'}}
         wait_for_application_states('modelname', states=states)
 
+    The units still pending, and why, are logged whenever that changes, see
+    get_application_states_report.
+
     :param model_name: Name of model to query.
     :type model_name: str
     :param states: States to look for
@@ -712,43 +1453,43 @@ async def async_wait_for_application_states(model_name=None, states=None,
     :param timeout: Time to wait for status to be achieved
     :type timeout: int
     """
-    approved_message_prefixes = ('ready', 'Ready', 'Unit is ready')
+    pending = {}
+
+    def _check_states():
+        nonlocal pending
+        report = get_application_states_report(model, states=states)
+        if report != pending:
+            logging.info("Waiting for {} unit(s) to reach desired state"
+                         .format(len(report)))
+            for unit_name, reason in sorted(report.items()):
+                logging.info("  {}: {}".format(unit_name, reason))
+            pending = report
+        return not report
 
-    if not states:
-        states = {}
     async with run_in_model(model_name) as model:
         check_model_for_hard_errors(model)
         logging.info("Waiting for a unit to appear")
-        await model.block_until(
-            lambda: len(model.units) > 0
-        )
+        await async_block_until_model_state(
+            model,
+            lambda: len(model.units) > 0,
+            entity_type='unit')
         logging.info("Waiting for all units to be idle")
-        await model.block_until(
-            lambda: model.all_units_idle(), timeout=timeout)
-        for application in model.applications:
-            check_info = states.get(application, {})
-            for unit in model.applications[application].units:
-                logging.info("Checking workload status of {}".format(
-                    unit.entity_id))
-                await model.block_until(
-                    lambda: check_unit_workload_status(
-                        model,
-                        unit,
-                        check_info.get('workload-status', 'active')),
-                    timeout=timeout)
-                check_msg = check_info.get('workload-status-message')
-                logging.info("Checking workload status message of {}".format(
-                    unit.entity_id))
-                if check_msg is not None:
-                    prefixes = (check_msg)
-                else:
-                    prefixes = approved_message_prefixes
-                await model.block_until(
-                    lambda: check_unit_workload_status_message(
-                        model,
-                        unit,
-                        prefixes=prefixes),
-                    timeout=timeout)
+        await async_block_until_model_state(
+            model,
+            lambda: model.all_units_idle(),
+            entity_type='unit',
+            timeout=timeout)
+        logging.info("Checking workload status and message of all units")
+        try:
+            await async_block_until_model_state(
+                model,
+                _check_states,
+                entity_type='unit',
+                timeout=timeout)
+        except asyncio.TimeoutError:
+            logging.error("Timed out waiting for units: {}"
+                          .format(', '.join(sorted(pending))))
+            raise
 
 wait_for_application_states = sync_wrapper(async_wait_for_application_states)
 
@@ -766,14 +1507,18 @@ async def async_block_until_all_units_idle(model_name=None, timeout=2700):
     :type timeout: float
     """
     async with run_in_model(model_name) as model:
-        await model.block_until(
-            lambda: model.all_units_idle(), timeout=timeout)
+        await async_block_until_model_state(
+            model,
+            lambda: model.all_units_idle(),
+            entity_type='unit',
+            timeout=timeout)
 
 block_until_all_units_idle = sync_wrapper(async_block_until_all_units_idle)
 
 
 async def async_block_until_service_status(unit_name, services, target_status,
-                                           model_name=None, timeout=2700):
+                                           model_name=None, timeout=2700,
+                                           remote=False):
     """Block until all services on the unit are in the desired state.
 
     Block until all services on the unit are in the desired state (stopped
@@ -795,22 +1540,38 @@ async def async_block_until_service_status(unit_name, services, target_status,
     :type model_name: str
     :param timeout: Time to wait for status to be achieved
     :type timeout: int
+    :param remote: Wait on the unit rather than polling it, see
+                   async_block_until_remote
+    :type remote: bool
     """
+    if remote:
+        if target_status == "running":
+            check = "pidof -x {} > /dev/null"
+        else:
+            check = "! pidof -x {} > /dev/null"
+        await async_block_until_remote(
+            [unit_name],
+            ' && '.join([check.format(service) for service in services]),
+            model_name=model_name,
+            timeout=timeout)
+        return
+
     async def _check_service():
-        for service in services:
-            out = await async_run_on_unit(
-                unit_name,
-                "pidof -x {}".format(service),
-                model_name=model_name,
-                timeout=timeout)
-            response_size = len(out['Stdout'].strip())
-            if target_status == "running" and response_size == 0:
-                return False
-            elif target_status == "stopped" and response_size > 0:
-                return False
-        return True
+        states = await async_get_unit_service_states(
+            [unit_name],
+            services,
+            model_name=model_name)
+        running = [service for service, start_time
+                   in states[unit_name].items() if start_time is not None]
+        if target_status == "running":
+            return len(running) == len(set(services))
+        else:
+            return not running
     async with run_in_model(model_name):
-        await async_block_until(_check_service, timeout=timeout)
+        await async_block_until(
+            _check_service,
+            timeout=timeout,
+            **REMOTE_POLL_SETTINGS)
 
 block_until_service_status = sync_wrapper(async_block_until_service_status)
 
@@ -853,12 +1614,27 @@ get_current_model = sync_wrapper(async_get_current_model)
 
 
 async def async_block_until(*conditions, timeout=None, wait_period=0.5,
-                            loop=None):
+                            loop=None, concurrent=False, backoff=1,
+                            max_wait_period=None, jitter=0, stats=None):
     """Return only after all async conditions are true.
 
     Based on juju.utils.block_until which currently does not support
     async methods as conditions.
 
+    By default the conditions are evaluated one after another every
+    wait_period seconds. Slow conditions can be evaluated concurrently, in
+    which case the evaluation stops at the first condition which is False.
+    The wait between evaluations can grow exponentially::
+
+        await async_block_until(
+            _check_a, _check_b,
+            concurrent=True,
+            wait_period=1,
+            backoff=2,
+            max_wait_period=30,
+            jitter=0.1,
+            timeout=2700)
+
     :param conditions: Functions to evaluate.
     :type conditions: functions
     :param timeout: Timeout in seconds
@@ -867,20 +1643,172 @@ async def async_block_until(*conditions, timeout=None, wait_period=0.5,
     :type wait_period: float
     :param loop: The event loop to use
     :type loop: An event loop
+    :param concurrent: Evaluate the conditions concurrently
+    :type concurrent: bool
+    :param backoff: Factor the wait period is multiplied by after each
+                    evaluation
+    :type backoff: float
+    :param max_wait_period: Upper limit of the wait period
+    :type max_wait_period: float
+    :param jitter: Fraction of the wait period by which each wait is randomly
+                   lengthened or shortened
+    :type jitter: float
+    :param stats: Dictionary to record the number of calls, total and maximum
+                  time of each condition in, keyed by condition position
+    :type stats: dict
     """
+    async def _evaluate(position, condition):
+        start = time.time()
+        try:
+            return await condition()
+        finally:
+            if stats is not None:
+                elapsed = time.time() - start
+                entry = stats.setdefault(position, {
+                    'name': getattr(condition, '__name__', repr(condition)),
+                    'calls': 0,
+                    'total': 0.0,
+                    'max': 0.0})
+                entry['calls'] += 1
+                entry['total'] += elapsed
+                entry['max'] = max(entry['max'], elapsed)
+
+    async def _evaluate_serially():
+        evaluated = []
+        for position, c in enumerate(conditions):
+            result = await _evaluate(position, c)
+            evaluated.append(result)
+        return all(evaluated)
+
+    async def _evaluate_concurrently():
+        pending = set([
+            asyncio.ensure_future(_evaluate(position, c), loop=loop)
+            for position, c in enumerate(conditions)])
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending,
+                    loop=loop,
+                    return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if not task.result():
+                        return False
+            return True
+        finally:
+            for task in pending:
+                task.cancel()
+
     async def _block():
+        period = wait_period
         while True:
-            evaluated = []
-            for c in conditions:
-                result = await c()
-                evaluated.append(result)
-            if all(evaluated):
+            if concurrent:
+                result = await _evaluate_concurrently()
+            else:
+                result = await _evaluate_serially()
+            if result:
                 return
+            if jitter:
+                await asyncio.sleep(
+                    period * random.uniform(1 - jitter, 1 + jitter),
+                    loop=loop)
             else:
-                await asyncio.sleep(wait_period, loop=loop)
+                await asyncio.sleep(period, loop=loop)
+            period = period * backoff
+            if max_wait_period is not None:
+                period = min(period, max_wait_period)
     await asyncio.wait_for(_block(), timeout, loop=loop)
 
 
+async def async_block_until_remote(unit_names, check_cmd, model_name=None,
+                                   timeout=2700, watch_path=None):
+    """Block until a shell check passes on all the given units.
+
+    Rather than polling the check from here, a small script which runs
+    check_cmd in a loop is started on all units. If watch_path is given and
+    inotifywait is installed on the unit the check is re-run as soon as the
+    path changes, otherwise it is re-run every REMOTE_WAIT_INTERVAL
+    seconds::
+
+        await async_block_until_remote(
+            ['glance/0', 'glance/1'],
+            'pidof -x glance-api > /dev/null',
+            timeout=300)
+
+    juju run holds the unit's hook lock, which would stop the hooks the
+    check waits for from running. The script is therefore detached from the
+    juju run which starts it, and its exit code is collected with short runs.
+
+    :param unit_names: Names of units to run check on
+    :type unit_names: [str, ...]
+    :param check_cmd: Shell command which succeeds once the condition holds
+    :type check_cmd: str
+    :param model_name: Name of model units are in
+    :type model_name: str
+    :param timeout: Time to wait for the check to pass on all units
+    :type timeout: int
+    :param watch_path: File or directory to watch for changes with inotify
+    :type watch_path: str
+    :raises: asyncio.TimeoutError, CommandRunFailed
+    """
+    script = REMOTE_WAIT_SCRIPT.format(
+        check=check_cmd,
+        timeout=int(timeout),
+        interval=REMOTE_WAIT_INTERVAL,
+        watch_timeout=REMOTE_WAIT_WATCH_TIMEOUT,
+        watch_path=watch_path or '')
+    result_file = '/tmp/zaza-wait-{}'.format(uuid.uuid4().hex)
+    start_cmd = REMOTE_WAIT_START_CMD.format(
+        script=base64.b64encode(script.encode()).decode(),
+        result=result_file)
+    results = await async_run_on_units(
+        unit_names,
+        start_cmd,
+        model_name=model_name,
+        timeout=REMOTE_WAIT_RUN_TIMEOUT)
+    for unit_name, result in sorted(results.items()):
+        if not run_succeeded(result):
+            raise CommandRunFailed(start_cmd, result)
+
+    poll_cmd = REMOTE_WAIT_POLL_CMD.format(result=result_file)
+    # Exit code of the script on each unit it has finished on
+    codes = {}
+
+    async def _check_finished():
+        pending = [name for name in unit_names if name not in codes]
+        results = await async_run_on_units(
+            pending,
+            poll_cmd,
+            model_name=model_name,
+            timeout=REMOTE_WAIT_RUN_TIMEOUT)
+        for unit_name, result in results.items():
+            output = (result.get('Stdout') or '').strip()
+            if run_succeeded(result) and output:
+                codes[unit_name] = int(output)
+        return len(codes) == len(unit_names)
+
+    # Give the script a chance to report its own timeout
+    try:
+        await async_block_until(
+            _check_finished,
+            timeout=int(timeout) + REMOTE_WAIT_WATCH_TIMEOUT,
+            **REMOTE_POLL_SETTINGS)
+    except asyncio.TimeoutError:
+        pass
+    timed_out = []
+    for unit_name in sorted(unit_names):
+        code = codes.get(unit_name)
+        if code is None or code == 124:
+            timed_out.append(unit_name)
+        elif code != 0:
+            raise CommandRunFailed(check_cmd, {'Code': code})
+    if timed_out:
+        logging.error("Timed out waiting for `{}` on {}".format(
+            check_cmd, ', '.join(timed_out)))
+        raise asyncio.TimeoutError()
+
+block_until_remote = sync_wrapper(async_block_until_remote)
+
+
 async def async_block_until_file_ready(application_name, remote_file,
                                        check_function, model_name=None,
                                        timeout=2700):
@@ -890,6 +1818,10 @@ async def async_block_until_file_ready(application_name, remote_file,
     unlikely that a test would call this function directly, rather it is
     provided as scaffolding for tests with a more specialised purpose.
 
+    Each poll fetches the size, mtime and hash of the file from all units in
+    one juju run. The file itself is only fetched from units where it has
+    changed, and check_function is run on the contents in memory.
+
     :param model_name: Name of model to query.
     :type model_name: str
     :param application_name: Name of application
@@ -902,32 +1834,57 @@ async def async_block_until_file_ready(application_name, remote_file,
     :param timeout: Time to wait for contents to appear in file
     :type timeout: float
     """
+    # Cheap fingerprint of the file, the contents are only fetched from units
+    # where the fingerprint has changed since the last check.
+    fingerprint_cmd = "stat -L -c '%s %Y' {0} && sha256sum {0}".format(
+        remote_file)
+    # (fingerprint, check result) of the file on each unit
+    checked = {}
+
     async def _check_file():
-        file_name = os.path.basename(remote_file)
-        units = model.applications[application_name].units
-        with tempfile.TemporaryDirectory() as tmpdir:
-            for unit in units:
-                try:
-                    await unit.scp_from(remote_file, tmpdir)
-                    with open(os.path.join(tmpdir, file_name), 'r') as lf:
-                        contents = lf.read()
-                    if not check_function(contents):
-                        return False
-                # libjuju throws a generic error for scp failure. So we cannot
-                # differentiate between a connectivity issue and a target file
-                # not existing error. For now just assume the latter.
-                except JujuError as e:
-                    return False
-            else:
-                return True
+        unit_names = [unit.entity_id
+                      for unit in model.applications[application_name].units]
+        fingerprints = await async_run_on_units(
+            unit_names,
+            fingerprint_cmd,
+            model_name=model_name)
+        changed = {}
+        for unit_name in unit_names:
+            result = fingerprints.get(unit_name)
+            if not result or not run_succeeded(result):
+                # The file does not exist (yet)
+                checked.pop(unit_name, None)
+                continue
+            fingerprint = result.get('Stdout')
+            if checked.get(unit_name, (None, False))[0] != fingerprint:
+                changed[unit_name] = fingerprint
+        if changed:
+            unit_files = await async_get_unit_files(
+                sorted(changed.keys()),
+                [remote_file],
+                model_name=model_name)
+            for unit_name, fingerprint in changed.items():
+                contents = unit_files.get(unit_name, {}).get(remote_file)
+                if contents is None:
+                    checked.pop(unit_name, None)
+                    continue
+                checked[unit_name] = (
+                    fingerprint,
+                    check_function(contents.decode('utf-8')))
+        return all([checked.get(unit_name, (None, False))[1]
+                    for unit_name in unit_names])
 
     async with run_in_model(model_name) as model:
-        await async_block_until(_check_file, timeout=timeout)
+        await async_block_until(
+            _check_file,
+            timeout=timeout,
+            **REMOTE_POLL_SETTINGS)
 
 
 async def async_block_until_file_has_contents(application_name, remote_file,
                                               expected_contents,
-                                              model_name=None, timeout=2700):
+                                              model_name=None, timeout=2700,
+                                              remote=False):
     """Block until the expected_contents are present on all units.
 
     Block until the given string (expected_contents) is present in the file
@@ -941,6 +1898,9 @@ async def async_block_until_file_has_contents(application_name, remote_file,
             '/etc/apache2/apache2.conf',
             'KeepAlive On')
 
+    With remote set the file is watched on the units themselves, see
+    async_block_until_remote. Trailing newlines of expected_contents are
+    ignored in that mode.
 
     :param model_name: Name of model to query.
     :type model_name: str
@@ -952,7 +1912,23 @@ async def async_block_until_file_has_contents(application_name, remote_file,
     :type expected_contents: str
     :param timeout: Time to wait for contents to appear in file
     :type timeout: float
+    :param remote: Wait on the units rather than polling them
+    :type remote: bool
     """
+    if remote:
+        units = await async_get_units(application_name, model_name=model_name)
+        check_cmd = (
+            'contents=$(cat {} 2>/dev/null) && '
+            '[[ "$contents" == *"$(echo {} | base64 -d)"* ]]'.format(
+                remote_file,
+                base64.b64encode(expected_contents.encode()).decode()))
+        return await async_block_until_remote(
+            [unit.entity_id for unit in units],
+            check_cmd,
+            model_name=model_name,
+            timeout=timeout,
+            watch_path=os.path.dirname(remote_file))
+
     def f(x):
         return expected_contents in x
     return await async_block_until_file_ready(
@@ -966,6 +1942,55 @@ block_until_file_has_contents = sync_wrapper(
     async_block_until_file_has_contents)
 
 
+class OsloConfigParser(cfg.ConfigParser):
+    """oslo.config parser for a config file which is already in memory."""
+
+    def __init__(self, contents, sections):
+        """Create a parser for the given contents.
+
+        :param contents: Contents of the config file
+        :type contents: str
+        :param sections: Dictionary to populate with the parsed sections
+        :type sections: dict
+        """
+        super(OsloConfigParser, self).__init__('<memory>', sections)
+        self.contents = contents
+
+    def parse(self):
+        """Parse the contents without reading them from a file."""
+        return iniparser.BaseParser.parse(
+            self,
+            self.contents.splitlines(True))
+
+
+def parse_oslo_config(contents):
+    """Parse the contents of an oslo.config file.
+
+    The parsed sections are cached by the digest of the contents so the same
+    contents, e.g. the same file fetched from several units, are only parsed
+    once. The returned dictionary is shared and must not be modified.
+
+    :param contents: Contents of the config file
+    :type contents: Union[str, bytes]
+    :returns: Values of each key in each section, e.g.
+              {'DEFAULT': {'debug': ['False']}}
+    :rtype: dict
+    :raises: oslo_config.iniparser.ParseError
+    """
+    if isinstance(contents, str):
+        contents = contents.encode('utf-8')
+    digest = hashlib.sha256(contents).hexdigest()
+    if digest in OSLO_CONFIG_CACHE:
+        OSLO_CONFIG_CACHE.move_to_end(digest)
+    else:
+        sections = {}
+        OsloConfigParser(contents.decode('utf-8'), sections).parse()
+        OSLO_CONFIG_CACHE[digest] = sections
+        if len(OSLO_CONFIG_CACHE) > OSLO_CONFIG_CACHE_SIZE:
+            OSLO_CONFIG_CACHE.popitem(last=False)
+    return OSLO_CONFIG_CACHE[digest]
+
+
 async def async_block_until_oslo_config_entries_match(application_name,
                                                       remote_file,
                                                       expected_contents,
@@ -1012,17 +2037,11 @@ async def async_block_until_oslo_config_entries_match(application_name,
 
     """
     def f(x):
-        # Writing out the file that was just read is suboptimal
-        with tempfile.NamedTemporaryFile(mode='w', delete=True) as fp:
-            fp.write(x)
-            fp.seek(0)
-            sections = {}
-            parser = cfg.ConfigParser(fp.name, sections)
-            parser.parse()
-            for section, entries in expected_contents.items():
-                for key, value in entries.items():
-                    if sections.get(section, {}).get(key) != value:
-                        return False
+        sections = parse_oslo_config(x)
+        for section, entries in expected_contents.items():
+            for key, value in entries.items():
+                if sections.get(section, {}).get(key) != value:
+                    return False
         return True
     return await async_block_until_file_ready(
         application_name,
@@ -1038,7 +2057,7 @@ block_until_oslo_config_entries_match = sync_wrapper(
 
 async def async_block_until_services_restarted(application_name, mtime,
                                                services, model_name=None,
-                                               timeout=2700):
+                                               timeout=2700, remote=False):
     """Block until the given services have a start time later then mtime.
 
     For example to check that the glance-api service has been restarted::
@@ -1059,23 +2078,38 @@ async def async_block_until_services_restarted(application_name, mtime,
     :type services: []
     :param timeout: Time to wait for services to be restarted
     :type timeout: float
+    :param remote: Wait on the units rather than polling them, see
+                   async_block_until_remote
+    :type remote: bool
     """
+    if remote:
+        units = await async_get_units(application_name, model_name=model_name)
+        check = ("[ \"$(stat -c %Y /proc/$(pidof -x {} | cut -f1 -d ' ') "
+                 "2>/dev/null)\" -ge {} ] 2>/dev/null")
+        await async_block_until_remote(
+            [unit.entity_id for unit in units],
+            ' && '.join([check.format(service, int(mtime))
+                         for service in services]),
+            model_name=model_name,
+            timeout=timeout)
+        return
+
     async def _check_service():
         units = model.applications[application_name].units
-        for unit in units:
-            for service in services:
-                try:
-                    svc_mtime = await async_get_unit_service_start_time(
-                        model_name,
-                        unit.entity_id,
-                        service)
-                except ServiceNotRunning:
-                    return False
-                if svc_mtime < mtime:
+        states = await async_get_unit_service_states(
+            [unit.entity_id for unit in units],
+            services,
+            model_name=model_name)
+        for unit_states in states.values():
+            for start_time in unit_states.values():
+                if start_time is None or start_time < mtime:
                     return False
         return True
     async with run_in_model(model_name) as model:
-        await async_block_until(_check_service, timeout=timeout)
+        await async_block_until(
+            _check_service,
+            timeout=timeout,
+            **REMOTE_POLL_SETTINGS)
 
 
 block_until_services_restarted = sync_wrapper(
@@ -1096,7 +2130,8 @@ async def async_block_until_unit_wl_status(unit_name, status, model_name=None,
 
     NOTE: unit.workload_status was actually reporting the application workload
           status. Using the full status output from model.get_status() gives us
-          unit by unit workload status.
+          unit by unit workload status. The full status is only re-fetched
+          when the model sees a change to the unit.
 
     :param unit_name: Name of unit
     :type unit_name: str
@@ -1109,12 +2144,17 @@ async def async_block_until_unit_wl_status(unit_name, status, model_name=None,
     """
     async def _unit_status():
         app = unit_name.split("/")[0]
-        model_status = await async_get_status()
+        model_status = await async_get_status(model_name=model_name)
         return (model_status.applications[app]['units'][unit_name]
                 ['workload-status']['status'] == status)
 
-    async with run_in_model(model_name):
-        await async_block_until(_unit_status, timeout=timeout)
+    async with run_in_model(model_name) as model:
+        await async_block_until_model_state(
+            model,
+            _unit_status,
+            entity_type='unit',
+            entity_id=unit_name,
+            timeout=timeout)
 
 block_until_unit_wl_status = sync_wrapper(
     async_block_until_unit_wl_status)
@@ -78,6 +78,24 @@ class ReleasePairNotFound(Exception):
     pass
 
 
+class ResourceErrorState(Exception):
+    """An OpenStack resource reached an error state."""
+
+    pass
+
+
+class ResourceNotFound(Exception):
+    """An OpenStack resource being waited for does not exist."""
+
+    pass
+
+
+class ImageVerificationFailed(Exception):
+    """A downloaded image is incomplete or does not match its checksum."""
+
+    pass
+
+
 class KeystoneAuthorizationStrict(Exception):
     """Authorization/Policy too strict."""
 
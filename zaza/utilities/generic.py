@@ -22,6 +22,12 @@ import yaml
 from zaza import model
 from zaza.utilities import juju as juju_utils
 
+# Installed packages keyed by (model name, machine), see
+# get_package_inventory
+PACKAGE_INVENTORIES = {}
+PACKAGE_INVENTORY_CMD = (
+    "dpkg-query -W -f='${Package} ${Version} ${db:Status-Abbrev}\\n'")
+
 
 def dict_to_yaml(dict_data):
     """Return YAML from dictionary.
@@ -66,22 +72,156 @@ def get_network_config(net_topology, ignore_env_vars=False,
     return net_info
 
 
-def get_pkg_version(application, pkg):
+def _get_package_inventory_signature(snapshot, machine):
+    """Return the state of a machine which its package inventory depends on.
+
+    The signature changes when the machine is series upgraded, when a charm
+    of one of its units is upgraded or when one of its units runs a hook.
+
+    :param snapshot: Status snapshot to read the state from
+    :type snapshot: juju_utils.StatusSnapshot
+    :param machine: Machine to return the signature of
+    :type machine: str
+    :returns: Signature of the machine
+    :rtype: tuple
+    """
+    units = []
+    for unit, unit_machine in sorted(snapshot.unit_machine.items()):
+        if unit_machine != machine:
+            continue
+        agent_status = snapshot.unit_status[unit].get('agent-status') or {}
+        units.append((
+            unit,
+            snapshot.application_charm.get(unit.split('/')[0]),
+            agent_status.get('since')))
+    return (snapshot.machine_series.get(machine), tuple(units))
+
+
+def get_package_inventory_signature(unit_names, model_name=None):
+    """Return the signature of the package inventories of the given units.
+
+    Anything derived from the packages installed on the units can be cached
+    until the signature changes, see get_package_inventory.
+
+    :param unit_names: Names of units to return the signature of
+    :type unit_names: [str, ...]
+    :param model_name: Name of model to query.
+    :type model_name: str
+    :returns: Signature of the machines hosting the units
+    :rtype: tuple
+    """
+    if not model_name:
+        model_name = model.get_juju_model()
+    snapshot = juju_utils.get_status_snapshot(model_name=model_name)
+    machines = sorted(set(
+        snapshot.unit_machine.get(unit_name) or unit_name
+        for unit_name in unit_names))
+    return tuple(
+        (machine, _get_package_inventory_signature(snapshot, machine))
+        for machine in machines)
+
+
+def get_package_inventory(unit_names, model_name=None):
+    """Return the packages installed on the machines hosting the units.
+
+    The packages are listed once per machine, on all the machines at once,
+    and the inventory of a machine is reused until the machine is series
+    upgraded or a unit on it is upgraded or runs a hook.
+
+    :param unit_names: Names of units to return the packages of
+    :type unit_names: [str, ...]
+    :param model_name: Name of model to query.
+    :type model_name: str
+    :returns: Version of each installed package keyed by unit name
+    :rtype: {str: {str: str}}
+    :raises: model.CommandRunFailed
+    """
+    if not model_name:
+        model_name = model.get_juju_model()
+    snapshot = juju_utils.get_status_snapshot(model_name=model_name)
+    machines = {}
+    stale = {}
+    for unit_name in unit_names:
+        machine = snapshot.unit_machine.get(unit_name) or unit_name
+        machines[unit_name] = machine
+        signature = _get_package_inventory_signature(snapshot, machine)
+        cached = PACKAGE_INVENTORIES.get((model_name, machine))
+        if not cached or cached[0] != signature:
+            stale.setdefault(machine, (unit_name, signature))
+    if stale:
+        results = model.run_on_units(
+            [unit_name for unit_name, _ in stale.values()],
+            PACKAGE_INVENTORY_CMD,
+            model_name=model_name)
+        for machine, (unit_name, signature) in stale.items():
+            result = results.get(unit_name)
+            if not result or not model.run_succeeded(result):
+                raise model.CommandRunFailed(
+                    PACKAGE_INVENTORY_CMD, result or {})
+            packages = {}
+            for line in result.get('Stdout', '').splitlines():
+                fields = line.split()
+                # Only keep installed packages, e.g. 'ii ' or 'hi '
+                if len(fields) >= 3 and fields[2][1:2] == 'i':
+                    packages[fields[0]] = fields[1]
+            PACKAGE_INVENTORIES[(model_name, machine)] = (signature, packages)
+    return {unit_name: PACKAGE_INVENTORIES[(model_name, machine)][1]
+            for unit_name, machine in machines.items()}
+
+
+def invalidate_package_inventory(model_name=None):
+    """Drop cached package inventories so they are listed again.
+
+    :param model_name: Name of model to drop the inventories of, all
+                       inventories are dropped if None
+    :type model_name: str
+    """
+    for key in list(PACKAGE_INVENTORIES.keys()):
+        if not model_name or key[0] == model_name:
+            del PACKAGE_INVENTORIES[key]
+
+
+def invalidate_deployed_versions(model_name=None):
+    """Drop cached package inventories and what is derived from them.
+
+    This covers the detected OpenStack codenames and the overcloud auth
+    context, which depends on the keystone release.
+
+    Called when what is deployed is changed, e.g. by set_origin.
+
+    :param model_name: Name of model to drop the cached versions of, all
+                       are dropped if None
+    :type model_name: str
+    """
+    # Imported here as zaza.utilities.openstack imports this module
+    from zaza.utilities import openstack as openstack_utils
+    invalidate_package_inventory(model_name=model_name)
+    openstack_utils.invalidate_os_versions(model_name=model_name)
+    openstack_utils.invalidate_overcloud_auth_context(model_name=model_name)
+
+
+def get_pkg_version(application, pkg, model_name=None):
     """Return package version.
 
     :param application: Application name
     :type application: string
     :param pkg: Package name
     :type pkg: string
+    :param model_name: Name of model to query.
+    :type model_name: str
     :returns: List of package version
     :rtype: list
+    :raises: Exception
     """
+    unit_names = [unit.entity_id for unit in
+                  model.get_units(application, model_name=model_name)]
+    inventory = get_package_inventory(unit_names, model_name=model_name)
     versions = []
-    units = model.get_units(application)
-    for unit in units:
-        cmd = 'dpkg -l | grep {}'.format(pkg)
-        out = juju_utils.remote_run(unit.entity_id, cmd)
-        versions.append(out.split('\n')[0].split()[2])
+    for unit_name, packages in sorted(inventory.items()):
+        if pkg not in packages:
+            raise Exception('Package {} is not installed on {}'
+                            .format(pkg, unit_name))
+        versions.append(packages[pkg])
     if len(set(versions)) != 1:
         raise Exception('Unexpected output from pkg version check')
     return versions[0]
@@ -324,6 +464,8 @@ def series_upgrade(unit_name, machine_num,
     # This step may be performed by juju in the future
     logging.info("Set series on {} to {}".format(application, to_series))
     model.set_series(application, to_series)
+    juju_utils.invalidate_status_snapshot()
+    invalidate_deployed_versions()
 
 
 def set_origin(application, origin='openstack-origin', pocket='distro'):
@@ -342,6 +484,7 @@ def set_origin(application, origin='openstack-origin', pocket='distro'):
     """
     logging.info("Set origin on {} to {}".format(application, origin))
     model.set_application_config(application, {origin: pocket})
+    invalidate_deployed_versions()
 
 
 def wrap_do_release_upgrade(unit_name, from_series="trusty",
@@ -0,0 +1,308 @@
+# Copyright 2018 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Module for caching downloaded images on the local host.
+
+Images are stored once per URL and published checksum, so runs on the same
+host share a single verified copy of each image::
+
+    with cached_image(image_url) as local_path:
+        upload(local_path)
+"""
+
+import contextlib
+import fcntl
+import hashlib
+import logging
+import os
+import re
+import shutil
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from zaza.utilities import exceptions
+
+# Directory images are cached in
+IMAGE_CACHE_DIR = os.environ.get(
+    'ZAZA_IMAGE_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'zaza', 'images'))
+# Size in bytes the cached images are kept under
+IMAGE_CACHE_SIZE = int(os.environ.get(
+    'ZAZA_IMAGE_CACHE_SIZE',
+    10 * 1024 ** 3))
+# Checksum files published next to images, strongest first
+CHECKSUM_FILES = [
+    ('sha256', 'SHA256SUMS'),
+    ('md5', 'MD5SUMS')]
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# Published checksums keyed by image URL, see get_published_checksum
+PUBLISHED_CHECKSUMS = {}
+
+
+def get_published_checksum(image_url, opener=None):
+    """Return the checksum published for an image.
+
+    The checksum files in CHECKSUM_FILES are looked up in the directory the
+    image is published in. The result is cached for the rest of the run.
+
+    :param image_url: URL of the image
+    :type image_url: str
+    :param opener: Opener to fetch the checksum files with
+    :type opener: Optional[urllib.request.OpenerDirector]
+    :returns: Hash algorithm and hex digest of the image, or (None, None) if
+              no checksum is published
+    :rtype: (Optional[str], Optional[str])
+    """
+    if image_url not in PUBLISHED_CHECKSUMS:
+        PUBLISHED_CHECKSUMS[image_url] = _fetch_published_checksum(
+            image_url, opener or urllib.request.build_opener())
+    return PUBLISHED_CHECKSUMS[image_url]
+
+
+def _fetch_published_checksum(image_url, opener):
+    """Fetch the checksum published for an image.
+
+    :param image_url: URL of the image
+    :type image_url: str
+    :param opener: Opener to fetch the checksum files with
+    :type opener: urllib.request.OpenerDirector
+    :returns: Hash algorithm and hex digest of the image, or (None, None) if
+              no checksum is published
+    :rtype: (Optional[str], Optional[str])
+    """
+    base_url, image_name = image_url.rsplit('/', 1)
+    for algorithm, checksum_file in CHECKSUM_FILES:
+        checksum_url = '{}/{}'.format(base_url, checksum_file)
+        try:
+            contents = opener.open(checksum_url).read().decode()
+        except (OSError, ValueError):
+            logging.debug('No checksums at {}'.format(checksum_url))
+            continue
+        for line in contents.splitlines():
+            # e.g. "<digest> *<name>" or "<digest>  <name>"
+            match = re.match(r'^([0-9a-fA-F]+)\s+\*?(.+)$', line.strip())
+            if match and match.group(2) == image_name:
+                return algorithm, match.group(1).lower()
+    return None, None
+
+
+def get_file_digest(path, algorithm):
+    """Return the hex digest of a file.
+
+    :param path: Path of the file
+    :type path: str
+    :param algorithm: Hash algorithm, e.g. sha256
+    :type algorithm: str
+    :returns: Hex digest
+    :rtype: str
+    """
+    digest = hashlib.new(algorithm)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _open_download(image_url, offset, opener):
+    """Open image_url, from offset if the server supports ranges.
+
+    :param image_url: URL to download image from
+    :type image_url: str
+    :param offset: Number of bytes already downloaded
+    :type offset: int
+    :param opener: Opener to fetch the image with
+    :type opener: urllib.request.OpenerDirector
+    :returns: Response, the offset it starts at and the full size if known
+    :rtype: (http.client.HTTPResponse, int, Optional[int])
+    """
+    request = urllib.request.Request(image_url)
+    if offset:
+        request.add_header('Range', 'bytes={}-'.format(offset))
+    try:
+        response = opener.open(request)
+    except urllib.error.HTTPError as e:
+        if offset and e.code == 416:
+            # Range not satisfiable, start again
+            return _open_download(image_url, 0, opener)
+        raise
+    content_range = response.headers.get('Content-Range')
+    if offset and content_range:
+        # e.g. "bytes 100-999/1000"
+        match = re.match(r'^bytes (\d+)-\d+/(\d+|\*)$', content_range)
+        if match and int(match.group(1)) == offset:
+            size = match.group(2)
+            return response, offset, int(size) if size != '*' else None
+    length = response.headers.get('Content-Length')
+    return response, 0, int(length) if length else None
+
+
+def download(image_url, target_file, checksum=(None, None), opener=None):
+    """Download an image, resuming an earlier interrupted download.
+
+    The image is written to target_file.part and only moved to target_file
+    once its size and checksum have been verified.
+
+    :param image_url: URL to download image from
+    :type image_url: str
+    :param target_file: Local file to save image to
+    :type target_file: str
+    :param checksum: Hash algorithm and hex digest the image must have, see
+                     get_published_checksum
+    :type checksum: (Optional[str], Optional[str])
+    :param opener: Opener to fetch the image with
+    :type opener: Optional[urllib.request.OpenerDirector]
+    :raises: exceptions.ImageVerificationFailed
+    """
+    opener = opener or urllib.request.build_opener()
+    part_file = '{}.part'.format(target_file)
+    offset = 0
+    if os.path.exists(part_file):
+        offset = os.path.getsize(part_file)
+    response, offset, size = _open_download(image_url, offset, opener)
+    if offset:
+        logging.info('Resuming download of {} at {} bytes'.format(
+            image_url, offset))
+    with open(part_file, 'ab' if offset else 'wb') as f:
+        for chunk in iter(lambda: response.read(DOWNLOAD_CHUNK_SIZE), b''):
+            f.write(chunk)
+    if size is not None and os.path.getsize(part_file) != size:
+        raise exceptions.ImageVerificationFailed(
+            'Downloaded {} bytes of {}, expected {}'.format(
+                os.path.getsize(part_file), image_url, size))
+    algorithm, digest = checksum
+    if algorithm and get_file_digest(part_file, algorithm) != digest:
+        # A corrupt partial download must not be resumed
+        os.remove(part_file)
+        raise exceptions.ImageVerificationFailed(
+            '{} checksum of {} does not match {}'.format(
+                algorithm, image_url, digest))
+    os.rename(part_file, target_file)
+
+
+def get_cache_key(image_url, checksum=(None, None)):
+    """Return the name of the cache entry of an image.
+
+    :param image_url: URL of the image
+    :type image_url: str
+    :param checksum: Hash algorithm and hex digest of the image
+    :type checksum: (Optional[str], Optional[str])
+    :returns: Cache entry name
+    :rtype: str
+    """
+    key = '{}\n{}:{}'.format(image_url, *checksum)
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def get_cache_size(cache_dir):
+    """Return the size and last use of each entry of the image cache.
+
+    :param cache_dir: Directory images are cached in
+    :type cache_dir: str
+    :returns: Size in bytes and last use time of each entry keyed by name
+    :rtype: {str: (int, float)}
+    """
+    entries = {}
+    for name in os.listdir(cache_dir):
+        entry_dir = os.path.join(cache_dir, name)
+        if not os.path.isdir(entry_dir):
+            continue
+        size = 0
+        for file_name in os.listdir(entry_dir):
+            size += os.path.getsize(os.path.join(entry_dir, file_name))
+        entries[name] = (size, os.path.getmtime(entry_dir))
+    return entries
+
+
+def evict(cache_dir=None, max_size=None, keep=None):
+    """Remove the least recently used images until the cache fits max_size.
+
+    Entries in use by other runs are skipped.
+
+    :param cache_dir: Directory images are cached in, defaults to
+                      IMAGE_CACHE_DIR
+    :type cache_dir: Optional[str]
+    :param max_size: Size in bytes to keep the cache under, defaults to
+                     IMAGE_CACHE_SIZE
+    :type max_size: Optional[int]
+    :param keep: Name of an entry which must not be removed
+    :type keep: Optional[str]
+    """
+    cache_dir = cache_dir or IMAGE_CACHE_DIR
+    if max_size is None:
+        max_size = IMAGE_CACHE_SIZE
+    entries = get_cache_size(cache_dir)
+    total = sum(size for size, _ in entries.values())
+    by_age = sorted(entries.items(), key=lambda entry: entry[1][1])
+    for name, (size, _) in by_age:
+        if total <= max_size:
+            break
+        if name == keep:
+            continue
+        with open(os.path.join(cache_dir, name + '.lock'), 'a') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                continue
+            logging.info('Evicting {} from image cache'.format(name))
+            shutil.rmtree(os.path.join(cache_dir, name))
+        total -= size
+
+
+@contextlib.contextmanager
+def cached_image(image_url, cache_dir=None, max_size=None, opener=None):
+    """Download an image into the cache and return its local path.
+
+    The image is downloaded at most once per URL and published checksum. It
+    is locked against eviction until the context exits::
+
+        with cached_image(find_cirros_image('x86_64')) as local_path:
+            ...
+
+    :param image_url: URL to download image from
+    :type image_url: str
+    :param cache_dir: Directory images are cached in, defaults to
+                      IMAGE_CACHE_DIR
+    :type cache_dir: Optional[str]
+    :param max_size: Size in bytes to keep the cache under, defaults to
+                     IMAGE_CACHE_SIZE
+    :type max_size: Optional[int]
+    :param opener: Opener to fetch the image with
+    :type opener: Optional[urllib.request.OpenerDirector]
+    :returns: Context manager yielding the path of the cached image
+    :rtype: Iterator[str]
+    :raises: exceptions.ImageVerificationFailed
+    """
+    cache_dir = cache_dir or IMAGE_CACHE_DIR
+    os.makedirs(cache_dir, exist_ok=True)
+    checksum = get_published_checksum(image_url, opener=opener)
+    if not checksum[0]:
+        logging.warning('No published checksum for {}'.format(image_url))
+    key = get_cache_key(image_url, checksum)
+    entry_dir = os.path.join(cache_dir, key)
+    local_path = os.path.join(
+        entry_dir,
+        os.path.basename(urllib.parse.urlparse(image_url).path))
+    with open(os.path.join(cache_dir, key + '.lock'), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if os.path.exists(local_path):
+            logging.info('Using cached {}'.format(image_url))
+            # Mark the entry as recently used
+            os.utime(entry_dir)
+        else:
+            os.makedirs(entry_dir, exist_ok=True)
+            download(image_url, local_path, checksum=checksum, opener=opener)
+            evict(cache_dir=cache_dir, max_size=max_size, keep=key)
+        # Let other runs use the image but not evict it
+        fcntl.flock(lock, fcntl.LOCK_SH)
+        yield local_path
@@ -16,6 +16,7 @@
 """Module for interacting with juju."""
 import os
 from pathlib import Path
+import time
 import yaml
 
 from zaza import (
@@ -24,18 +25,125 @@ from zaza import (
 )
 from zaza.utilities import generic as generic_utils
 
+# Status snapshots keyed by model name, see get_status_snapshot
+STATUS_SNAPSHOTS = {}
+# Seconds a status snapshot is served before a fresh status is fetched
+STATUS_SNAPSHOT_TTL = 10
+
+
+class StatusSnapshot(object):
+    """Indexed view of the full juju status of a model at a point in time."""
+
+    def __init__(self, status):
+        """Index the given full juju status.
+
+        :param status: Full juju status output
+        :type status: juju.client._definitions.FullStatus
+        """
+        self.status = status
+        self.timestamp = time.time()
+        # machine (including containers) -> machine status
+        self.machine_status = {}
+        self.machine_instance_id = {}
+        self.machine_series = {}
+        # unit (including subordinate units) -> machine
+        self.unit_machine = {}
+        self.unit_status = {}
+        # application -> charm URL
+        self.application_charm = {}
+        # application -> principal units
+        self.application_units = {}
+        # subordinate application -> principal applications
+        self.subordinate_principals = {}
+        for machine, machine_status in (status.machines or {}).items():
+            self._index_machine(machine, machine_status)
+        for application, app_status in (status.applications or {}).items():
+            self.application_charm[application] = app_status.get('charm')
+            if app_status.get('subordinate-to'):
+                self.subordinate_principals[application] = list(
+                    app_status.get('subordinate-to'))
+            self.application_units[application] = list(
+                (app_status.get('units') or {}).keys())
+            for unit, unit_status in (app_status.get('units') or {}).items():
+                self._index_unit(unit, unit_status, unit_status.get('machine'))
+                for sub_unit, sub_status in (
+                        unit_status.get('subordinates') or {}).items():
+                    self._index_unit(
+                        sub_unit, sub_status, unit_status.get('machine'))
+
+    def _index_machine(self, machine, machine_status):
+        self.machine_status[machine] = machine_status
+        self.machine_instance_id[machine] = machine_status.get('instance-id')
+        self.machine_series[machine] = machine_status.get('series')
+        for container, container_status in (
+                machine_status.get('containers') or {}).items():
+            self._index_machine(container, container_status)
+
+    def _index_unit(self, unit, unit_status, machine):
+        self.unit_machine[unit] = machine
+        self.unit_status[unit] = unit_status
+
+    def age(self):
+        """Return the number of seconds since the status was indexed.
+
+        :returns: Age of the snapshot in seconds
+        :rtype: float
+        """
+        return time.time() - self.timestamp
+
+
+def get_status_snapshot(model_name=None, max_age=None):
+    """Return an indexed snapshot of the full juju status of a model.
+
+    A snapshot is reused until it is older than max_age seconds or it is
+    dropped with invalidate_status_snapshot.
+
+    :param model_name: Name of model to query.
+    :type model_name: str
+    :param max_age: Maximum age of a reused snapshot in seconds, defaults to
+                    STATUS_SNAPSHOT_TTL
+    :type max_age: float
+    :returns: Indexed status snapshot
+    :rtype: StatusSnapshot
+    """
+    if not model_name:
+        model_name = model.get_juju_model()
+    if max_age is None:
+        max_age = STATUS_SNAPSHOT_TTL
+    snapshot = STATUS_SNAPSHOTS.get(model_name)
+    if snapshot is None or snapshot.age() > max_age:
+        snapshot = StatusSnapshot(model.get_status(model_name=model_name))
+        STATUS_SNAPSHOTS[model_name] = snapshot
+    return snapshot
+
+
+def invalidate_status_snapshot(model_name=None):
+    """Drop cached status snapshots so the next query fetches a new status.
+
+    :param model_name: Name of model to drop the snapshot of, all snapshots
+                       are dropped if None
+    :type model_name: str
+    """
+    if model_name:
+        STATUS_SNAPSHOTS.pop(model_name, None)
+    else:
+        STATUS_SNAPSHOTS.clear()
 
-def get_application_status(application=None, unit=None):
+
+def get_application_status(application=None, unit=None, max_age=None):
     """Return the juju status for an application.
 
     :param application: Application name
     :type application: string
     :param unit: Specific unit
     :type unit: string
+    :param max_age: Maximum age of the status in seconds, see
+                    get_full_juju_status
+    :type max_age: float
     :returns: Juju status output for an application
     :rtype: dict
     """
-    status = get_full_juju_status()
+    status = get_full_juju_status(max_age=max_age)
 
     if unit and not application:
         application = unit.split("/")[0]
@@ -66,14 +174,19 @@ def get_cloud_configs(cloud=None):
         return generic_utils.get_yaml_config(cloud_config)
 
 
-def get_full_juju_status():
+def get_full_juju_status(max_age=None):
     """Return the full juju status output.
 
+    The status is read from the current status snapshot, see
+    get_status_snapshot. Pass max_age=0 to fetch a fresh status.
+
+    :param max_age: Maximum age of the status in seconds, defaults to
+                    STATUS_SNAPSHOT_TTL
+    :type max_age: float
     :returns: Full juju status output
     :rtype: dict
     """
-    status = model.get_status()
-    return status
+    return get_status_snapshot(max_age=max_age).status
 
 
 def get_machines_for_application(application):
@@ -84,18 +197,16 @@ def get_machines_for_application(application):
     :returns: List of machines for an application
     :rtype: list
     """
-    status = get_application_status(application)
+    snapshot = get_status_snapshot()
 
     # libjuju juju status no longer has units for subordinate charms
     # Use the application it is subordinate-to to find machines
-    if status.get("units") is None and status.get("subordinate-to"):
-        return get_machines_for_application(status.get("subordinate-to")[0])
+    units = snapshot.application_units.get(application)
+    principals = snapshot.subordinate_principals.get(application)
+    if not units and principals:
+        return get_machines_for_application(principals[0])
 
-    machines = []
-    for unit in status.get("units").keys():
-        machines.append(
-            status.get("units").get(unit).get("machine"))
-    return machines
+    return [snapshot.unit_machine[unit] for unit in units or []]
 
 
 def get_machine_status(machine, key=None):
@@ -108,8 +219,7 @@ def get_machine_status(machine, key=None):
     :returns: Juju status output for a machine
     :rtype: dict
     """
-    status = get_full_juju_status()
-    status = status.machines.get(machine)
+    status = get_status_snapshot().machine_status.get(machine)
     if key:
         status = status.get(key)
     return status
@@ -123,10 +233,7 @@ def get_machine_series(machine):
     :returns: Juju series
     :rtype: string
     """
-    return get_machine_status(
-        machine=machine,
-        key='series'
-    )
+    return get_status_snapshot().machine_series.get(machine)
 
 
 def get_machine_uuids_for_application(application):
@@ -137,9 +244,10 @@ def get_machine_uuids_for_application(application):
     :returns: List of machine uuuids for an application
     :rtype: list
     """
+    snapshot = get_status_snapshot()
     uuids = []
     for machine in get_machines_for_application(application):
-        uuids.append(get_machine_status(machine, key="instance-id"))
+        uuids.append(snapshot.machine_instance_id.get(machine))
     return uuids
 
 
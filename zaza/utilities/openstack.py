@@ -24,6 +24,7 @@ from .os_versions import (
 )
 
 from glanceclient import Client as GlanceClient
+from glanceclient.v2 import images as glance_images
 
 from keystoneclient.v2_0 import client as keystoneclient_v2
 from keystoneclient.v3 import client as keystoneclient_v3
@@ -34,26 +35,33 @@ from keystoneauth1.identity import (
 )
 import zaza.utilities.cert as cert
 from novaclient import client as novaclient_client
+from novaclient.v2 import servers as nova_servers
 from neutronclient.v2_0 import client as neutronclient
 from neutronclient.common import exceptions as neutronexceptions
 
+import contextlib
+import hashlib
 import io
 import juju_wait
 import logging
+import mmap
 import os
 import paramiko
 import re
+import requests
 import six
 import subprocess
 import sys
-import tempfile
 import tenacity
+import time
 import urllib
+import weakref
 
 from zaza import model
 from zaza.utilities import (
     exceptions,
     generic as generic_utils,
+    image_cache,
     juju as juju_utils,
 )
 
@@ -107,6 +115,62 @@ UPGRADE_SERVICES = [
     {'name': 'ceilometer', 'type': CHARM_TYPES['ceilometer']},
 ]
 
+# (package inventory signature, OpenStack codename) of deployed applications
+# keyed by model name, see get_current_os_versions
+OS_RELEASES = {}
+# Overcloud auth settings and scope keyed by model name, see
+# get_overcloud_auth_context
+OVERCLOUD_AUTH_CONTEXTS = {}
+# Number of resources requested per page by paginated list calls
+OPENSTACK_PAGE_SIZE = 100
+# Statuses of OpenStack resources which will not reach another status
+RESOURCE_ERROR_STATES = ('ERROR', 'error', 'killed', 'CREATE_FAILED')
+# Seconds before a status wait starts from which changed nova servers are
+# listed, the servers waited for have usually just been created or acted on
+RESOURCE_CHANGES_WINDOW = 300
+# Shared keystone sessions keyed by (cloud, scope, verify), see
+# get_shared_keystone_session
+KEYSTONE_SESSIONS = {}
+# Clients of each shared keystone session keyed by the session
+SESSION_CLIENTS = weakref.WeakKeyDictionary()
+# HTTP connection pool used by all keystone sessions, see get_http_session
+HTTP_SESSION = None
+# Hashes calculated while uploading images, glance reports md5 as checksum
+# and sha512 as os_hash_value by default
+IMAGE_UPLOAD_HASH_ALGORITHMS = ('md5', 'sha512')
+# Seconds between progress reports of image uploads
+IMAGE_UPLOAD_PROGRESS_INTERVAL = 10
+# Glance image properties recording where an image was downloaded from, see
+# get_image_source_properties
+IMAGE_SOURCE_URL_PROPERTY = 'zaza_source_url'
+IMAGE_SOURCE_CHECKSUM_PROPERTY = 'zaza_source_checksum'
+# Latest cirros version keyed by release URL, see find_cirros_image
+CIRROS_VERSIONS = {}
+
+
+def _get_os_release_ordinals():
+    """Return the position of each OpenStack codename, oldest first.
+
+    :returns: Ordinal keyed by codename
+    :rtype: {str: int}
+    """
+    codenames = list(OPENSTACK_CODENAMES.values())
+    codenames.extend([pair.split('_')[1]
+                      for pair in OPENSTACK_RELEASES_PAIRS])
+    for package_codenames in PACKAGE_CODENAMES.values():
+        codenames.extend(package_codenames.values())
+    ordinals = {}
+    for codename in codenames:
+        ordinals.setdefault(codename, len(ordinals))
+    return ordinals
+
+
+# Ordinal of each OpenStack codename, see get_os_release_ordinal
+OPENSTACK_RELEASE_ORDINALS = _get_os_release_ordinals()
+# Index of each release pair in OPENSTACK_RELEASES_PAIRS
+OPENSTACK_RELEASES_PAIRS_INDEX = {
+    pair: index for index, pair in enumerate(OPENSTACK_RELEASES_PAIRS)}
+
 
 WORKLOAD_STATUS_EXCEPTIONS = {
     'vault': {
@@ -166,6 +230,29 @@ def get_ks_creds(cloud_creds, scope='PROJECT'):
     return auth
 
 
+def _get_session_client(session, client_type, factory):
+    """Return a client of a keystone session.
+
+    Clients of sessions handed out by get_shared_keystone_session are created
+    once and shared, clients of other sessions are always created.
+
+    :param session: Keystone session object
+    :type session: keystoneauth1.session.Session object
+    :param client_type: Key of the client amongst the clients of the session
+    :type client_type: tuple
+    :param factory: Function creating the client
+    :type factory: Callable[[], Any]
+    :returns: Authenticated client
+    :rtype: Any
+    """
+    clients = SESSION_CLIENTS.get(session)
+    if clients is None:
+        return factory()
+    if client_type not in clients:
+        clients[client_type] = factory()
+    return clients[client_type]
+
+
 def get_glance_session_client(session):
     """Return glanceclient authenticated by keystone session.
 
@@ -174,7 +261,10 @@ def get_glance_session_client(session):
     :returns: Authenticated glanceclient
     :rtype: glanceclient.Client
     """
-    return GlanceClient('2', session=session)
+    return _get_session_client(
+        session,
+        ('glance', '2'),
+        lambda: GlanceClient('2', session=session))
 
 
 def get_nova_session_client(session):
@@ -185,7 +275,10 @@ def get_nova_session_client(session):
     :returns: Authenticated novaclient
     :rtype: novaclient.Client object
     """
-    return novaclient_client.Client(2, session=session)
+    return _get_session_client(
+        session,
+        ('nova', 2),
+        lambda: novaclient_client.Client(2, session=session))
 
 
 def get_neutron_session_client(session):
@@ -196,7 +289,10 @@ def get_neutron_session_client(session):
     :returns: Authenticated neutronclient
     :rtype: neutronclient.Client object
     """
-    return neutronclient.Client(session=session)
+    return _get_session_client(
+        session,
+        ('neutron', '2.0'),
+        lambda: neutronclient.Client(session=session))
 
 
 def get_keystone_scope():
@@ -235,7 +331,102 @@ def get_keystone_session(opentackrc_creds, scope='PROJECT', verify=None):
         auth = v2.Password(**keystone_creds)
     else:
         auth = v3.Password(**keystone_creds)
-    return session.Session(auth=auth, verify=verify)
+    return session.Session(auth=auth, verify=verify,
+                           session=get_http_session())
+
+
+def get_http_session():
+    """Return the HTTP connection pool shared by all keystone sessions.
+
+    :returns: Shared HTTP session
+    :rtype: requests.Session
+    """
+    global HTTP_SESSION
+    if HTTP_SESSION is None:
+        HTTP_SESSION = requests.Session()
+    return HTTP_SESSION
+
+
+def get_shared_keystone_session(cloud, opentackrc_creds, scope='PROJECT',
+                                verify=None):
+    """Return a keystone session shared by all users of the same cloud.
+
+    One session is created for each cloud, scope and verify setting. The
+    token of a session is reused by all its users until shortly before it
+    expires, when keystoneauth fetches a new one.
+
+    :param cloud: Cloud the credentials are for, e.g. ('undercloud',) or
+                  ('overcloud', model_name)
+    :type cloud: tuple
+    :param openrc_creds: Openstack RC credentials, used when the session is
+                         created
+    :type openrc_creds: dict
+    :param scope: Authentication scope: PROJECT or DOMAIN
+    :type scope: string
+    :param verify: Control TLS certificate verification behaviour
+    :type verify: any
+    :returns: Keystone session object
+    :rtype: keystoneauth1.session.Session object
+    """
+    key = (cloud, scope, verify)
+    if key not in KEYSTONE_SESSIONS:
+        keystone_session = get_keystone_session(
+            opentackrc_creds,
+            scope=scope,
+            verify=verify)
+        KEYSTONE_SESSIONS[key] = keystone_session
+        SESSION_CLIENTS[keystone_session] = {}
+    return KEYSTONE_SESSIONS[key]
+
+
+def invalidate_shared_keystone_sessions(cloud=None):
+    """Drop shared keystone sessions and their clients.
+
+    :param cloud: Cloud to drop the sessions of, all sessions are dropped if
+                  None
+    :type cloud: tuple
+    """
+    for key in list(KEYSTONE_SESSIONS.keys()):
+        if cloud is None or key[0] == cloud:
+            keystone_session = KEYSTONE_SESSIONS.pop(key)
+            SESSION_CLIENTS.pop(keystone_session, None)
+
+
+def get_overcloud_auth_context():
+    """Return the settings needed to authenticate against the overcloud.
+
+    The context is looked up once per model and reused until
+    invalidate_overcloud_auth_context is called.
+
+    :returns: Overcloud auth settings, see get_overcloud_auth, and keystone
+              scope, e.g. {'auth_settings': {...}, 'scope': 'PROJECT'}
+    :rtype: dict
+    """
+    model_name = model.get_juju_model()
+    if model_name not in OVERCLOUD_AUTH_CONTEXTS:
+        OVERCLOUD_AUTH_CONTEXTS[model_name] = {
+            'auth_settings': get_overcloud_auth(),
+            'scope': get_keystone_scope()}
+    return OVERCLOUD_AUTH_CONTEXTS[model_name]
+
+
+def invalidate_overcloud_auth_context(model_name=None):
+    """Drop cached overcloud auth contexts so they are looked up again.
+
+    :param model_name: Name of model to drop the context of, all contexts are
+                       dropped if None
+    :type model_name: str
+    """
+    if model_name:
+        OVERCLOUD_AUTH_CONTEXTS.pop(model_name, None)
+    else:
+        OVERCLOUD_AUTH_CONTEXTS.clear()
+    # Drop the sessions authenticated with the dropped contexts
+    for cloud, _, _ in list(KEYSTONE_SESSIONS.keys()):
+        if cloud[0] != 'overcloud':
+            continue
+        if not model_name or cloud[1] == model_name:
+            invalidate_shared_keystone_sessions(cloud)
 
 
 def get_overcloud_keystone_session(verify=None):
@@ -246,9 +437,11 @@ def get_overcloud_keystone_session(verify=None):
     :returns keystone_session: keystoneauth1.session.Session object
     :rtype: keystoneauth1.session.Session
     """
-    return get_keystone_session(get_overcloud_auth(),
-                                scope=get_keystone_scope(),
-                                verify=verify)
+    context = get_overcloud_auth_context()
+    return get_shared_keystone_session(('overcloud', model.get_juju_model()),
+                                       context['auth_settings'],
+                                       scope=context['scope'],
+                                       verify=verify)
 
 
 def get_undercloud_keystone_session(verify=None):
@@ -259,8 +452,9 @@ def get_undercloud_keystone_session(verify=None):
     :returns keystone_session: keystoneauth1.session.Session object
     :rtype: keystoneauth1.session.Session
     """
-    return get_keystone_session(get_undercloud_auth(),
-                                verify=verify)
+    return get_shared_keystone_session(('undercloud',),
+                                       get_undercloud_auth(),
+                                       verify=verify)
 
 
 def get_keystone_session_client(session, client_api_version=3):
@@ -274,9 +468,13 @@ def get_keystone_session_client(session, client_api_version=3):
     :rtype: keystoneclient.v3.Client object
     """
     if client_api_version == 2:
-        return keystoneclient_v2.Client(session=session)
+        factory = keystoneclient_v2.Client
     else:
-        return keystoneclient_v3.Client(session=session)
+        factory = keystoneclient_v3.Client
+    return _get_session_client(
+        session,
+        ('keystone', factory),
+        lambda: factory(session=session))
 
 
 def get_keystone_client(opentackrc_creds, verify=None):
@@ -318,7 +516,7 @@ def get_project_id(ks_client, project_name, api_version=2, domain_name=None):
     domain_id = None
     if domain_name:
         domain_id = ks_client.domains.list(name=domain_name)[0].id
-    all_projects = ks_client.projects.list(domain=domain_id)
+    all_projects = ks_client.projects.list(domain=domain_id, name=project_name)
     for p in all_projects:
         if p._info['name'] == project_name:
             return p._info['id']
@@ -326,6 +524,36 @@ def get_project_id(ks_client, project_name, api_version=2, domain_name=None):
 
 
 # Neutron Helpers
+def iter_neutron_resources(list_function, collection, **filters):
+    """Yield the resources returned by a neutronclient list call.
+
+    The resources are filtered by the server and fetched one page at a
+    time::
+
+        for port in iter_neutron_resources(neutron_client.list_ports,
+                                           'ports',
+                                           device_id=server.id):
+            ...
+
+    :param list_function: neutronclient list call, e.g.
+                          neutron_client.list_ports
+    :type list_function: Callable
+    :param collection: Name of the resources in a page, e.g. 'ports'
+    :type collection: str
+    :param filters: Attributes the resources must have, e.g. device_id
+    :type filters: dict
+    :returns: Generator of resources
+    :rtype: Iterator[dict]
+    """
+    pages = list_function(
+        retrieve_all=False,
+        limit=OPENSTACK_PAGE_SIZE,
+        **filters)
+    for page in pages:
+        for resource in page.get(collection, []):
+            yield resource
+
+
 def get_gateway_uuids():
     """Return machine uuids for neutron-gateway(s).
 
@@ -954,7 +1182,12 @@ def add_neutron_secgroup_rules(neutron_client, project_id):
     :type project_id: string
     """
     secgroup = None
-    for group in neutron_client.list_security_groups().get('security_groups'):
+    security_groups = iter_neutron_resources(
+        neutron_client.list_security_groups,
+        'security_groups',
+        name='default',
+        tenant_id=project_id)
+    for group in security_groups:
         if (group.get('name') == 'default' and
             (group.get('project_id') == project_id or
                 (group.get('tenant_id') == project_id))):
@@ -1112,26 +1345,80 @@ def get_os_code_info(package, pkg_version):
             return OPENSTACK_CODENAMES[vers]
 
 
-def get_current_os_versions(deployed_applications):
+def get_os_release_ordinal(codename):
+    """Return the position of an OpenStack codename in the release history.
+
+    Ordinals of two codenames compare in the same way as the releases::
+
+        get_os_release_ordinal('pike') < get_os_release_ordinal('queens')
+
+    :param codename: OpenStack codename
+    :type codename: str
+    :returns: Ordinal of the release
+    :rtype: int
+    :raises: exceptions.OSVersionNotFound
+    """
+    try:
+        return OPENSTACK_RELEASE_ORDINALS[codename]
+    except KeyError:
+        raise exceptions.OSVersionNotFound(codename)
+
+
+def get_current_os_versions(deployed_applications, model_name=None):
     """Determine OpenStack codename of deployed applications.
 
+    The codename of each application is reused until the package inventory
+    signature of its units changes, see
+    generic_utils.get_package_inventory_signature, or invalidate_os_versions
+    is called, which set_origin and series_upgrade do.
+
     :param deployed_applications: List of deployed applications
     :type deployed_applications: list
+    :param model_name: Name of model to query.
+    :type model_name: str
     :returns: List of aplication to codenames dictionaries
     :rtype: list
     """
+    if not model_name:
+        model_name = model.get_juju_model()
+    detected = OS_RELEASES.setdefault(model_name, {})
     versions = {}
     for application in UPGRADE_SERVICES:
         if application['name'] not in deployed_applications:
             continue
 
-        version = generic_utils.get_pkg_version(application['name'],
-                                                application['type']['pkg'])
-        versions[application['name']] = (
-            get_os_code_info(application['type']['pkg'], version))
+        unit_names = [
+            unit.entity_id
+            for unit in model.get_units(
+                application['name'], model_name=model_name)]
+        signature = generic_utils.get_package_inventory_signature(
+            unit_names, model_name=model_name)
+        cached = detected.get(application['name'])
+        if not cached or cached[0] != signature:
+            version = generic_utils.get_pkg_version(
+                application['name'],
+                application['type']['pkg'],
+                model_name=model_name)
+            detected[application['name']] = (
+                signature,
+                get_os_code_info(application['type']['pkg'], version))
+        versions[application['name']] = detected[application['name']][1]
     return versions
 
 
+def invalidate_os_versions(model_name=None):
+    """Drop detected OpenStack codenames so they are detected again.
+
+    :param model_name: Name of model to drop the codenames of, all codenames
+                       are dropped if None
+    :type model_name: str
+    """
+    if model_name:
+        OS_RELEASES.pop(model_name, None)
+    else:
+        OS_RELEASES.clear()
+
+
 def get_application_config_keys(application):
     """Return application configuration keys.
 
@@ -1182,8 +1469,8 @@ def get_os_release(release_pair=None):
     if release_pair is None:
         release_pair = get_current_os_release_pair()
     try:
-        index = OPENSTACK_RELEASES_PAIRS.index(release_pair)
-    except ValueError:
+        index = OPENSTACK_RELEASES_PAIRS_INDEX[release_pair]
+    except KeyError:
         msg = 'Release pair: {} not found in {}'.format(
             release_pair,
             OPENSTACK_RELEASES_PAIRS
@@ -1297,7 +1584,8 @@ def get_keystone_api_version():
     os_version = get_current_os_versions('keystone')['keystone']
     api_version = get_application_config_option('keystone',
                                                 'preferred-api-version')
-    if os_version >= 'queens':
+    if (get_os_release_ordinal(os_version) >=
+            get_os_release_ordinal('queens')):
         api_version = 3
     elif api_version is None:
         api_version = 2
@@ -1386,24 +1674,80 @@ def get_images_by_name(glance, image_name):
     :returns: List of glance images
     :rtype: [glanceclient.v2.image, ...]
     """
-    return [i for i in glance.images.list() if image_name == i.name]
+    images = glance.images.list(
+        filters={'name': image_name},
+        page_size=OPENSTACK_PAGE_SIZE)
+    return [i for i in images if image_name == i.name]
 
 
 def find_cirros_image(arch):
     """Return the url for the latest cirros image for the given architecture.
 
+    The latest version is looked up once per run.
+
     :param arch: aarch64, arm, i386, amd64, x86_64 etc
     :type arch: str
     :returns: URL for latest cirros image
     :rtype: str
     """
-    opener = get_urllib_opener()
-    f = opener.open(CIRROS_RELEASE_URL)
-    version = f.read().strip().decode()
+    if CIRROS_RELEASE_URL not in CIRROS_VERSIONS:
+        opener = get_urllib_opener()
+        f = opener.open(CIRROS_RELEASE_URL)
+        CIRROS_VERSIONS[CIRROS_RELEASE_URL] = f.read().strip().decode()
+    version = CIRROS_VERSIONS[CIRROS_RELEASE_URL]
     cirros_img = 'cirros-{}-{}-disk.img'.format(version, arch)
     return '{}/{}/{}'.format(CIRROS_IMAGE_URL, version, cirros_img)
 
 
+def get_image_source_properties(image_url, checksum):
+    """Return the glance properties recording where an image came from.
+
+    :param image_url: URL the image was downloaded from
+    :type image_url: str
+    :param checksum: Hash algorithm and hex digest published for the image,
+                     see image_cache.get_published_checksum
+    :type checksum: (Optional[str], Optional[str])
+    :returns: Glance image properties
+    :rtype: {str: str}
+    """
+    properties = {IMAGE_SOURCE_URL_PROPERTY: image_url}
+    if checksum[0]:
+        properties[IMAGE_SOURCE_CHECKSUM_PROPERTY] = '{}:{}'.format(*checksum)
+    return properties
+
+
+def find_images_by_source(glance, image_url, checksum, image_name=None):
+    """Get the active glance images created from the given upstream image.
+
+    Only images created by create_image, which records where an image came
+    from in its properties, are considered. Images match on the published
+    checksum, or on the URL when there is no published checksum.
+
+    :param glance: Authenticated glanceclient
+    :type glance: glanceclient.Client
+    :param image_url: URL of the upstream image
+    :type image_url: str
+    :param checksum: Hash algorithm and hex digest published for the image,
+                     see image_cache.get_published_checksum
+    :type checksum: (Optional[str], Optional[str])
+    :param image_name: Name the images must have, any name matches if None
+    :type image_name: Optional[str]
+    :returns: List of glance images
+    :rtype: [glanceclient.v2.image, ...]
+    """
+    if checksum[0]:
+        filters = {IMAGE_SOURCE_CHECKSUM_PROPERTY: '{}:{}'.format(*checksum)}
+    else:
+        filters = {IMAGE_SOURCE_URL_PROPERTY: image_url}
+    filters['status'] = 'active'
+    if image_name is not None:
+        filters['name'] = image_name
+    images = glance.images.list(filters=filters, page_size=OPENSTACK_PAGE_SIZE)
+    # Older glance APIs may ignore filters on custom properties
+    return [i for i in images
+            if all(i.get(key) == value for key, value in filters.items())]
+
+
 def find_ubuntu_image(release, arch):
     """Return url for image."""
     return UBUNTU_IMAGE_URLS[release].format(release=release, arch=arch)
@@ -1412,14 +1756,21 @@ def find_ubuntu_image(release, arch):
 def download_image(image_url, target_file):
     """Download the image from the given url to the specified file.
 
+    The download is resumed if it was interrupted and verified against the
+    checksum published with the image.
+
     :param image_url: URL to download image from
     :type image_url: str
     :param target_file: Local file to savee image to
     :type target_file: str
+    :raises: exceptions.ImageVerificationFailed
     """
     opener = get_urllib_opener()
-    urllib.request.install_opener(opener)
-    urllib.request.urlretrieve(image_url, target_file)
+    image_cache.download(
+        image_url,
+        target_file,
+        checksum=image_cache.get_published_checksum(image_url, opener=opener),
+        opener=opener)
 
 
 @tenacity.retry(wait=tenacity.wait_exponential(multiplier=1, max=60),
@@ -1451,6 +1802,169 @@ def resource_reaches_status(resource, resource_id,
                                                        expected_status,))
 
 
+def _get_resource_status(resource):
+    """Return the status of an OpenStack resource.
+
+    :param resource: OpenStack resource, e.g. a nova server or a heat stack
+    :type resource: Any
+    :returns: Status of the resource
+    :rtype: str
+    """
+    return (getattr(resource, 'status', None) or
+            getattr(resource, 'stack_status', None))
+
+
+def _is_not_found(error):
+    """Return whether a client error means the resource does not exist.
+
+    :param error: Error raised by an OpenStack client
+    :type error: Exception
+    :returns: Whether the error is a not found error
+    :rtype: bool
+    """
+    # The client specific NotFound exceptions all carry the HTTP status
+    return 404 in (getattr(error, 'code', None),
+                   getattr(error, 'http_status', None),
+                   getattr(error, 'status_code', None))
+
+
+def _list_resources_by_id(resource, resource_ids, since):
+    """List the given resources of a type with a single filtered call.
+
+    Glance filters images on a set of IDs. Nova does not let non admin users
+    filter servers on their ID, so the servers changed since the given time
+    are listed instead. Other resource types cannot be listed by ID.
+
+    :param resource: pointer to os resource type, ex: glance_client.images
+    :type resource: str
+    :param resource_ids: unique ids of the openstack resources
+    :type resource_ids: [str, ...]
+    :param since: Time since which changed nova servers are listed
+    :type since: float
+    :returns: Listed resources, which may miss some of the IDs, or None if
+              the resource type cannot be filtered
+    :rtype: Optional[[Any, ...]]
+    """
+    if isinstance(resource, glance_images.Controller):
+        return resource.list(
+            filters={'id': 'in:{}'.format(','.join(resource_ids))},
+            page_size=OPENSTACK_PAGE_SIZE)
+    if isinstance(resource, nova_servers.ServerManager):
+        return resource.list(
+            search_opts={'changes-since': time.strftime(
+                '%Y-%m-%dT%H:%M:%SZ', time.gmtime(since))},
+            limit=-1)
+    return None
+
+
+def _get_resource_statuses(resource, resource_ids, since=None):
+    """Return the status of each of the given resources of a type.
+
+    Several resources are listed with one call filtered by the server, see
+    _list_resources_by_id, and any resource missing from the listing is
+    fetched by ID, so only the resources waited for are transferred whatever
+    the size of the cloud.
+
+    :param resource: pointer to os resource type, ex: nova_client.servers
+    :type resource: str
+    :param resource_ids: unique ids of the openstack resources
+    :type resource_ids: [str, ...]
+    :param since: Time since which changed nova servers are listed, defaults
+                  to RESOURCE_CHANGES_WINDOW seconds ago
+    :type since: Optional[float]
+    :returns: Status of each resource keyed by id
+    :rtype: {str: str}
+    :raises: exceptions.ResourceNotFound
+    """
+    if since is None:
+        since = time.time() - RESOURCE_CHANGES_WINDOW
+    statuses = {}
+    if len(resource_ids) > 1:
+        listed = _list_resources_by_id(resource, resource_ids, since)
+        for found in listed or []:
+            if found.id in resource_ids:
+                statuses[found.id] = _get_resource_status(found)
+    for resource_id in resource_ids:
+        if resource_id in statuses:
+            continue
+        try:
+            found = resource.get(resource_id)
+        except Exception as e:
+            if not _is_not_found(e):
+                raise
+            raise exceptions.ResourceNotFound(
+                "Resource {} not found".format(resource_id))
+        statuses[resource_id] = _get_resource_status(found)
+    return statuses
+
+
+def resources_reach_status(targets, timeout=300, interval=1, max_interval=5,
+                           msg='resources'):
+    """Wait for many openstack resources to reach their expected status.
+
+    All the resources are polled in the same loop, with one list call per
+    resource type where the type can be filtered by ID, and each resource
+    stops being polled as soon as it is ready::
+
+        resources_reach_status([
+            (nova_client.servers, server1.id, 'ACTIVE'),
+            (nova_client.servers, server2.id, 'ACTIVE'),
+            (glance_client.images, image.id, 'active')])
+
+    :param targets: Resource type, resource id and expected status of each
+                    resource to wait for
+    :type targets: [(str, str, str), ...]
+    :param timeout: Time in seconds to wait for all the resources
+    :type timeout: float
+    :param interval: Time in seconds between the first polls, which grows up
+                     to max_interval
+    :type interval: float
+    :param max_interval: Longest time in seconds between two polls
+    :type max_interval: float
+    :param msg: text to identify purpose in logging
+    :type msg: str
+    :raises: exceptions.ResourceErrorState, exceptions.ResourceNotFound,
+             AssertionError
+    """
+    # resource type -> {resource id: expected status}, keyed by id of the
+    # resource type
+    pending = {}
+    for resource, resource_id, expected_status in targets:
+        pending.setdefault(id(resource), (resource, {}))
+        pending[id(resource)][1][resource_id] = expected_status
+    started = time.time()
+    deadline = started + timeout
+    while True:
+        for key, (resource, expected) in list(pending.items()):
+            statuses = _get_resource_statuses(
+                resource,
+                list(expected.keys()),
+                since=started - RESOURCE_CHANGES_WINDOW)
+            for resource_id, status in statuses.items():
+                if status == expected[resource_id]:
+                    logging.info("{}: {} reached {}".format(
+                        msg, resource_id, status))
+                    del expected[resource_id]
+                elif status in RESOURCE_ERROR_STATES:
+                    raise exceptions.ResourceErrorState(
+                        "{}: {} in {} state, waiting for {}".format(
+                            msg, resource_id, status, expected[resource_id]))
+            if not expected:
+                del pending[key]
+        if not pending:
+            return
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            raise AssertionError("{}: {} not ready after {}s".format(
+                msg,
+                ', '.join(sorted(resource_id
+                                 for _, expected in pending.values()
+                                 for resource_id in expected)),
+                timeout))
+        time.sleep(min(interval, remaining))
+        interval = min(interval * 1.5, max_interval)
+
+
 @tenacity.retry(wait=tenacity.wait_exponential(multiplier=1, max=60),
                 reraise=True, stop=tenacity.stop_after_attempt(2))
 def resource_removed(resource, resource_id, msg="resource"):
@@ -1464,9 +1978,17 @@ def resource_removed(resource, resource_id, msg="resource"):
     :type msy: str
     :raises: AssertionError
     """
-    matching = [r for r in resource.list() if r.id == resource_id]
+    try:
+        found = resource.get(resource_id)
+    except Exception as e:
+        if not _is_not_found(e):
+            raise
+        return
+    # Some services still return deleted resources by ID
+    if _get_resource_status(found) in ('DELETED', 'DELETE_COMPLETE'):
+        return
     logging.debug("Resource {} still present".format(resource_id))
-    assert len(matching) == 0, "Resource {} still present".format(resource_id)
+    raise AssertionError("Resource {} still present".format(resource_id))
 
 
 def delete_resource(resource, resource_id, msg="resource"):
@@ -1499,10 +2021,133 @@ def delete_image(glance, img_id):
     delete_resource(glance.images, img_id, msg="glance image")
 
 
+class ImageUploadReader(object):
+    """File-like image which is hashed as glanceclient reads it.
+
+    The image is streamed in the chunks glanceclient asks for, so it is only
+    read once and never held in memory as a whole.
+    """
+
+    def __init__(self, image_file, size, name='image',
+                 algorithms=IMAGE_UPLOAD_HASH_ALGORITHMS):
+        """Wrap an open image.
+
+        :param image_file: Open image file or memory map of one
+        :type image_file: Union[io.BufferedReader, mmap.mmap]
+        :param size: Size of the image in bytes
+        :type size: int
+        :param name: Name of the image used in progress reports
+        :type name: str
+        :param algorithms: Hash algorithms to calculate
+        :type algorithms: Iterable[str]
+        """
+        self.image_file = image_file
+        self.size = size
+        self.name = name
+        self.digests = {
+            algorithm: hashlib.new(algorithm) for algorithm in algorithms}
+        self.bytes_read = 0
+        self.started = time.time()
+        self.reported = self.started
+
+    def read(self, size=-1):
+        """Read, hash and report progress of the next chunk of the image.
+
+        :param size: Maximum number of bytes to read
+        :type size: int
+        :returns: Next chunk, empty once the whole image has been read
+        :rtype: bytes
+        """
+        chunk = self.image_file.read(size)
+        for digest in self.digests.values():
+            digest.update(chunk)
+        self.bytes_read += len(chunk)
+        now = time.time()
+        if not chunk or now - self.reported >= IMAGE_UPLOAD_PROGRESS_INTERVAL:
+            self.reported = now
+            self.report_progress(now)
+        return chunk
+
+    def report_progress(self, now):
+        """Log the share of the image read and the throughput so far.
+
+        :param now: Current time
+        :type now: float
+        """
+        mib = 1024 * 1024
+        logging.info(
+            'Uploaded {:.1f} of {:.1f} MiB of {} ({:.0f}%, {:.1f} MiB/s)'
+            .format(
+                self.bytes_read / mib,
+                self.size / mib,
+                self.name,
+                100 * self.bytes_read / max(self.size, 1),
+                self.bytes_read / mib / max(now - self.started, 0.001)))
+
+    def hexdigest(self, algorithm):
+        """Return the hex digest of the data read so far.
+
+        :param algorithm: One of the algorithms passed to the constructor
+        :type algorithm: str
+        :returns: Hex digest
+        :rtype: str
+        """
+        return self.digests[algorithm].hexdigest()
+
+
+@contextlib.contextmanager
+def open_image(local_path, use_mmap=False):
+    """Open a local image for reading, optionally as a memory map.
+
+    :param local_path: Path to local image
+    :type local_path: str
+    :param use_mmap: Whether to read the image through a memory map
+    :type use_mmap: bool
+    :returns: Context manager yielding the open image and its size in bytes
+    :rtype: Iterator[(Union[io.BufferedReader, mmap.mmap], int)]
+    """
+    with open(local_path, 'rb') as image_file:
+        size = os.fstat(image_file.fileno()).st_size
+        # An empty file cannot be mapped
+        if use_mmap and size:
+            with mmap.mmap(image_file.fileno(), 0,
+                           access=mmap.ACCESS_READ) as image_map:
+                yield image_map, size
+        else:
+            yield image_file, size
+
+
+def verify_uploaded_image(image, reader):
+    """Check the hashes glance reports for an image match the uploaded data.
+
+    :param image: Glance image the data was uploaded to
+    :type image: glanceclient.v2.schemas.SchemaBasedModel
+    :param reader: Reader the data was uploaded from
+    :type reader: ImageUploadReader
+    :raises: exceptions.ImageVerificationFailed
+    """
+    reported = [('md5', image.get('checksum'))]
+    if image.get('os_hash_algo'):
+        reported.append((image['os_hash_algo'], image.get('os_hash_value')))
+    for algorithm, value in reported:
+        if not value or algorithm not in reader.digests:
+            continue
+        if reader.hexdigest(algorithm) != value:
+            raise exceptions.ImageVerificationFailed(
+                'glance reports {} {} for {} but {} was uploaded'.format(
+                    algorithm, value, image.id, reader.hexdigest(algorithm)))
+        logging.debug('Verified {} {} of {}'.format(
+            algorithm, value, image.id))
+
+
 def upload_image_to_glance(glance, local_path, image_name, disk_format='qcow2',
-                           visibility='public', container_format='bare'):
+                           visibility='public', container_format='bare',
+                           use_mmap=False, properties=None):
     """Upload the given image to glance and apply the given label.
 
+    The image is streamed to glance and hashed as it is read. The hashes are
+    compared with the ones glance reports once the image is active.
+
     :param glance: Authenticated glanceclient
     :type glance: glanceclient.Client
     :param local_path: Path to local image
@@ -1517,23 +2162,31 @@ def upload_image_to_glance(glance, local_path, image_name, disk_format='qcow2',
                              format that also contains metadata about the
                              actual virtual machine.
     :type container_format: str
+    :param use_mmap: Whether to read the image through a memory map
+    :type use_mmap: bool
+    :param properties: Additional properties to set on the image
+    :type properties: Optional[{str: str}]
     :returns: glance image pointer
     :rtype: glanceclient.common.utils.RequestIdProxy
+    :raises: exceptions.ImageVerificationFailed
     """
     # Create glance image
     image = glance.images.create(
         name=image_name,
         disk_format=disk_format,
         visibility=visibility,
-        container_format=container_format)
-    glance.images.upload(image.id, open(local_path, 'rb'))
-
-    resource_reaches_status(
-        glance.images,
-        image.id,
-        expected_status='active',
+        container_format=container_format,
+        **(properties or {}))
+    with open_image(local_path, use_mmap=use_mmap) as (image_file, size):
+        reader = ImageUploadReader(image_file, size, name=image_name)
+        glance.images.upload(image.id, reader, image_size=size)
+
+    resources_reach_status(
+        [(glance.images, image.id, 'active')],
         msg='Image status wait')
 
+    image = glance.images.get(image.id)
+    verify_uploaded_image(image, reader)
     return image
 
 
@@ -1549,26 +2202,69 @@ def create_image(glance, image_url, image_name, image_cache_dir=None):
     :type image_url: str
     :param image_name: display name for new image
     :type image_name: str
-    :param image_cache_dir: Directory to store image in before uploading. If it
-        is not passed, or is None, then a tmp directory is used.
+    :param image_cache_dir: Directory to cache image in before uploading. If
+        it is not passed, or is None, then image_cache.IMAGE_CACHE_DIR is used.
     :type image_cache_dir: Option[str, None]
     :returns: glance image pointer
     :rtype: glanceclient.common.utils.RequestIdProxy
     """
-    if image_cache_dir is None:
-        image_cache_dir = tempfile.gettempdir()
-
     logging.debug('Creating glance cirros image '
                   '({})...'.format(image_name))
 
-    img_name = os.path.basename(urllib.parse.urlparse(image_url).path)
-    local_path = os.path.join(image_cache_dir, img_name)
+    opener = get_urllib_opener()
+    properties = get_image_source_properties(
+        image_url,
+        image_cache.get_published_checksum(image_url, opener=opener))
+    cached_image = image_cache.cached_image(
+        image_url,
+        cache_dir=image_cache_dir,
+        opener=opener)
+    with cached_image as local_path:
+        image = upload_image_to_glance(
+            glance,
+            local_path,
+            image_name,
+            properties=properties)
+    return image
 
-    if not os.path.exists(local_path):
-        download_image(image_url, local_path)
 
-    image = upload_image_to_glance(glance, local_path, image_name)
-    return image
+def get_or_create_image(glance, image_url, image_name, image_cache_dir=None):
+    """Return the glance image called image_name, creating it if necessary.
+
+    An active image called image_name which was created from the same
+    upstream image, see find_images_by_source, is reused without a download
+    or an upload. An image called image_name without matching source
+    properties, e.g. one uploaded before they were recorded, is reused too
+    so that the name stays unique. Otherwise the image is created, from the
+    local image cache if it holds the image.
+
+    :param glance: Authenticated glanceclient
+    :type glance: glanceclient.Client
+    :param image_url: URL to download image from
+    :type image_url: str
+    :param image_name: display name for new image
+    :type image_name: str
+    :param image_cache_dir: Directory to cache image in before uploading. If
+        it is not passed, or is None, then image_cache.IMAGE_CACHE_DIR is used.
+    :type image_cache_dir: Option[str, None]
+    :returns: glance image pointer
+    :rtype: glanceclient.common.utils.RequestIdProxy
+    """
+    checksum = image_cache.get_published_checksum(
+        image_url,
+        opener=get_urllib_opener())
+    images = find_images_by_source(
+        glance, image_url, checksum, image_name=image_name)
+    if images:
+        logging.info('Using existing glance image {} ({}) for {}'.format(
+            image_name, images[0].id, image_url))
+        return images[0]
+    images = get_images_by_name(glance, image_name)
+    if images:
+        logging.warning('Using existing glance image {} ({}) which may not '
+                        'match {}'.format(image_name, images[0].id, image_url))
+        return images[0]
+    return create_image(glance, image_url, image_name, image_cache_dir)
 
 
 def create_ssh_key(nova_client, keypair_name, replace=False):
@@ -1677,11 +2373,10 @@ def get_ports_from_device_id(neutron_client, device_id):
     :returns: List of port objects
     :rtype: []
     """
-    ports = []
-    for _port in neutron_client.list_ports().get('ports'):
-        if device_id in _port.get('device_id'):
-            ports.append(_port)
-    return ports
+    return list(iter_neutron_resources(
+        neutron_client.list_ports,
+        'ports',
+        device_id=device_id))
 
 
 @tenacity.retry(wait=tenacity.wait_exponential(multiplier=1, max=60),